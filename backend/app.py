@@ -1,20 +1,41 @@
 # -*- coding: utf-8 -*-
 # app.py
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context, g
 from flask_cors import CORS
 from controllers.pdfloader import (
     prepare_pipeline,
     get_summary,
     get_key_points,
     generate_quiz,
-    answer_question
+    generate_quiz_parallel,
+    stream_quiz,
+    answer_question,
+    answer_questions,
+    clone_chain,
+    open_pipeline,
+    stream_summary,
+    stream_answer,
+    warmup_llm
 )
+from controllers.modelregistry import get_registry_stats, drop_prompt_states
+from controllers.quizgen import get_quiz_stats, clamp_questions
+from controllers.embeddingservice import warmup_embeddings
+from controllers.ingestionqueue import IngestionQueue, QueueFullError
+from controllers.responsecache import ResponseCache, make_key
+from controllers.sessionstore import SessionStore
+from controllers.chainmanager import ChainManager
+from controllers.summarizer import get_summary_cache_stats
+from controllers.runtimeprofile import get_runtime_report
+from controllers import metrics
 import threading
+import json
+import time
 import os
 import logging
 import shutil
 import hashlib
-from datetime import datetime
+import socket
+import uuid
 
 # Configure logging
 logging.basicConfig(
@@ -41,6 +62,7 @@ CORS(app, resources={
 UPLOAD_FOLDER = "./uploads"
 CHROMA_DB_FOLDER = "./chroma_dbs"
 ALLOWED_EXTENSIONS = {'pdf'}
+QA_BATCH_MAX = 16
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -48,38 +70,506 @@ os.makedirs(CHROMA_DB_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Heavy models load on first use; these warm them up in the background instead
+if os.environ.get("WARMUP_EMBEDDINGS", "true").lower() == "true":
+    warmup_embeddings()
+if os.environ.get("WARMUP_LLM", "false").lower() == "true":
+    warmup_llm()
+
 # Store active chains per session/document
 _chains = {}  # {session_id: chain}
 _processing = {}  # {session_id: bool}
 _errors = {}  # {session_id: error_message}
 
+# Documents are indexed once per content hash and shared between sessions
+_documents = {}  # {content_hash: see new_document()}
+_session_docs = {}  # {session_id: content_hash}
+_documents_lock = threading.Lock()
+_ingest_locks = {}  # {content_hash: Lock}, see ingest_lock()
+
+# Durable copy of _documents/_session_docs so sessions survive restarts
+_store = SessionStore()
+
+# Processes sharing the store (e.g. gunicorn workers) claim each ingestion they
+# run and renew the claim every third of the lease; an interrupted ingestion is
+# re-queued by whichever process first finds its claim lapsed
+INGEST_LEASE_SECONDS = float(os.environ.get("INGEST_LEASE_SECONDS", 30))
+_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Signalled whenever ingestion state changes, for /status/<id>/wait
+_status_changed = threading.Condition()
+STATUS_WAIT_MAX = 60
+
+# Extraction, chunking and embedding interleave, so progress reports the furthest stage reached
+STAGES = ["queued", "started", "extract", "chunk", "embed", "llm", "ready"]
+
+
+def notify_status():
+    """Wake up long-polling /status waiters"""
+    with _status_changed:
+        _status_changed.notify_all()
+
+
+def unload_document(content_hash: str):
+    """Drop a document's chains and saved prompt states; get_chain() reopens them on demand"""
+    with _documents_lock:
+        doc = _documents.get(content_hash)
+        if doc is None:
+            return
+        with doc["lock"]:
+            doc["chain"] = None
+            for session_id in doc["sessions"]:
+                _chains.pop(session_id, None)
+    drop_prompt_states(content_hash)
+
+
+def document_footprint(content_hash: str) -> int:
+    """Memory a loaded document holds: its NumPy index, or the size of its Chroma files"""
+    doc = _documents.get(content_hash)
+    if doc is None or doc["chain"] is None:
+        return 0
+    store = getattr(doc["chain"].retriever, "vectorstore", None)
+    if hasattr(store, "nbytes"):
+        return store.nbytes()
+    total = 0
+    for root, _, files in os.walk(doc["db_path"]):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+# LRU / idle eviction of loaded chains (MAX_LOADED_DOCUMENTS, CHAIN_IDLE_TTL,
+# CHAIN_MEMORY_BUDGET_MB against document_footprint)
+_loaded = ChainManager(on_evict=unload_document, footprint=document_footprint)
+
+# Bounded pool of ingestion workers (INGEST_WORKERS / INGEST_MAX_QUEUE)
+_ingestion = IngestionQueue()
+
+# Generated summaries/keypoints/quizzes, keyed by document content (quizzes as
+# (quiz, is_fallback) pairs, see quiz_ok)
+_responses = ResponseCache()
+
+# Optional generation of the default artifacts after ingestion: one artifact
+# per job on the ingestion queue, behind every waiting upload and the first
+# jobs shed when the queue is full
+PRECOMPUTE_ARTIFACTS = os.environ.get("PRECOMPUTE_ARTIFACTS", "false").lower() == "true"
+PRECOMPUTE_PRIORITY = 10
+
+
+def summary_ok(text) -> bool:
+    text = text.strip()
+    return bool(text) and not text.startswith("Error generating summary")
+
+
+def keypoints_ok(points) -> bool:
+    return not points[0].startswith("Error extracting key points")
+
+
+def quiz_ok(result) -> bool:
+    """(quiz, is_fallback) from generate_quiz*: canned fallback quizzes are never stored"""
+    quiz_data, fallback = result
+    return bool(quiz_data) and not fallback
+
+
+# Artifacts the frontend asks for by default: {name: (endpoint, params, compute, cacheable)}
+ARTIFACTS = {
+    "summary_short": ("summary", {"short": True}, lambda c: get_summary(c, short=True), summary_ok),
+    "summary": ("summary", {"short": False}, lambda c: get_summary(c, short=False), summary_ok),
+    "keypoints": ("keypoints", {"count": 8}, lambda c: get_key_points(c, count=8), keypoints_ok),
+    "quiz": ("quiz", {"n": 5}, lambda c: generate_quiz(c, n_questions=5), quiz_ok),
+}
+
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def init_chain_for_file(session_id: str, pdf_path: str):
-    """Initialize chain in background thread"""
-    try:
-        logger.info(f"🔄 Processing {session_id}...")
-        _processing[session_id] = True
-        
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"PDF not found: {pdf_path}")
+def new_document(pdf_path: str, db_path: str, status: str = "processing", error: str = None) -> dict:
+    """In-memory record of a document; `chain` is loaded lazily once ready"""
+    return {
+        "sessions": set(),
+        "pdf_path": pdf_path,
+        "db_path": db_path,
+        "status": status,  # processing | ready | error
+        "error": error,
+        "chain": None,
+        "progress": {"stage": "queued" if status == "processing" else status},
+        "lock": threading.Lock()
+    }
+
+
+def lookup_session(session_id: str):
+    """Content hash of a session's document, or None if the session is unknown.
+
+    Sessions created by another process sharing the session store are
+    loaded from it on first access.
+    """
+    content_hash = _session_docs.get(session_id)
+    if content_hash is None:
+        row = _store.session(session_id)
+        if row is None:
+            return None
+        content_hash = row["content_hash"]
+        with _documents_lock:
+            doc = _documents.get(content_hash)
+            if doc is None:
+                doc = document_from_store(content_hash)
+                if doc is None:
+                    return None
+            doc["sessions"].add(session_id)
+            register_document(content_hash, doc)
+        logger.info(f"🗂️ Loaded session {session_id} from the session store")
+    
+    sync_document(content_hash)
+    return content_hash
+
+
+def sync_document(content_hash: str):
+    """Pick up the outcome of an ingestion that another process runs"""
+    doc = _documents.get(content_hash)
+    if doc is None or doc["status"] != "processing" or _ingestion.position(content_hash) is not None:
+        return
+    row = _store.document(content_hash)
+    if row is None or row["status"] == "processing":
+        return
+    with _documents_lock:
+        if _documents.get(content_hash) is doc and doc["status"] == "processing":
+            doc["status"], doc["error"] = row["status"], row["error"]
+            doc["progress"] = {**doc["progress"], "stage": row["status"]}
+            register_document(content_hash, doc)
+    notify_status()
+
+
+def get_chain(session_id: str):
+    """Chain for a session, reopening its persisted vector store on first access"""
+    chain = _chains.get(session_id)
+    if chain is not None:
+        _loaded.touch(_session_docs.get(session_id), hit=True)
+        return chain
+    
+    content_hash = lookup_session(session_id)
+    doc = _documents.get(content_hash)
+    if doc is None or doc["status"] != "ready":
+        return None
+    
+    with doc["lock"]:
+        hit = doc["chain"] is not None
+        if not hit:
+            logger.info(f"♻️ Reopening {content_hash[:12]} for {session_id}")
+            doc["chain"] = open_pipeline(doc["db_path"])
+        chain = _chains.setdefault(session_id, clone_chain(doc["chain"]))
+    _loaded.touch(content_hash, hit=hit)
+    return chain
+
+
+def restore_sessions():
+    """Reload documents and sessions recorded before the last restart"""
+    for row in _store.documents():
+        _documents[row["content_hash"]] = new_document(
+            row["pdf_path"], row["db_path"], status=row["status"], error=row["error"]
+        )
+    
+    for row in _store.sessions():
+        doc = _documents.get(row["content_hash"])
+        if doc is None:
+            continue
+        doc["sessions"].add(row["session_id"])
+        _session_docs[row["session_id"]] = row["content_hash"]
+        if doc["status"] == "processing":
+            _processing[row["session_id"]] = True
+        elif doc["status"] == "error":
+            _errors[row["session_id"]] = doc["error"]
+    
+    logger.info(f"🗂️ Restored {len(_session_docs)} sessions for {len(_documents)} documents")
+    
+    # The Flask reloader's parent process never serves requests
+    if __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return
+    
+    resume_ingestion()
+    threading.Thread(target=keep_ingestion_claims, name="ingest-claims", daemon=True).start()
+
+
+def document_from_store(content_hash: str):
+    """Record of a document and its sessions as the session store has them, or None"""
+    row = _store.document(content_hash)
+    if row is None:
+        return None
+    doc = new_document(row["pdf_path"], row["db_path"], status=row["status"], error=row["error"])
+    doc["sessions"].update(session["session_id"] for session in _store.sessions(content_hash))
+    return doc
+
+
+def register_document(content_hash: str, doc: dict):
+    """Make `doc` the current record of a document and its sessions (hold _documents_lock)"""
+    _documents[content_hash] = doc
+    for session_id in doc["sessions"]:
+        _session_docs[session_id] = content_hash
+        _processing[session_id] = doc["status"] == "processing"
+        if doc["status"] == "error":
+            _errors[session_id] = doc["error"]
+        else:
+            _errors.pop(session_id, None)
+
+
+def resume_ingestion():
+    """Re-queue interrupted ingestion that no live process holds a claim on"""
+    _store.renew_claims(_owner)
+    for row in _store.documents():
+        content_hash = row["content_hash"]
+        if row["status"] != "processing":
+            continue
+        # Claimed before queueing, so exactly one process picks each document up
+        if not _store.claim_document(content_hash, _owner, INGEST_LEASE_SECONDS):
+            continue
         
-        db_path = os.path.join(CHROMA_DB_FOLDER, session_id)
-        chain = prepare_pipeline(pdf_path=pdf_path, persist_dir=db_path)
+        with _documents_lock:
+            doc = _documents.get(content_hash)
+            if doc is None or doc["status"] != "processing":
+                doc = document_from_store(content_hash)
+                if doc is None:
+                    continue
+                register_document(content_hash, doc)
         
-        _chains[session_id] = chain
-        _processing[session_id] = False
-        logger.info(f"✅ {session_id} ready!")
+        logger.info(f"🔁 Resuming ingestion of {content_hash[:12]}")
+        try:
+            _ingestion.submit(content_hash, init_chain_for_file, content_hash, doc)
+        except QueueFullError as e:
+            fail_document(content_hash, str(e))
+
+
+def keep_ingestion_claims():
+    """Renew this process's claims and take over lapsed ones"""
+    while True:
+        time.sleep(INGEST_LEASE_SECONDS / 3)
+        try:
+            resume_ingestion()
+        except Exception as e:
+            logger.error(f"Ingestion claim error: {str(e)}")
+
+
+def fail_document(content_hash: str, error_msg: str):
+    """Mark a document and all its sessions as failed"""
+    with _documents_lock:
+        doc = _documents.get(content_hash)
+        if doc is not None:
+            doc["status"] = "error"
+            doc["error"] = error_msg
+            doc["progress"] = {"stage": "error"}
+            for session_id in doc["sessions"]:
+                _processing[session_id] = False
+                _errors[session_id] = error_msg
+            _store.set_document_status(content_hash, "error", error_msg)
+    notify_status()
+
+
+def remove_document_files(doc: dict):
+    """Delete the uploaded PDF and vector store of a document"""
+    if os.path.exists(doc["pdf_path"]):
+        os.remove(doc["pdf_path"])
+        logger.info(f"Deleted file: {doc['pdf_path']}")
+    if os.path.exists(doc["db_path"]):
+        shutil.rmtree(doc["db_path"])
+        logger.info(f"Deleted DB: {doc['db_path']}")
+
+
+def artifacts_ready(content_hash: str) -> dict:
+    """Which default artifacts are already cached for a document"""
+    return {
+        name: _responses.contains(make_key(content_hash, endpoint, **params))
+        for name, (endpoint, params, _, _) in ARTIFACTS.items()
+    }
+
+
+def queue_precompute(content_hash: str, start: int = 0):
+    """Queue the first default artifact from `start` on that is not cached yet"""
+    for name in list(ARTIFACTS)[start:]:
+        endpoint, params, _, _ = ARTIFACTS[name]
+        if _responses.contains(make_key(content_hash, endpoint, **params)):
+            continue
+        try:
+            _ingestion.submit(f"precompute:{content_hash}", precompute_artifact, content_hash, name,
+                              priority=PRECOMPUTE_PRIORITY)
+        except QueueFullError as e:
+            logger.warning(f"Skipping precompute for {content_hash[:12]}: {str(e)}")
+        return
+
+
+def precompute_artifact(content_hash: str, name: str):
+    """Generate one default artifact for a document, then queue the next one"""
+    doc = _documents.get(content_hash)
+    chain = doc["chain"] if doc is not None else None
+    if chain is None:
+        return
+    endpoint, params, compute, cacheable = ARTIFACTS[name]
+    key = make_key(content_hash, endpoint, **params)
+    if not _responses.contains(key):
+        logger.info(f"🪄 Precomputing {name} for {content_hash[:12]}")
+        value = compute(chain)
+        if cacheable(value):
+            _responses.set(key, value)
+    queue_precompute(content_hash, list(ARTIFACTS).index(name) + 1)
+
+
+class StaleIngestion(Exception):
+    """The document being ingested was deleted or replaced meanwhile"""
+
+
+def ingest_lock(content_hash: str) -> threading.Lock:
+    """One ingestion at a time per content: a re-upload waits for a stale job to stop"""
+    with _documents_lock:
+        return _ingest_locks.setdefault(content_hash, threading.Lock())
+
+
+def init_chain_for_file(content_hash: str, doc: dict):
+    """Build the pipeline for a document and attach every session waiting on it.
+
+    `doc` is the record the job was queued for; if it is no longer the
+    document's current record (all sessions deleted, or deleted and
+    uploaded again) the job stops without touching the new one.
+    """
+    pdf_path, db_path = doc["pdf_path"], doc["db_path"]
+    
+    def current() -> bool:
+        return _documents.get(content_hash) is doc
+    
+    with ingest_lock(content_hash):
+        try:
+            if not current():
+                raise StaleIngestion()
+            logger.info(f"🔄 Processing {content_hash[:12]}...")
+            
+            if not os.path.exists(pdf_path):
+                raise FileNotFoundError(f"PDF not found: {pdf_path}")
+            
+            def on_progress(stage, **info):
+                if not current():
+                    raise StaleIngestion()
+                previous = doc["progress"].get("stage", "queued")
+                if STAGES.index(stage) < STAGES.index(previous):
+                    stage = previous
+                doc["progress"] = {**doc["progress"], "stage": stage, **info}
+                if stage != previous:
+                    notify_status()
+            
+            on_progress("started")
+            
+            # A failed or stale earlier attempt may have left a partial store behind
+            shutil.rmtree(db_path, ignore_errors=True)
+            chain = prepare_pipeline(pdf_path=pdf_path, persist_dir=db_path, on_progress=on_progress)
+            
+            with _documents_lock:
+                if not current():
+                    raise StaleIngestion()
+                doc["chain"] = chain
+                doc["status"] = "ready"
+                doc["progress"] = {**doc["progress"], "stage": "ready"}
+                for session_id in doc["sessions"]:
+                    _chains[session_id] = clone_chain(chain)
+                    _processing[session_id] = False
+                _store.set_document_status(content_hash, "ready")
         
-    except Exception as e:
-        _processing[session_id] = False
-        error_msg = str(e)
-        _errors[session_id] = error_msg
-        logger.error(f"❌ Error {session_id}: {error_msg}", exc_info=True)
+        except StaleIngestion:
+            logger.info(f"⏭️ Dropped stale ingestion of {content_hash[:12]}")
+            with _documents_lock:
+                if content_hash not in _documents:
+                    # Every session was deleted; the files went with the last one
+                    shutil.rmtree(db_path, ignore_errors=True)
+            return
+        except Exception as e:
+            error_msg = str(e)
+            if current():
+                fail_document(content_hash, error_msg)
+            logger.error(f"❌ Error {content_hash[:12]}: {error_msg}", exc_info=True)
+            return
+    
+    _loaded.touch(content_hash)
+    notify_status()
+    logger.info(f"✅ {content_hash[:12]} ready!")
+    
+    if PRECOMPUTE_ARTIFACTS:
+        queue_precompute(content_hash)
+
+
+def response_key(session_id: str, endpoint: str, **params) -> str:
+    """Cache key for a session's document, endpoint and parameters"""
+    return make_key(_session_docs.get(session_id, session_id), endpoint, **params)
+
+
+def wants_refresh() -> bool:
+    """?refresh=true bypasses the response cache"""
+    return request.args.get("refresh", "false").lower() == "true"
+
+
+def cached_response(session_id: str, endpoint: str, compute, cacheable, **params):
+    """Return a cached response for the session's document, computing it on a miss"""
+    key = response_key(session_id, endpoint, **params)
+    
+    if not wants_refresh():
+        value = _responses.get(key)
+        if value is not None:
+            logger.info(f"⚡ Cached {endpoint} for {session_id}")
+            return value
+    
+    value = compute()
+    if cacheable(value):
+        _responses.set(key, value)
+    return value
+
+
+def sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_tokens(tokens, result_key: str, on_complete=None) -> Response:
+    """Stream tokens as SSE `token` events, then a `done` event with the full text.
+
+    If the client disconnects, the token generator is closed, which stops
+    generation and frees the model.
+    """
+    def generate():
+        parts = []
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield sse("token", {"token": token})
+            text = "".join(parts)
+            if on_complete:
+                on_complete(text)
+            yield sse("done", {result_key: text})
+        except Exception as e:
+            logger.error(f"Stream error: {str(e)}")
+            yield sse("error", {"error": str(e)})
+        finally:
+            if hasattr(tokens, "close"):
+                tokens.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+restore_sessions()
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    """Per-endpoint latency; labelled by route pattern to keep cardinality low"""
+    start = getattr(g, "request_start", None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.HTTP_SECONDS.observe(
+            time.perf_counter() - start, endpoint, request.method, str(response.status_code)
+        )
+    return response
 
 
 @app.post("/upload")
@@ -102,35 +592,99 @@ def upload_pdf():
         
         logger.info(f"📥 Uploading: {file.filename}")
         
-        # Generate unique session ID
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_hash = hashlib.md5(file.filename.encode()).hexdigest()[:8]
-        session_id = f"{timestamp}_{file_hash}"
-        
-        # Save file
-        pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}.pdf")
-        file.save(pdf_path)
-        logger.info(f"💾 Saved to: {pdf_path}")
+        # Sessions only point at their document, so the id needs no meaning
+        session_id = uuid.uuid4().hex
         
-        # Verify file was saved
-        if not os.path.exists(pdf_path):
-            logger.error(f"File was not saved: {pdf_path}")
-            return jsonify({"error": "Failed to save file"}), 500
+        # Documents are keyed by the hash of their bytes, not their name
+        data = file.read()
+        content_hash = hashlib.sha256(data).hexdigest()
         
-        file_size = os.path.getsize(pdf_path)
-        logger.info(f"✅ File saved successfully ({file_size} bytes)")
-        
-        # Initialize chain in background thread
-        threading.Thread(
-            target=init_chain_for_file,
-            args=(session_id, pdf_path),
-            daemon=True
-        ).start()
+        with _documents_lock:
+            doc = _documents.get(content_hash)
+            
+            if doc is not None and doc["status"] != "error":
+                # Same content already indexed or in progress: share it
+                doc["sessions"].add(session_id)
+                _session_docs[session_id] = content_hash
+                _store.add_session(session_id, content_hash, file.filename)
+                if doc["status"] == "ready":
+                    if doc["chain"] is not None:
+                        _chains[session_id] = clone_chain(doc["chain"])
+                    message = "PDF already indexed. Ready."
+                else:
+                    _processing[session_id] = True
+                    message = "PDF uploaded. Processing started..."
+                logger.info(f"♻️ {session_id} attached to existing document {content_hash[:12]}")
+                
+                return jsonify({
+                    "session_id": session_id,
+                    "message": message,
+                    "filename": file.filename,
+                    "deduplicated": True,
+                    "queue_position": _ingestion.position(content_hash)
+                }), 202
+            
+            # Save file
+            pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{content_hash}.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(data)
+            logger.info(f"💾 Saved to: {pdf_path}")
+            
+            # Verify file was saved
+            if not os.path.exists(pdf_path):
+                logger.error(f"File was not saved: {pdf_path}")
+                return jsonify({"error": "Failed to save file"}), 500
+            
+            file_size = os.path.getsize(pdf_path)
+            logger.info(f"✅ File saved successfully ({file_size} bytes)")
+            
+            # New document, or a retry of a failed one: its earlier sessions
+            # follow the retry instead of keeping a stale error
+            db_path = os.path.join(CHROMA_DB_FOLDER, content_hash)
+            previous = doc
+            doc = new_document(pdf_path, db_path)
+            doc["sessions"].add(session_id)
+            if previous is not None:
+                doc["sessions"].update(previous["sessions"])
+                for other in previous["sessions"]:
+                    _errors.pop(other, None)
+                    _processing[other] = True
+                if os.path.exists(db_path):
+                    # Partial store left by the failed attempt
+                    shutil.rmtree(db_path)
+            _documents[content_hash] = doc
+            _session_docs[session_id] = content_hash
+            _processing[session_id] = True
+            
+            # Queue chain initialization on the ingestion workers
+            _store.add_document(content_hash, pdf_path, db_path, owner=_owner)
+            _store.add_session(session_id, content_hash, file.filename)
+            try:
+                _ingestion.submit(content_hash, init_chain_for_file, content_hash, doc)
+            except QueueFullError as e:
+                _store.delete_session(session_id)
+                del _session_docs[session_id]
+                del _processing[session_id]
+                if previous is not None:
+                    # Back to the failed document its sessions were attached to
+                    _documents[content_hash] = previous
+                    _store.set_document_status(content_hash, "error", previous["error"])
+                    for other in previous["sessions"]:
+                        _processing[other] = False
+                        _errors[other] = previous["error"]
+                else:
+                    _store.delete_document(content_hash)
+                    del _documents[content_hash]
+                    os.remove(pdf_path)
+                logger.warning(f"Upload rejected, {str(e)}")
+                return jsonify({"error": "Server busy, please retry shortly"}), 429, {"Retry-After": "10"}
         
         return jsonify({
             "session_id": session_id,
             "message": "PDF uploaded. Processing started...",
-            "filename": file.filename
+            "filename": file.filename,
+            "deduplicated": False,
+            "queue_position": _ingestion.position(content_hash)
         }), 202
     
     except Exception as e:
@@ -138,31 +692,91 @@ def upload_pdf():
         return jsonify({"error": f"Upload failed: {str(e)}"}), 500
 
 
+def session_status(session_id: str):
+    """Status payload for a session, or None if the session is unknown"""
+    content_hash = lookup_session(session_id)
+    if content_hash is None and session_id not in _chains and session_id not in _errors:
+        return None
+    
+    doc = _documents.get(content_hash)
+    
+    # Ready documents may not be loaded yet (e.g. after a restart)
+    is_ready = session_id in _chains or (doc is not None and doc["status"] == "ready")
+    
+    return {
+        "session_id": session_id,
+        "ready": is_ready,
+        "processing": _processing.get(session_id, False),
+        "error": _errors.get(session_id),
+        "progress": doc["progress"] if doc is not None else None,
+        "queue_position": _ingestion.position(content_hash),
+        "eta_seconds": _ingestion.eta(content_hash),
+        "artifacts": artifacts_ready(content_hash or session_id)
+    }
+
+
 @app.get("/status/<session_id>")
 def status(session_id):
     """Check if a document is ready"""
     try:
-        if session_id not in _chains and session_id not in _processing and session_id not in _errors:
+        response = session_status(session_id)
+        if response is None:
             logger.warning(f"Status check for unknown session: {session_id}")
             return jsonify({"error": "Session not found"}), 404
         
-        is_ready = session_id in _chains and not isinstance(_chains[session_id], dict)
-        is_processing = _processing.get(session_id, False)
-        has_error = session_id in _errors
+        logger.debug(f"Status check {session_id}: ready={response['ready']}, processing={response['processing']}")
         
-        response = {
-            "session_id": session_id,
-            "ready": is_ready,
-            "processing": is_processing,
-            "error": _errors.get(session_id) if has_error else None
-        }
+        return jsonify(response)
+    
+    except Exception as e:
+        logger.error(f"Status error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.get("/status/<session_id>/wait")
+def status_wait(session_id):
+    """Long-poll: return as soon as the session's ingestion state changes.
+
+    Returns immediately if the document is already ready or failed, and
+    after ?timeout= seconds (default 25, max 60) if nothing changed.
+    """
+    try:
+        timeout = min(float(request.args.get("timeout", 25)), STATUS_WAIT_MAX)
+        
+        def snapshot():
+            current = session_status(session_id)
+            if current is None:
+                return None, None
+            # Page/chunk counters and ETA move constantly; only state changes count
+            progress = current["progress"] or {}
+            return current, (
+                current["ready"], current["processing"], current["error"],
+                progress.get("stage"), current["queue_position"]
+            )
+        
+        response, initial = snapshot()
+        if response is None:
+            logger.warning(f"Status wait for unknown session: {session_id}")
+            return jsonify({"error": "Session not found"}), 404
         
-        logger.debug(f"Status check {session_id}: ready={is_ready}, processing={is_processing}")
+        if not response["ready"] and not response["error"]:
+            deadline = time.monotonic() + timeout
+            with _status_changed:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    _status_changed.wait(remaining)
+                    response, current = snapshot()
+                    if current != initial:
+                        break
         
+        if response is None:
+            return jsonify({"error": "Session not found"}), 404
         return jsonify(response)
     
     except Exception as e:
-        logger.error(f"Status error: {str(e)}")
+        logger.error(f"Status wait error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
@@ -172,36 +786,163 @@ def health():
     return jsonify({"status": "ok", "message": "API is running"})
 
 
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text-format metrics: stage histograms, queues, chains, tokens/sec, caches"""
+    try:
+        ingestion = _ingestion.stats()
+        chains = _loaded.stats()
+        registry = get_registry_stats()
+        response_cache = _responses.stats()
+        summary_cache = get_summary_cache_stats()
+        
+        def hit_rate(stats):
+            total = stats["hits"] + stats["misses"]
+            return stats["hits"] / total if total else None
+        
+        prompt_caches = {
+            os.path.basename(m["model_path"]): m["prompt_cache"]
+            for m in registry["models"] if m.get("prompt_cache")
+        }
+        
+        queues = {(("queue", "ingest"), ("state", "queued")): ingestion["queued"],
+                  (("queue", "ingest"), ("state", "running")): ingestion["running"]}
+        
+        text = metrics.render({
+            "queue_depth": ("Jobs waiting or running per queue", queues),
+            "queue_rejected": ("Jobs rejected because the queue was full", {
+                (("queue", "ingest"),): ingestion["rejected"]
+            }),
+            "queue_shed": ("Low-priority jobs dropped to make room in a full queue", {
+                (("queue", "ingest"),): ingestion["shed"]
+            }),
+            "resident_chains": ("Documents with a loaded chain", {(): chains["loaded"]}),
+            "llm_waiting": ("Callers waiting for the shared model", {
+                (("model", os.path.basename(m["model_path"])),): m["waiting"] for m in registry["models"]
+            }),
+            "cache_hit_ratio": ("Hit ratio since start per cache", {
+                (("cache", "response"),): hit_rate(response_cache),
+                (("cache", "summary_partials"),): hit_rate(summary_cache),
+                (("cache", "chain"),): hit_rate(chains),
+                **{(("cache", "prompt_prefix"), ("model", name)): hit_rate(stats)
+                   for name, stats in prompt_caches.items()},
+            }),
+            "prompt_prefix_reused_tokens": ("Prompt tokens restored from saved states instead of evaluated", {
+                (("model", name),): stats["reused_tokens"] for name, stats in prompt_caches.items()
+            }),
+            "prompt_prefix_cache_bytes": ("Memory held by saved prompt states", {
+                (("model", name),): stats["bytes"] for name, stats in prompt_caches.items()
+            }),
+            "cache_entries": ("Entries held per cache", {
+                (("cache", "response"),): response_cache["entries"],
+                (("cache", "summary_partials"),): summary_cache["entries"],
+            }),
+            "process_resident_bytes": ("Resident memory of the server process", {
+                (): registry["process_rss_bytes"]
+            }),
+        })
+        return Response(text, mimetype="text/plain; version=0.0.4")
+    except Exception as e:
+        logger.error(f"Metrics error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.get("/models")
+def models():
+    """Shared model, ingestion queue, response cache, chain and quiz stats"""
+    try:
+        return jsonify({
+            **get_registry_stats(),
+            "ingestion": _ingestion.stats(),
+            "response_cache": _responses.stats(),
+            "chains": _loaded.stats(),
+            "quiz": get_quiz_stats()
+        })
+    except Exception as e:
+        logger.error(f"Models error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.get("/runtime")
+def runtime():
+    """llama.cpp runtime settings in effect, where they came from and the calibration profile"""
+    try:
+        return jsonify(get_runtime_report())
+    except Exception as e:
+        logger.error(f"Runtime report error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.get("/summary/<session_id>")
 def summary(session_id):
     """Get document summary"""
-    if session_id not in _chains:
+    chain = get_chain(session_id)
+    if chain is None:
         logger.warning(f"Summary requested for unavailable session: {session_id}")
         return jsonify({"error": "Document not ready or session not found"}), 503
     
     try:
-        chain = _chains[session_id]
         short = request.args.get("short", "false").lower() == "true"
         logger.info(f"Generating {'short' if short else 'full'} summary for {session_id}")
-        text = get_summary(chain, short=short)
+        text = cached_response(
+            session_id, "summary",
+            lambda: get_summary(chain, short=short),
+            summary_ok,
+            short=short
+        )
         return jsonify({"summary": text})
     except Exception as e:
         logger.error(f"Summary error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.get("/summary/<session_id>/stream")
+def summary_stream(session_id):
+    """Stream document summary tokens as Server-Sent Events"""
+    chain = get_chain(session_id)
+    if chain is None:
+        logger.warning(f"Summary stream requested for unavailable session: {session_id}")
+        return jsonify({"error": "Document not ready or session not found"}), 503
+    
+    try:
+        short = request.args.get("short", "false").lower() == "true"
+        key = response_key(session_id, "summary", short=short)
+        
+        cached = None if wants_refresh() else _responses.get(key)
+        if cached is not None:
+            logger.info(f"⚡ Cached summary for {session_id}")
+            return stream_tokens(iter([cached]), "summary")
+        
+        def cache_summary(text):
+            # Stored as /summary would store it
+            text = text.strip()
+            if summary_ok(text):
+                _responses.set(key, text)
+        
+        logger.info(f"Streaming {'short' if short else 'full'} summary for {session_id}")
+        return stream_tokens(stream_summary(chain, short=short), "summary", on_complete=cache_summary)
+    except Exception as e:
+        logger.error(f"Summary stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.get("/keypoints/<session_id>")
 def keypoints(session_id):
     """Get key points from document"""
-    if session_id not in _chains:
+    chain = get_chain(session_id)
+    if chain is None:
         logger.warning(f"Keypoints requested for unavailable session: {session_id}")
         return jsonify({"error": "Document not ready or session not found"}), 503
     
     try:
-        chain = _chains[session_id]
         count = int(request.args.get("count", 8))
         logger.info(f"Extracting {count} keypoints for {session_id}")
-        points = get_key_points(chain, count=count)
+        points = cached_response(
+            session_id, "keypoints",
+            lambda: get_key_points(chain, count=count),
+            keypoints_ok,
+            count=count
+        )
         return jsonify({"keypoints": points})
     except Exception as e:
         logger.error(f"Keypoints error: {str(e)}")
@@ -210,31 +951,87 @@ def keypoints(session_id):
 
 @app.get("/quiz/<session_id>")
 def quiz(session_id):
-    """Generate quiz from document"""
-    if session_id not in _chains:
+    """Generate quiz from document (?mode=parallel generates each question separately)"""
+    chain = get_chain(session_id)
+    if chain is None:
         logger.warning(f"Quiz requested for unavailable session: {session_id}")
         return jsonify({"error": "Document not ready or session not found"}), 503
     
     try:
-        chain = _chains[session_id]
-        n = int(request.args.get("n", 5))
+        n = clamp_questions(int(request.args.get("n", 5)))
+        if request.args.get("mode") == "parallel":
+            logger.info(f"Generating {n} quiz questions per passage for {session_id}")
+            quiz_data, _ = cached_response(
+                session_id, "quiz",
+                lambda: generate_quiz_parallel(chain, n_questions=n),
+                quiz_ok,
+                n=n, mode="parallel"
+            )
+            return jsonify({"quiz": quiz_data})
+        
         logger.info(f"Generating {n} quiz questions for {session_id}")
-        quiz_data = generate_quiz(chain, n_questions=n)
+        quiz_data, _ = cached_response(
+            session_id, "quiz",
+            lambda: generate_quiz(chain, n_questions=n),
+            quiz_ok,
+            n=n
+        )
         return jsonify({"quiz": quiz_data})
     except Exception as e:
         logger.error(f"Quiz error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.get("/quiz/<session_id>/stream")
+def quiz_stream(session_id):
+    """Stream quiz questions as Server-Sent Events, one `question` event as each is ready"""
+    chain = get_chain(session_id)
+    if chain is None:
+        logger.warning(f"Quiz stream requested for unavailable session: {session_id}")
+        return jsonify({"error": "Document not ready or session not found"}), 503
+    
+    try:
+        n = clamp_questions(int(request.args.get("n", 5)))
+        key = response_key(session_id, "quiz", n=n, mode="parallel")
+        cached = None if wants_refresh() else _responses.get(key)
+        questions = iter(cached[0]) if cached is not None else stream_quiz(chain, n_questions=n)
+        logger.info(f"Streaming {n} quiz questions for {session_id}{' (cached)' if cached else ''}")
+        
+        def generate():
+            quiz_data = []
+            try:
+                for question in questions:
+                    quiz_data.append(question)
+                    yield sse("question", {"index": len(quiz_data) - 1, "question": question})
+                if cached is None and quiz_ok((quiz_data, False)):
+                    _responses.set(key, (quiz_data, False))
+                yield sse("done", {"quiz": quiz_data})
+            except Exception as e:
+                logger.error(f"Quiz stream error: {str(e)}")
+                yield sse("error", {"error": str(e)})
+            finally:
+                if hasattr(questions, "close"):
+                    questions.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except Exception as e:
+        logger.error(f"Quiz stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.post("/qa/<session_id>")
 def qa(session_id):
     """Answer a question about the document"""
-    if session_id not in _chains:
+    chain = get_chain(session_id)
+    if chain is None:
         logger.warning(f"QA requested for unavailable session: {session_id}")
         return jsonify({"error": "Document not ready or session not found"}), 503
     
     try:
-        chain = _chains[session_id]
         payload = request.json or {}
         q = payload.get("question", "")
         
@@ -250,11 +1047,63 @@ def qa(session_id):
         return jsonify({"error": str(e)}), 500
 
 
+@app.post("/qa/<session_id>/batch")
+def qa_batch(session_id):
+    """Answer a list of questions with one retrieval pass and one model hold"""
+    chain = get_chain(session_id)
+    if chain is None:
+        logger.warning(f"QA batch requested for unavailable session: {session_id}")
+        return jsonify({"error": "Document not ready or session not found"}), 503
+    
+    try:
+        payload = request.json or {}
+        questions = payload.get("questions", [])
+        
+        if not isinstance(questions, list) or not all(isinstance(q, str) and q.strip() for q in questions):
+            return jsonify({"error": "questions must be a list of non-empty strings"}), 400
+        if not questions:
+            logger.warning(f"QA batch request without questions for {session_id}")
+            return jsonify({"error": "questions missing"}), 400
+        if len(questions) > QA_BATCH_MAX:
+            return jsonify({"error": f"At most {QA_BATCH_MAX} questions per batch"}), 400
+        
+        logger.info(f"Answering {len(questions)} questions for {session_id}")
+        return jsonify(answer_questions(chain, questions))
+    except Exception as e:
+        logger.error(f"QA batch error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.post("/qa/<session_id>/stream")
+def qa_stream(session_id):
+    """Stream the answer to a question as Server-Sent Events"""
+    chain = get_chain(session_id)
+    if chain is None:
+        logger.warning(f"QA stream requested for unavailable session: {session_id}")
+        return jsonify({"error": "Document not ready or session not found"}), 503
+    
+    try:
+        payload = request.json or {}
+        q = payload.get("question", "")
+        
+        if not q:
+            logger.warning(f"QA stream request without question for {session_id}")
+            return jsonify({"error": "question missing"}), 400
+        
+        logger.info(f"Streaming answer for {session_id}: {q[:50]}...")
+        return stream_tokens(stream_answer(chain, q), "answer")
+    except Exception as e:
+        logger.error(f"QA stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.delete("/session/<session_id>")
 def delete_session(session_id):
     """Clean up a session and free resources"""
     try:
         logger.info(f"Deleting session: {session_id}")
+        # A session another process created still counts towards its document
+        lookup_session(session_id)
         
         if session_id in _chains:
             del _chains[session_id]
@@ -263,18 +1112,25 @@ def delete_session(session_id):
         if session_id in _errors:
             del _errors[session_id]
         
-        # Delete uploaded file
-        pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}.pdf")
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
-            logger.info(f"Deleted file: {pdf_path}")
-        
-        # Delete chroma db
-        db_path = os.path.join(CHROMA_DB_FOLDER, session_id)
-        if os.path.exists(db_path):
-            shutil.rmtree(db_path)
-            logger.info(f"Deleted DB: {db_path}")
+        # Only remove the PDF and vector store once no session uses them
+        with _documents_lock:
+            content_hash = _session_docs.pop(session_id, None)
+            _store.delete_session(session_id)
+            doc = _documents.get(content_hash)
+            if doc is not None:
+                doc["sessions"].discard(session_id)
+                if not doc["sessions"]:
+                    del _documents[content_hash]
+                    # A queued ingestion is dropped; a running one stops at its next stage
+                    _ingestion.cancel(content_hash)
+                    _ingestion.cancel(f"precompute:{content_hash}")
+                    _loaded.discard(content_hash)
+                    _store.delete_document(content_hash)
+                    remove_document_files(doc)
+                else:
+                    logger.info(f"Document {content_hash[:12]} still used by {len(doc['sessions'])} session(s)")
         
+        notify_status()
         return jsonify({"message": f"Session {session_id} deleted"})
     
     except Exception as e:
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# benchmarks/batching.py
+"""Continuous batching vs the serial shared model: tokens/sec and per-request latency.
+
+Concurrent requests (one thread each, like independent sessions) generate
+through either SharedLLM (one sequence at a time) or BatchedLLM with N
+sequence slots. By default both run on offline stand-ins with the same cost
+model; --model runs both on a real GGUF file (llama_cpp required).
+
+Usage (from backend/):
+    python benchmarks/batching.py [--requests 8] [--sequences 2,4,8] [--out batching.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run_requests(llm, prompts, max_tokens: int) -> dict:
+    """Start every prompt at once on its own thread; time first token and completion"""
+    results = [None] * len(prompts)
+
+    def worker(i):
+        start = time.perf_counter()
+        first = None
+        tokens = 0
+        for _ in llm.stream(prompts[i], max_tokens=max_tokens):
+            if first is None:
+                first = time.perf_counter() - start
+            tokens += 1
+        results[i] = {"latency_s": time.perf_counter() - start, "first_token_s": first, "tokens": tokens}
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(prompts))]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latency = sorted(r["latency_s"] for r in results)
+    first = sorted(r["first_token_s"] or r["latency_s"] for r in results)
+    tokens = sum(r["tokens"] for r in results)
+    return {
+        "wall_s": round(wall, 3),
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / wall, 2),
+        "latency_p50_s": round(statistics.median(latency), 3),
+        "latency_p95_s": round(percentile(latency, 0.95), 3),
+        "first_token_p50_s": round(statistics.median(first), 3),
+        "first_token_p95_s": round(percentile(first, 0.95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--sequences", default="2,4,8", help="batched sequence slots to compare")
+    parser.add_argument("--prompt-tokens", type=int, default=600)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--model", default=None, help="GGUF path; default uses offline stand-ins")
+    parser.add_argument("--prompt-tps", type=float, default=400.0, help="stand-in prompt-eval tokens/sec")
+    parser.add_argument("--gen-tps", type=float, default=20.0, help="stand-in single-sequence tokens/sec")
+    parser.add_argument("--batch-cost", type=float, default=0.15,
+                        help="stand-in extra step cost per additional sequence (fraction of a token time)")
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from synthetic import StubLLM, StubBatchBackend, synthetic_text
+    from controllers.modelregistry import SharedLLM, LLM_KWARGS
+    from controllers.batchscheduler import BatchScheduler, BatchedLLM, LlamaBatchBackend
+
+    defaults = {**LLM_KWARGS, "max_tokens": args.max_tokens}
+    prompts = [
+        synthetic_text(i, seed=7, words=int(args.prompt_tokens * 0.75)) + f"\n\nQuestion {i}: summarize.\n\nAnswer:"
+        for i in range(args.requests)
+    ]
+
+    if args.model:
+        from controllers.modelregistry import _load_model
+        serial = _load_model(args.model)
+        serial.prompt_cache = None
+
+        def batched(n_seq):
+            return BatchedLLM(serial, BatchScheduler(LlamaBatchBackend(serial.llm.client, n_seq, LLM_KWARGS["n_ctx"])), defaults)
+    else:
+        serial = SharedLLM("stub.gguf", StubLLM(args.prompt_tps, args.gen_tps, answer_tokens=args.max_tokens), 0.0, 0)
+
+        def batched(n_seq):
+            backend = StubBatchBackend(n_seq, LLM_KWARGS["n_ctx"], prompt_tps=args.prompt_tps,
+                                       gen_tps=args.gen_tps, batch_cost=args.batch_cost)
+            return BatchedLLM(serial, BatchScheduler(backend), defaults)
+
+    runs = {"serial": run_requests(serial, prompts, args.max_tokens)}
+    for n_seq in (int(n) for n in args.sequences.split(",") if n):
+        llm = batched(n_seq)
+        runs[f"batched_{n_seq}"] = {**run_requests(llm, prompts, args.max_tokens), "scheduler": llm.scheduler.stats()}
+
+    base = runs["serial"]["tokens_per_s"]
+    for run in runs.values():
+        run["speedup"] = round(run["tokens_per_s"] / base, 2) if base else None
+
+    result = {
+        "benchmark": "batching",
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "runs": runs,
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
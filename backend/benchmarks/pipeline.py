@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# benchmarks/pipeline.py
+"""Ingestion and generation throughput on synthetic PDFs, fully offline.
+
+Stage timings: load_and_chunk, build_vectorstore, retrieval and SimpleChain.run
+per PDF size. Load test: concurrent simulated users driving the Flask app
+through upload -> status -> summary -> quiz -> qa.
+
+Embeddings default to a hash embedder and the LLM to a stub that sleeps like a
+CPU model (--prompt-tps / --gen-tps); pass --embeddings model / --llm model to
+use the real ones (they must already be downloaded).
+
+Usage (from backend/, after pip install -r requirements-bench.txt):
+    python benchmarks/pipeline.py [--pages 5,50] [--users 4] [--out pipeline.json]
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What is photosynthesis?",
+    "How are enzymes related to energy?",
+    "Explain the main structure described in chapter 3.",
+    "Which method is used to study evolution?",
+]
+
+
+def summarize(samples):
+    """count / mean / p50 / p95 / max of a list of seconds"""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_s": round(statistics.fmean(ordered), 4),
+        "p50_s": round(ordered[len(ordered) // 2], 4),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max_s": round(ordered[-1], 4),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_stages(pages: int, workdir: str, repeat: int, llm) -> dict:
+    """Time each pipeline stage on one synthetic PDF of `pages` pages"""
+    from synthetic import make_pdf
+    from controllers.pdfloader import load_and_chunk, build_vectorstore, SimpleChain
+
+    pdf_path = make_pdf(os.path.join(workdir, f"stages-{pages}.pdf"), pages, seed=pages)
+    result = {"pages": pages, "pdf_bytes": os.path.getsize(pdf_path)}
+
+    chunk_s = []
+    for _ in range(repeat):
+        docs, seconds = timed(load_and_chunk, pdf_path)
+        chunk_s.append(seconds)
+    result["chunks"] = len(docs)
+    result["load_and_chunk"] = summarize(chunk_s)
+
+    build_s = []
+    try:
+        for i in range(repeat):
+            vect, seconds = timed(build_vectorstore, docs, os.path.join(workdir, f"store-{pages}-{i}"))
+            build_s.append(seconds)
+    except ImportError as e:
+        result["build_vectorstore"] = {"skipped": f"vector store unavailable: {e}"}
+        return result
+    result["build_vectorstore"] = summarize(build_s)
+
+    chain = SimpleChain(llm, vect.as_retriever())
+    retrieve_s = [timed(chain.retrieve_scored, q)[1] for _ in range(repeat) for q in QUESTIONS]
+    result["retrieval"] = summarize(retrieve_s)
+
+    run_s = [timed(chain.run, {"question": q})[1] for q in QUESTIONS[:max(1, repeat)]]
+    result["simplechain_run"] = summarize(run_s)
+    return result
+
+
+def simulated_user(client, user: int, pages: int, timeout: float, timings: dict, errors: list, lock):
+    """upload -> status (until ready) -> summary -> quiz -> qa"""
+    from synthetic import make_pdf
+
+    def record(step, seconds):
+        with lock:
+            timings.setdefault(step, []).append(seconds)
+
+    def fail(step, detail):
+        with lock:
+            errors.append({"user": user, "step": step, "detail": str(detail)[:200]})
+
+    path = make_pdf(f"user-{user}.pdf", pages, seed=1000 + user)
+    with open(path, "rb") as f:
+        data = f.read()
+    os.remove(path)
+
+    start = time.perf_counter()
+    res, seconds = timed(client.post, "/upload", data={"file": (io.BytesIO(data), f"user{user}.pdf")})
+    record("upload", seconds)
+    if res.status_code != 202:
+        return fail("upload", res.get_json())
+    session_id = res.get_json()["session_id"]
+
+    deadline = time.monotonic() + timeout
+    while True:
+        res, seconds = timed(client.get, f"/status/{session_id}/wait?timeout=5")
+        record("status", seconds)
+        status = res.get_json() or {}
+        if status.get("ready"):
+            break
+        if status.get("error") or res.status_code >= 400:
+            return fail("status", status.get("error") or res.status_code)
+        if time.monotonic() > deadline:
+            return fail("status", "timed out waiting for ready")
+    record("time_to_ready", time.perf_counter() - start)
+
+    for step, method, url, body in (
+        ("summary", "get", f"/summary/{session_id}?short=true", None),
+        ("quiz", "get", f"/quiz/{session_id}?n=3", None),
+        ("qa", "post", f"/qa/{session_id}", {"question": QUESTIONS[user % len(QUESTIONS)]}),
+    ):
+        call = client.get if method == "get" else client.post
+        res, seconds = timed(call, url, json=body) if body else timed(call, url)
+        record(step, seconds)
+        if res.status_code != 200:
+            fail(step, (res.get_json() or {}).get("error", res.status_code))
+    record("session_total", time.perf_counter() - start)
+
+
+def bench_load(users: int, pages: int, timeout: float) -> dict:
+    """Concurrent users against the app in this process (Flask test client)"""
+    import app as app_module
+
+    timings, errors, lock = {}, [], threading.Lock()
+    threads = [
+        threading.Thread(
+            target=simulated_user,
+            args=(app_module.app.test_client(), u, pages, timeout, timings, errors, lock)
+        )
+        for u in range(users)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    completed = len(timings.get("session_total", []))
+    return {
+        "users": users,
+        "pages": pages,
+        "wall_s": round(wall, 3),
+        "sessions_per_min": round(completed / wall * 60, 2) if wall else None,
+        "completed": completed,
+        "steps": {step: summarize(samples) for step, samples in sorted(timings.items())},
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="5,50", help="comma-separated PDF sizes for the stage timings")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--users", type=int, default=4, help="concurrent simulated users (0 skips the load test)")
+    parser.add_argument("--user-pages", type=int, default=5, help="PDF size uploaded by each user")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-user wait for ingestion")
+    parser.add_argument("--embeddings", choices=["hash", "model"], default="hash")
+    parser.add_argument("--llm", choices=["stub", "model"], default="stub")
+    parser.add_argument("--prompt-tps", type=float, default=400.0, help="stub prompt-eval tokens/sec")
+    parser.add_argument("--gen-tps", type=float, default=20.0, help="stub generation tokens/sec")
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out) if args.out else None
+
+    # The app writes uploads, stores and its session DB relative to the cwd
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    os.chdir(workdir)
+    os.environ.setdefault("SESSION_DB_PATH", os.path.join(workdir, "sessions.sqlite3"))
+    os.environ["WARMUP_EMBEDDINGS"] = "false"
+    os.environ["WARMUP_LLM"] = "false"
+    os.environ.pop("RESPONSE_CACHE_DIR", None)
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from synthetic import use_hash_embeddings, use_stub_llm
+    from controllers.pdfloader import create_llm
+
+    if args.embeddings == "hash":
+        use_hash_embeddings()
+    if args.llm == "stub":
+        llm = use_stub_llm(prompt_tps=args.prompt_tps, gen_tps=args.gen_tps)
+    else:
+        llm = create_llm()
+
+    result = {
+        "benchmark": "pipeline",
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "stages": [bench_stages(int(p), workdir, args.repeat, llm) for p in args.pages.split(",") if p],
+        "load": bench_load(args.users, args.user_pages, args.timeout) if args.users else None,
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+    }
+    print(json.dumps(result, indent=2))
+    if out:
+        with open(out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
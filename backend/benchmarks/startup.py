@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# benchmarks/startup.py
+"""Measure app startup: time from process launch to `import app` and to the first /health.
+
+Usage (from backend/):
+    python benchmarks/startup.py [--runs 5] [--port 8091] [--out startup.json]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child process: report import time on stdout, then serve
+SERVER_SNIPPET = """
+import time, sys
+start = time.perf_counter()
+from app import app
+print(f"IMPORT {time.perf_counter() - start:.6f}", flush=True)
+app.run(port=int(sys.argv[1]), debug=False, use_reloader=False)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_health(port: int, timeout: float) -> float:
+    """Poll /health until it answers; return the monotonic time it did"""
+    deadline = time.monotonic() + timeout
+    url = f"http://127.0.0.1:{port}/health"
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as res:
+                if res.status == 200:
+                    return time.monotonic()
+        except OSError:
+            time.sleep(0.02)
+    raise TimeoutError(f"/health did not answer within {timeout}s")
+
+
+def run_once(port: int, timeout: float, env: dict) -> dict:
+    workdir = tempfile.mkdtemp(prefix="startup-bench-")
+    env = {**env, "PYTHONPATH": BACKEND_DIR, "SESSION_DB_PATH": os.path.join(workdir, "sessions.sqlite3")}
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SNIPPET, str(port)],
+        cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        ready = wait_for_health(port, timeout)
+        import_line = proc.stdout.readline().split()
+        return {
+            "import_s": float(import_line[1]) if import_line[:1] == ["IMPORT"] else None,
+            "first_health_s": ready - start,
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port per run")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--warmup", action="store_true", help="keep background model warmup enabled")
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not args.warmup:
+        env["WARMUP_EMBEDDINGS"] = "false"
+        env["WARMUP_LLM"] = "false"
+
+    runs = [run_once(args.port or free_port(), args.timeout, env) for _ in range(args.runs)]
+    health = [r["first_health_s"] for r in runs]
+    result = {
+        "benchmark": "startup",
+        "runs": runs,
+        "first_health_median_s": statistics.median(health),
+        "first_health_max_s": max(health),
+        "python": sys.version.split()[0],
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# benchmarks/synthetic.py
+"""Offline stand-ins shared by the benchmarks: synthetic PDFs, hash embeddings and a stub LLM.
+
+None of these download anything; timings depend only on the local CPU.
+make_pdf needs reportlab, listed with the other benchmark and test
+dependencies in requirements-bench.txt.
+"""
+import hashlib
+import json
+import random
+import re
+import time
+from typing import List
+
+import numpy as np
+
+TOPICS = [
+    "photosynthesis", "mitochondria", "enzymes", "ecosystems", "genetics", "evolution",
+    "thermodynamics", "electricity", "magnetism", "optics", "algorithms", "databases",
+    "networks", "compilers", "probability", "statistics", "calculus", "geometry",
+    "economics", "history", "literature", "philosophy", "astronomy", "chemistry",
+]
+WORDS = (
+    "the of and a to in is that for it as was with be by on not he this are or his from at "
+    "which but have an they you were her she there been one all we their has would when if so "
+    "what can more no other into do time only new some could these two may first then any like "
+    "energy cell process system model data structure function value result method theory example "
+    "important called because between through during each under such many most used also study"
+).split()
+
+
+def synthetic_text(page: int, seed: int = 0, words: int = 450) -> str:
+    """Deterministic pseudo-English page text about a couple of topics"""
+    rng = random.Random(seed * 100003 + page)
+    topics = rng.sample(TOPICS, 2)
+    sentences = []
+    n = 0
+    while n < words:
+        length = rng.randint(8, 20)
+        body = [rng.choice(WORDS) for _ in range(length)]
+        body.insert(rng.randrange(length), rng.choice(topics))
+        sentences.append(" ".join(body).capitalize() + ".")
+        n += length + 1
+    return f"Chapter {page + 1}: {topics[0]} and {topics[1]}. " + " ".join(sentences)
+
+
+def make_pdf(path: str, pages: int, seed: int = 0, words_per_page: int = 450) -> str:
+    """Write a text PDF with `pages` pages (requires reportlab)"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, PageBreak
+
+    style = getSampleStyleSheet()["BodyText"]
+    story = []
+    for page in range(pages):
+        story.append(Paragraph(synthetic_text(page, seed, words_per_page), style))
+        story.append(PageBreak())
+    SimpleDocTemplate(path, pagesize=A4).build(story)
+    return path
+
+
+class HashEmbeddings:
+    """Deterministic bag-of-words embeddings (feature hashing), no model download.
+
+    Same interface as the HuggingFaceEmbeddings object loaded by
+    controllers/embeddingservice.py, so it can be dropped in as its model.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def use_hash_embeddings(dim: int = 384):
+    """Make the shared embedding service encode with HashEmbeddings"""
+    from controllers import embeddingservice
+    embeddingservice._model = HashEmbeddings(dim)
+
+
+class StubLLM:
+    """LlamaCpp stand-in that sleeps like a CPU model would.
+
+    Prompt evaluation costs len(prompt tokens) / prompt_tps seconds and
+    each generated token 1 / gen_tps. Quiz prompts get valid quiz JSON,
+    everything else a few sentences of filler.
+    """
+    def __init__(self, prompt_tps: float = 400.0, gen_tps: float = 20.0, answer_tokens: int = 48):
+        self.prompt_tps = prompt_tps
+        self.gen_tps = gen_tps
+        self.answer_tokens = answer_tokens
+
+    def _prompt_cost(self, prompt: str) -> float:
+        return (len(prompt) / 4.0) / self.prompt_tps if self.prompt_tps else 0.0
+
+    def _completion(self, prompt: str, max_tokens: int = None) -> str:
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        match = re.search(r"exactly (\d+) multiple-choice", prompt)
+        if match or "create one multiple-choice question" in prompt:
+            n = int(match.group(1)) if match else 1
+            return json.dumps({"quiz": [
+                {
+                    "q": f"Which statement about item {digest[i * 4:i * 4 + 6]} is correct?",
+                    "options": [f"Option {c} {digest[i:i + 4]}" for c in "ABCD"],
+                    "answer": i % 4,
+                    "explanation": "Stated in the passage.",
+                }
+                for i in range(n)
+            ]})
+        n = min(max_tokens or self.answer_tokens, self.answer_tokens)
+        return " ".join(WORDS[(int(digest[:8], 16) + i) % len(WORDS)] for i in range(n)) + "."
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        text = self._completion(prompt, kwargs.get("max_tokens"))
+        time.sleep(self._prompt_cost(prompt) + len(text.split()) / self.gen_tps)
+        return text
+
+    def stream(self, prompt: str, **kwargs):
+        time.sleep(self._prompt_cost(prompt))
+        for word in self._completion(prompt, kwargs.get("max_tokens")).split():
+            time.sleep(1.0 / self.gen_tps)
+            yield word + " "
+
+
+def stub_shared_llm(**kwargs):
+    """StubLLM wrapped like a real model (shared lock, metrics, token counts)"""
+    from controllers.modelregistry import SharedLLM
+    return SharedLLM("stub.gguf", StubLLM(**kwargs), load_time=0.0, rss_delta=0)
+
+
+def use_stub_llm(**kwargs):
+    """Make pdfloader.create_llm return one shared StubLLM"""
+    from controllers import pdfloader
+    shared = stub_shared_llm(**kwargs)
+    pdfloader.create_llm = lambda: shared
+    return shared
+
+
+class StubBatchBackend:
+    """Batch backend stand-in for controllers/batchscheduler.py.
+
+    Models a memory-bound CPU decoder: a decode step costs about one token
+    time whatever the batch size, plus `batch_cost` of that per extra
+    sequence, plus prompt tokens at prompt_tps. Matches StubLLM's timings
+    for a batch of one, so serial and batched runs are comparable.
+    """
+    def __init__(self, n_seq: int = 4, n_ctx_seq: int = 4096, n_batch: int = 512,
+                 prompt_tps: float = 400.0, gen_tps: float = 20.0, batch_cost: float = 0.15):
+        self.n_seq = n_seq
+        self.n_ctx_seq = n_ctx_seq
+        self.n_batch = n_batch
+        self.prompt_tps = prompt_tps
+        self.gen_tps = gen_tps
+        self.batch_cost = batch_cost
+
+    def tokenize(self, text: str) -> List[int]:
+        # ~4 characters per token, like the estimate used elsewhere
+        return [hash(text[i:i + 4]) & 0xFFFF for i in range(0, len(text), 4)]
+
+    def new_sampler(self, **sampling):
+        return {"n": 0}
+
+    def free_sampler(self, sampler):
+        pass
+
+    def decode(self, items):
+        decoding = sum(1 for _, tokens, _, logits in items if logits and len(tokens) == 1)
+        prefill = sum(len(tokens) for _, tokens, _, _ in items) - decoding
+        cost = prefill / self.prompt_tps if self.prompt_tps else 0.0
+        if decoding:
+            cost += (1 + self.batch_cost * (decoding - 1)) / self.gen_tps
+        time.sleep(cost)
+        return [i if logits else None for i, (_, _, _, logits) in enumerate(items)]
+
+    def sample(self, sampler, index: int) -> int:
+        sampler["n"] += 1
+        return sampler["n"]
+
+    def is_eog(self, token: int) -> bool:
+        return False
+
+    def piece(self, token: int) -> bytes:
+        return (WORDS[token % len(WORDS)] + " ").encode()
+
+    def free_seq(self, seq: int):
+        pass
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# benchmarks/vectorindex.py
+"""NumPy index vs Chroma: build time, query latency and footprint per chunk count.
+
+Both stores get the same synthetic chunks through build_vectorstore and are
+queried through the same retrieval calls SimpleChain makes. Embeddings are
+hash embeddings computed once up front, so the timings are the stores' own
+cost. Chroma is reported as skipped when langchain_chroma is not installed.
+
+Usage (from backend/):
+    python benchmarks/vectorindex.py [--chunks 50,500,5000] [--queries 200] [--out vectorindex.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def disk_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def latency(samples):
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+    }
+
+
+class PrecomputedEmbeddings:
+    """HashEmbeddings behind a dict, filled before timing starts (used as the embedding service's model)"""
+    def __init__(self, inner, texts):
+        self.inner = inner
+        self.cache = dict(zip(texts, inner.embed_documents(texts)))
+
+    def embed_documents(self, texts):
+        return [self.cache.get(t) or self.inner.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.cache.get(text) or self.inner.embed_query(text)
+
+
+def bench_backend(backend: str, docs, queries, vectors, workdir: str, k: int) -> dict:
+    from controllers.pdfloader import build_vectorstore, load_vectorstore
+
+    if backend == "chroma":
+        try:
+            import langchain_chroma  # noqa: F401
+        except ImportError as e:
+            return {"skipped": f"chroma unavailable: {e}"}
+
+    persist_dir = os.path.join(workdir, f"{backend}-{len(docs)}")
+    start = time.perf_counter()
+    store = build_vectorstore(iter(docs), persist_dir=persist_dir, backend=backend)
+    build_s = time.perf_counter() - start
+
+    query_s = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search_with_relevance_scores(query, k=k)
+        query_s.append(time.perf_counter() - start)
+    vector_s = []
+    for vector in vectors:
+        start = time.perf_counter()
+        store.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+        vector_s.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    reopened = load_vectorstore(persist_dir)
+    reopened.similarity_search_by_vector_with_relevance_scores(vectors[0], k=k)
+    reopen_s = time.perf_counter() - start
+
+    result = {
+        "build_s": round(build_s, 4),
+        "query": latency(query_s),
+        "query_by_vector": latency(vector_s),
+        "reopen_and_first_query_s": round(reopen_s, 4),
+        "disk_bytes": disk_bytes(persist_dir),
+    }
+    if hasattr(store, "nbytes"):
+        result["memory_bytes"] = store.nbytes()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", default="50,500,5000", help="comma-separated chunk counts")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=24, help="candidates per query (CONTEXT_CANDIDATES)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from langchain_core.documents import Document
+    from synthetic import HashEmbeddings, synthetic_text, TOPICS
+    from controllers import embeddingservice
+
+    workdir = tempfile.mkdtemp(prefix="vectorindex-bench-")
+    runs = []
+    try:
+        for n in (int(c) for c in args.chunks.split(",") if c):
+            docs = [
+                Document(page_content=synthetic_text(i, seed=n, words=180), metadata={"page": i // 3 + 1, "source": "bench.pdf"})
+                for i in range(n)
+            ]
+            queries = [f"What does chapter {i} say about {TOPICS[i % len(TOPICS)]}?" for i in range(args.queries)]
+            model = PrecomputedEmbeddings(HashEmbeddings(args.dim), [d.page_content for d in docs] + queries)
+            embeddingservice._model = model
+            vectors = model.embed_documents(queries)
+
+            run = {"chunks": n}
+            for backend in ("numpy", "chroma"):
+                run[backend] = bench_backend(backend, docs, queries, vectors, workdir, args.k)
+            if "build_s" in run["numpy"] and "build_s" in run["chroma"]:
+                run["speedup"] = {
+                    "build": round(run["chroma"]["build_s"] / run["numpy"]["build_s"], 1),
+                    "query_p50": round(run["chroma"]["query"]["p50_ms"] / run["numpy"]["query"]["p50_ms"], 1),
+                }
+            runs.append(run)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "benchmark": "vectorindex",
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "runs": runs,
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
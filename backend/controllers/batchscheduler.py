@@ -0,0 +1,396 @@
+import os
+import time
+import codecs
+import queue
+import threading
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from controllers.metrics import observe_stage, record_tokens
+
+logger = logging.getLogger(__name__)
+
+
+# Sequences decoded together in one llama.cpp context; 1 keeps the serial SharedLLM path.
+# Batching trades away prompt-prefix reuse (PROMPT_CACHE_MB): see BatchedLLM
+LLM_BATCH_SEQUENCES = int(os.environ.get("LLM_BATCH_SEQUENCES", 1))
+# Tokens per decode step (one per generating sequence, the rest prompt prefill)
+LLM_BATCH_TOKENS = int(os.environ.get("LLM_BATCH_TOKENS", 512))
+
+
+class GenerationRequest:
+    """One prompt being generated; tokens arrive on `queue`, None marks the end"""
+    def __init__(self, prompt_tokens: List[int], max_tokens: int, sampler, stop: List[str]):
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.sampler = sampler
+        self.stop = stop or []
+        self.queue = queue.Queue()
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self.text = ""
+        self.seq = None
+        self.fed = 0        # prompt tokens already decoded
+        self.generated = 0
+        self.last_token = None
+        self.cancelled = False
+        self.submitted_at = time.perf_counter()
+        self.admitted_at = None
+        self.finished_at = None
+
+    @property
+    def position(self) -> int:
+        return self.fed + self.generated
+
+
+class BatchScheduler:
+    """Continuous batching: sequences from every session share decode steps.
+
+    Each step decodes one token for every generating sequence plus as many
+    prompt tokens of newly admitted sequences as fit in LLM_BATCH_TOKENS.
+    A request joins as soon as a sequence slot frees up instead of waiting
+    for the whole batch, and its tokens are pushed to its own queue.
+
+    The model side is a backend (LlamaBatchBackend below, or a stand-in in
+    the benchmarks) with: n_seq, n_ctx_seq, n_batch, tokenize, new_sampler,
+    free_sampler, decode, sample, is_eog, piece and free_seq.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self._active = {}  # {seq: GenerationRequest}
+        self._free = list(range(backend.n_seq))
+        self.steps = 0
+        self.step_tokens = 0
+        self.step_sequences = 0
+        self.completed = 0
+        threading.Thread(target=self._loop, name="batch-scheduler", daemon=True).start()
+        logger.info(f"🧮 Batch scheduler started ({backend.n_seq} sequences, {backend.n_batch} tokens/step)")
+
+    def submit(self, prompt: str, max_tokens: int, stop: List[str] = None, **sampling) -> GenerationRequest:
+        tokens = self.backend.tokenize(prompt)
+        if len(tokens) >= self.backend.n_ctx_seq:
+            raise ValueError(
+                f"Requested tokens ({len(tokens)}) exceed context window of {self.backend.n_ctx_seq}"
+            )
+        max_tokens = min(max_tokens, self.backend.n_ctx_seq - len(tokens))
+        request = GenerationRequest(tokens, max_tokens, self.backend.new_sampler(**sampling), stop)
+        with self._cond:
+            self._waiting.append(request)
+            self._cond.notify()
+        return request
+
+    def stream(self, prompt: str, max_tokens: int, stop: List[str] = None, **sampling):
+        """Submit a completion now and return a generator of its text pieces"""
+        return self.drain(self.submit(prompt, max_tokens, stop, **sampling))
+
+    def drain(self, request: GenerationRequest):
+        """Yield a request's text pieces; closing the generator cancels it"""
+        try:
+            while True:
+                item = request.queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            request.cancelled = True
+            with self._cond:
+                self._cond.notify()
+
+    def _admit(self):
+        while self._waiting and self._free:
+            request = self._waiting.popleft()
+            if request.cancelled:
+                self.backend.free_sampler(request.sampler)
+                continue
+            request.seq = self._free.pop()
+            request.admitted_at = time.perf_counter()
+            observe_stage("llm_wait", request.admitted_at - request.submitted_at)
+            self._active[request.seq] = request
+
+    def _finish(self, request: GenerationRequest, error: Exception = None):
+        del self._active[request.seq]
+        self.backend.free_seq(request.seq)
+        self.backend.free_sampler(request.sampler)
+        self._free.append(request.seq)
+        request.finished_at = time.perf_counter()
+        if error is None:
+            self.completed += 1
+            observe_stage("llm_invoke", request.finished_at - request.admitted_at)
+        request.queue.put(error)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._waiting and not self._active:
+                    self._cond.wait()
+                for request in [r for r in self._active.values() if r.cancelled]:
+                    self._finish(request)
+                self._admit()
+                active = list(self._active.values())
+            if not active:
+                continue
+            try:
+                self._step(active)
+            except Exception as e:
+                logger.error(f"❌ Batched decode failed: {e}", exc_info=True)
+                with self._cond:
+                    for request in active:
+                        if request.seq in self._active:
+                            self._finish(request, error=e)
+
+    def _step(self, active: List[GenerationRequest]):
+        """Build one batch, decode it and sample a token for every sequence with logits"""
+        items = []
+        budget = self.backend.n_batch
+        for request in active:
+            if request.last_token is not None:
+                items.append((request, [request.last_token], request.position - 1, True))
+                budget -= 1
+        for request in active:
+            if request.last_token is None and budget > 0:
+                take = min(budget, len(request.prompt_tokens) - request.fed)
+                chunk = request.prompt_tokens[request.fed:request.fed + take]
+                done = request.fed + take == len(request.prompt_tokens)
+                items.append((request, chunk, request.fed, done))
+                budget -= take
+
+        start = time.perf_counter()
+        indices = self.backend.decode([(r.seq, tokens, pos, logits) for r, tokens, pos, logits in items])
+        self.steps += 1
+        self.step_tokens += sum(len(tokens) for _, tokens, _, _ in items)
+        self.step_sequences += len(items)
+
+        sampled = 0
+        with self._cond:
+            for (request, tokens, _, _), index in zip(items, indices):
+                if request.last_token is None:
+                    request.fed += len(tokens)
+                if index is None:
+                    continue
+                token = self.backend.sample(request.sampler, index)
+                if self.backend.is_eog(token):
+                    self._finish(request)
+                    continue
+                request.generated += 1
+                sampled += 1
+                request.last_token = token
+                piece = request.decoder.decode(self.backend.piece(token))
+                request.text += piece
+                if piece:
+                    request.queue.put(piece)
+                stopped = any(s in request.text for s in request.stop)
+                if stopped or request.generated >= request.max_tokens or request.cancelled:
+                    self._finish(request)
+        record_tokens(sampled, time.perf_counter() - start)
+
+    def idle(self) -> bool:
+        with self._cond:
+            return not self._waiting and not self._active
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "sequences": self.backend.n_seq,
+                "tokens_per_step": self.backend.n_batch,
+                "active": len(self._active),
+                "waiting": len(self._waiting),
+                "steps": self.steps,
+                "completed": self.completed,
+                "avg_sequences_per_step": round(self.step_sequences / self.steps, 2) if self.steps else None,
+                "avg_tokens_per_step": round(self.step_tokens / self.steps, 1) if self.steps else None,
+            }
+
+
+class BatchedLLM:
+    """SharedLLM-compatible front end that generates through a BatchScheduler.
+
+    Prompt-state reuse (cache_key) does not apply here: sequences live in
+    their own slots of the batched context and are freed when they finish,
+    so every prompt is evaluated in full. That is the tradeoff of batching:
+    more tokens/sec across sessions, but no saved prefix for follow-up
+    questions on the same document. cache_key is accepted and ignored.
+    """
+    def __init__(self, shared, scheduler: BatchScheduler, defaults: Dict[str, Any]):
+        self.shared = shared
+        self.scheduler = scheduler
+        self.defaults = defaults
+        self.model_path = shared.model_path
+        self.prompt_cache = None
+
+    def _params(self, kwargs) -> Dict[str, Any]:
+        params = {
+            "max_tokens": kwargs.get("max_tokens") or self.defaults["max_tokens"],
+            "stop": kwargs.get("stop"),
+            "temperature": kwargs.get("temperature", self.defaults["temperature"]),
+            "top_k": kwargs.get("top_k", self.defaults["top_k"]),
+            "top_p": kwargs.get("top_p", self.defaults["top_p"]),
+        }
+        if kwargs.get("grammar") is not None:
+            params["grammar"] = kwargs["grammar"]
+        return params
+
+    def stream(self, prompt, cache_key=None, **kwargs):
+        return self.scheduler.stream(str(prompt), **self._params(kwargs))
+
+    def invoke(self, prompt, cache_key=None, **kwargs):
+        return "".join(self.stream(prompt, **kwargs))
+
+    def invoke_many(self, prompts, cache_key=None, **kwargs):
+        """All prompts join the batch at once; returns [(response, seconds)]"""
+        requests = [self.scheduler.submit(str(p), **self._params(kwargs)) for p in prompts]
+        results = []
+        for request in requests:
+            text = "".join(self.scheduler.drain(request))
+            results.append((text, request.finished_at - request.submitted_at))
+        return results
+
+    def count_tokens(self, text: str) -> int:
+        return self.shared.count_tokens(text)
+
+    def idle(self) -> bool:
+        return self.scheduler.idle()
+
+    def drop_prompt_states(self, document: str) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        batching = self.scheduler.stats()
+        return {
+            **self.shared.stats(),
+            "waiting": batching["waiting"],
+            "busy": batching["active"] > 0,
+            "batching": batching,
+        }
+
+
+class LlamaBatchBackend:
+    """Multi-sequence llama.cpp context on the weights of an already loaded Llama.
+
+    Uses the low-level llama_cpp bindings: one context with n_seq sequence
+    slots, llama_batch for mixed prefill/decode steps and a llama_sampler
+    chain (optionally grammar-constrained) per sequence.
+    """
+    def __init__(self, client, n_seq: int, n_ctx_seq: int, n_batch: int = LLM_BATCH_TOKENS):
+        import llama_cpp as lc
+
+        self.lc = lc
+        self.client = client
+        self.n_seq = n_seq
+        self.n_ctx_seq = n_ctx_seq
+        self.n_batch = n_batch
+
+        self.model = client._model.model
+        self.vocab = lc.llama_model_get_vocab(self.model)
+        params = lc.llama_context_default_params()
+        params.n_ctx = n_ctx_seq * n_seq
+        params.n_batch = n_batch
+        params.n_ubatch = n_batch
+        params.n_seq_max = n_seq
+        params.n_threads = client.context_params.n_threads
+        params.n_threads_batch = client.context_params.n_threads_batch
+        if hasattr(params, "kv_unified"):
+            params.kv_unified = True
+        init = getattr(lc, "llama_init_from_model", None) or lc.llama_new_context_with_model
+        self.ctx = init(self.model, params)
+        if not self.ctx:
+            raise RuntimeError("Failed to create batched llama.cpp context")
+        self.batch = lc.llama_batch_init(n_batch, 0, 1)
+
+        if hasattr(lc, "llama_memory_seq_rm"):
+            memory = lc.llama_get_memory(self.ctx)
+            self._seq_rm = lambda seq: lc.llama_memory_seq_rm(memory, seq, -1, -1)
+        elif hasattr(lc, "llama_kv_self_seq_rm"):
+            self._seq_rm = lambda seq: lc.llama_kv_self_seq_rm(self.ctx, seq, -1, -1)
+        else:
+            self._seq_rm = lambda seq: lc.llama_kv_cache_seq_rm(self.ctx, seq, -1, -1)
+
+    def tokenize(self, text: str) -> List[int]:
+        return self.client.tokenize(text.encode("utf-8"), add_bos=True)
+
+    def new_sampler(self, temperature: float = 0.8, top_k: int = 40, top_p: float = 1.0, grammar=None):
+        lc = self.lc
+        chain = lc.llama_sampler_chain_init(lc.llama_sampler_chain_default_params())
+        if grammar is not None:
+            rules = getattr(grammar, "_grammar", None) or str(grammar)
+            root = getattr(grammar, "_root", None) or "root"
+            lc.llama_sampler_chain_add(
+                chain, lc.llama_sampler_init_grammar(self.vocab, rules.encode("utf-8"), root.encode("utf-8"))
+            )
+        if temperature <= 0:
+            lc.llama_sampler_chain_add(chain, lc.llama_sampler_init_greedy())
+        else:
+            lc.llama_sampler_chain_add(chain, lc.llama_sampler_init_top_k(top_k))
+            lc.llama_sampler_chain_add(chain, lc.llama_sampler_init_top_p(top_p, 1))
+            lc.llama_sampler_chain_add(chain, lc.llama_sampler_init_temp(temperature))
+            lc.llama_sampler_chain_add(chain, lc.llama_sampler_init_dist(lc.LLAMA_DEFAULT_SEED))
+        return chain
+
+    def free_sampler(self, sampler):
+        self.lc.llama_sampler_free(sampler)
+
+    def decode(self, items) -> List[Optional[int]]:
+        """items: [(seq, tokens, start_pos, want_logits)] -> batch index of each item's logits"""
+        batch = self.batch
+        n = 0
+        indices = []
+        for seq, tokens, pos, want_logits in items:
+            for j, token in enumerate(tokens):
+                batch.token[n] = token
+                batch.pos[n] = pos + j
+                batch.n_seq_id[n] = 1
+                batch.seq_id[n][0] = seq
+                batch.logits[n] = want_logits and j == len(tokens) - 1
+                n += 1
+            indices.append(n - 1 if want_logits else None)
+        batch.n_tokens = n
+        rc = self.lc.llama_decode(self.ctx, batch)
+        if rc != 0:
+            raise RuntimeError(f"llama_decode returned {rc}")
+        return indices
+
+    def sample(self, sampler, index: int) -> int:
+        # Samples from the index-th logits of the last decode and accepts the token
+        return self.lc.llama_sampler_sample(sampler, self.ctx, index)
+
+    def is_eog(self, token: int) -> bool:
+        return bool(self.lc.llama_vocab_is_eog(self.vocab, token))
+
+    def piece(self, token: int) -> bytes:
+        return self.client.detokenize([token])
+
+    def free_seq(self, seq: int):
+        self._seq_rm(seq)
+
+
+def release_serial_context(shared):
+    """Free the serial model's llama.cpp context (KV cache) and saved prompt states.
+
+    Once the batched context exists nothing generates through the serial
+    one; tokenizing only needs the weights, which both contexts share.
+    """
+    client = shared.llm.client
+    if hasattr(client, "set_cache"):
+        client.set_cache(None)
+    shared.prompt_cache = None
+    close = getattr(getattr(client, "_ctx", None), "close", None)
+    if close is not None:
+        close()
+        logger.info("🧹 Freed the serial llama.cpp context, generation goes through the batched one")
+
+
+def make_batched(shared, defaults: Dict[str, Any], n_seq: int = LLM_BATCH_SEQUENCES, backend=None):
+    """Wrap a loaded SharedLLM in a BatchedLLM, or return it unchanged if batching is unavailable"""
+    if n_seq <= 1:
+        return shared
+    try:
+        backend = backend or LlamaBatchBackend(shared.llm.client, n_seq, defaults["n_ctx"])
+    except Exception as e:
+        logger.warning(f"Continuous batching unavailable, generating serially: {e}")
+        return shared
+    release_serial_context(shared)
+    logger.info(f"🧮 Continuous batching over {backend.n_seq} sequences (prompt prefix reuse is off)")
+    return BatchedLLM(shared, BatchScheduler(backend), defaults)
@@ -0,0 +1,141 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+MAX_LOADED_DOCUMENTS = int(os.environ.get("MAX_LOADED_DOCUMENTS", 16))
+CHAIN_IDLE_TTL = int(os.environ.get("CHAIN_IDLE_TTL", 30 * 60))
+# Evict loaded documents while their combined footprint (see ChainManager) is
+# above this (0 = no limit). Model weights and caches are not counted.
+CHAIN_MEMORY_BUDGET_MB = int(os.environ.get("CHAIN_MEMORY_BUDGET_MB", 0))
+
+
+class ChainManager:
+    """LRU bookkeeping for documents whose chain is loaded in memory.
+
+    The manager only tracks keys and access times; unloading is done by the
+    `on_evict` callback, and evicted documents are reopened from their
+    persisted store on the next request.
+
+    The memory budget is checked against the documents' own footprint, as
+    reported by `footprint(key)` when a document is first tracked, rather
+    than the process RSS: the model alone can be larger than any sensible
+    budget, and RSS does not shrink right after an eviction anyway.
+    """
+    def __init__(self, on_evict: Callable[[str], None],
+                 max_entries: int = MAX_LOADED_DOCUMENTS,
+                 idle_ttl: int = CHAIN_IDLE_TTL,
+                 memory_budget_mb: int = CHAIN_MEMORY_BUDGET_MB,
+                 footprint: Optional[Callable[[str], int]] = None):
+        self.on_evict = on_evict
+        self.footprint = footprint
+        self.max_entries = max(1, max_entries)
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._entries = OrderedDict()  # {key: last_access}
+        self._sizes = {}  # {key: footprint in bytes}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.idle_ttl > 0:
+            threading.Thread(target=self._janitor, name="chain-janitor", daemon=True).start()
+
+    def touch(self, key: str, hit: Optional[bool] = None):
+        """Record an access (hit=False means the chain had to be loaded)"""
+        with self._lock:
+            self._entries[key] = time.time()
+            self._entries.move_to_end(key)
+            measure = self.memory_budget and self.footprint is not None and key not in self._sizes
+            if hit is True:
+                self.hits += 1
+            elif hit is False:
+                self.misses += 1
+        if measure:
+            size = self._measure(key)
+            with self._lock:
+                if key in self._entries:
+                    self._sizes[key] = size
+        self._enforce_budget(keep=key)
+
+    def _measure(self, key: str) -> int:
+        try:
+            return int(self.footprint(key))
+        except Exception as e:
+            logger.warning(f"Could not measure {key[:12]}: {e}")
+            return 0
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._sizes.pop(key, None)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def _pop_lru(self, keep: str) -> Optional[str]:
+        with self._lock:
+            for key in self._entries:
+                if key != keep:
+                    del self._entries[key]
+                    self._sizes.pop(key, None)
+                    self.evictions += 1
+                    return key
+        return None
+
+    def _evict(self, key: str, reason: str):
+        logger.info(f"🧹 Evicting {key[:12]} ({reason})")
+        try:
+            self.on_evict(key)
+        except Exception as e:
+            logger.error(f"Eviction error for {key[:12]}: {e}", exc_info=True)
+
+    def _enforce_budget(self, keep: str):
+        while len(self._entries) > self.max_entries:
+            key = self._pop_lru(keep)
+            if key is None:
+                break
+            self._evict(key, "entry budget")
+
+        while self.memory_budget and self.memory_bytes() > self.memory_budget:
+            key = self._pop_lru(keep)
+            if key is None:
+                break
+            self._evict(key, "memory budget")
+
+    def evict_idle(self):
+        """Unload documents not used for idle_ttl seconds"""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            idle = [key for key, last in self._entries.items() if last < cutoff]
+            for key in idle:
+                del self._entries[key]
+                self._sizes.pop(key, None)
+                self.evictions += 1
+        for key in idle:
+            self._evict(key, "idle")
+
+    def _janitor(self):
+        while True:
+            time.sleep(min(60, self.idle_ttl))
+            self.evict_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": len(self._entries),
+                "max_entries": self.max_entries,
+                "idle_ttl_seconds": self.idle_ttl,
+                "memory_budget_bytes": self.memory_budget or None,
+                "memory_bytes": sum(self._sizes.values()) if self.memory_budget else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,96 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from controllers.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", 2))
+
+_model = None
+_model_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+
+def _get_model():
+    """Load the sentence-transformers model once per process.
+
+    torch and langchain_huggingface are imported here rather than at module
+    import, so the app can start serving before they are loaded.
+    """
+    global _model
+    if _model is not None:
+        return _model
+
+    with _model_lock:
+        if _model is None:
+            import torch
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            logger.info(f"🧠 Loading embeddings model: {EMBEDDING_MODEL} on {device}")
+            start = time.perf_counter()
+            _model = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL,
+                model_kwargs={"device": device},
+                encode_kwargs={"batch_size": EMBED_BATCH_SIZE}
+            )
+            logger.info(f"✅ Embeddings model loaded in {time.perf_counter() - start:.1f}s")
+        return _model
+
+
+class EmbeddingService(Embeddings):
+    """Shared embeddings that encode in batches on a bounded worker pool.
+
+    Every upload goes through the same model weights; at most
+    EMBED_WORKERS batches are encoded at once across the whole process.
+    """
+    def __init__(self, batch_size: int = EMBED_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._local = threading.local()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        model = _get_model()
+        start = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        futures = [_executor.submit(model.embed_documents, batch) for batch in batches]
+
+        vectors = []
+        for future in futures:
+            vectors.extend(future.result())
+
+        seconds = time.perf_counter() - start
+        observe_stage("embed", seconds)
+        self._local.seconds = self.thread_seconds() + seconds
+        return vectors
+
+    def thread_seconds(self) -> float:
+        """Total embed_documents time spent by the calling thread"""
+        return getattr(self._local, "seconds", 0.0)
+
+    def embed_query(self, text: str) -> List[float]:
+        return _get_model().embed_query(text)
+
+
+_service = EmbeddingService()
+
+
+def get_embeddings() -> EmbeddingService:
+    """Return the process-wide embedding service"""
+    return _service
+
+
+def warmup_embeddings():
+    """Load the embeddings model in the background so the first upload skips it"""
+    threading.Thread(target=_get_model, daemon=True).start()
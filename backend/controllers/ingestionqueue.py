@@ -0,0 +1,153 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import logging
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+INGEST_MAX_QUEUE = int(os.environ.get("INGEST_MAX_QUEUE", 20))
+
+
+class QueueFullError(Exception):
+    """Raised when a job queue cannot take another job"""
+
+
+class IngestionQueue:
+    """Fixed pool of worker threads fed by a priority queue.
+
+    Lower priority values run first; jobs with the same priority run in
+    submission order. Queue position and ETA are derived from the jobs
+    still waiting and a moving average of recent job durations.
+
+    Jobs are submitted under a key (e.g. a document's content hash) and get
+    a unique job id, so the same key can be queued again while an earlier
+    job for it still runs; position(), eta() and cancel() refer to the
+    latest job of a key.
+
+    When the queue is full, a new job takes the place of the least urgent
+    waiting job if that one has a higher priority value, so best-effort
+    background work never turns away more urgent jobs.
+    """
+    def __init__(self, workers: int = INGEST_WORKERS, max_queue: int = INGEST_MAX_QUEUE,
+                 name: str = "ingest"):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = {}  # {job_id: (priority, seq)}
+        self._running = {}  # {job_id: start_time}
+        self._latest = {}  # {key: job_id}
+        self._avg_duration = None
+        self.completed = 0
+        self.rejected = 0
+        self.shed = 0
+
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True).start()
+        logger.info(f"🧵 {name} queue started ({self.workers} workers, max {self.max_queue} queued)")
+
+    def submit(self, key: str, fn: Callable, *args, priority: int = 0) -> str:
+        """Queue a job and return its id, or raise QueueFullError when the queue is at capacity"""
+        shed = None
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                shed = max(self._pending, key=self._pending.get, default=None)
+                if shed is None or self._pending[shed][0] <= priority:
+                    self.rejected += 1
+                    raise QueueFullError(f"{self.name} queue is full ({self.max_queue} jobs waiting)")
+                # Dropped here; the worker skips it like a cancelled job
+                del self._pending[shed]
+                shed_key = shed.rsplit("#", 1)[0]
+                if self._latest.get(shed_key) == shed:
+                    del self._latest[shed_key]
+                self.shed += 1
+            seq = next(self._seq)
+            job_id = f"{key}#{seq}"
+            self._pending[job_id] = (priority, seq)
+            self._latest[key] = job_id
+        self._queue.put(((priority, seq), job_id, key, fn, args))
+        if shed is not None:
+            logger.info(f"🗑️ Shed {shed} for {job_id}")
+        logger.info(f"📬 Queued {job_id} (position {self.position(key)})")
+        return job_id
+
+    def cancel(self, key: str) -> bool:
+        """Drop the key's job if it has not started yet"""
+        with self._lock:
+            job_id = self._latest.get(key)
+            if job_id is None or self._pending.pop(job_id, None) is None:
+                return False
+            del self._latest[key]
+        logger.info(f"🗑️ Cancelled {job_id}")
+        return True
+
+    def _worker(self):
+        while True:
+            _, job_id, key, fn, args = self._queue.get()
+            with self._lock:
+                if self._pending.pop(job_id, None) is None:
+                    # Cancelled while waiting
+                    self._queue.task_done()
+                    continue
+                self._running[job_id] = time.perf_counter()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"❌ {self.name} job {job_id} failed: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    duration = time.perf_counter() - self._running.pop(job_id, time.perf_counter())
+                    if self._latest.get(key) == job_id:
+                        del self._latest[key]
+                    if self._avg_duration is None:
+                        self._avg_duration = duration
+                    else:
+                        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+                    self.completed += 1
+                self._queue.task_done()
+
+    def position(self, key: str) -> Optional[int]:
+        """1-based position of the key's job among waiting jobs, 0 if running, None if unknown"""
+        with self._lock:
+            job_id = self._latest.get(key)
+            if job_id in self._running:
+                return 0
+            key = self._pending.get(job_id)
+            if key is None:
+                return None
+            return 1 + sum(1 for other in self._pending.values() if other < key)
+
+    def eta(self, key: str) -> Optional[float]:
+        """Estimated seconds until the key's job finishes, None without history"""
+        pos = self.position(key)
+        with self._lock:
+            avg = self._avg_duration
+            if pos is None or avg is None:
+                return None
+            if pos == 0:
+                started = self._running.get(self._latest.get(key), time.perf_counter())
+                elapsed = time.perf_counter() - started
+                return round(max(avg - elapsed, 0.0), 1)
+            # Jobs ahead of us drain in waves of `workers`
+            waves = (pos - 1) // self.workers + 1
+            return round(waves * avg + avg, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": len(self._pending),
+                "running": len(self._running),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "shed": self.shed,
+                "avg_job_seconds": round(self._avg_duration, 2) if self._avg_duration else None,
+            }
@@ -0,0 +1,167 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Iterable
+
+# Prometheus text exposition without an external client: a histogram
+# observation is one bisect and a few additions under a lock.
+
+PREFIX = "pdfwisdom_"
+
+# Seconds; covers a page extract (ms) up to a full pipeline or long generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination"""
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # {label values: [bucket counts..., count, sum]}
+
+    def observe(self, seconds: float, *label_values):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (not cumulative), then count and sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {values[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {values[-2]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {values[-1]:.6f}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.doc = doc
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._series.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+def render_gauges(gauges: Dict[str, Tuple[str, Dict[Tuple[Tuple[str, str], ...], float]]]) -> List[str]:
+    """Render {name: (doc, {((label, value), ...): number})} as gauges, skipping None values"""
+    lines = []
+    for name, (doc, series) in gauges.items():
+        name = PREFIX + name
+        lines += [f"# HELP {name} {doc}", f"# TYPE {name} gauge"]
+        for labels, value in series.items():
+            if value is None:
+                continue
+            names = tuple(n for n, _ in labels)
+            values = tuple(v for _, v in labels)
+            lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+    return lines
+
+
+# Pipeline and request stages: extract, chunk, embed, chroma_write, index_write, retrieve,
+# llm_invoke, quiz_parse, pipeline (whole prepare_pipeline)
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent per pipeline stage call", ("stage",))
+HTTP_SECONDS = Histogram(
+    "http_request_seconds", "Time to response per endpoint (streams: until headers)",
+    ("endpoint", "method", "status")
+)
+LLM_TOKENS = Counter("llm_generated_tokens_total", "Tokens generated by the LLM")
+LLM_SECONDS = Counter("llm_generation_seconds_total", "Seconds spent generating (model held)")
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+def stage_timer(stage: str):
+    """Context manager timing one call of a pipeline stage"""
+    return STAGE_SECONDS.time(stage)
+
+
+def record_tokens(tokens: int, seconds: float):
+    """Throughput only: tokens generated over model-busy seconds"""
+    LLM_TOKENS.inc(tokens)
+    LLM_SECONDS.inc(seconds)
+
+
+def record_generation(tokens: int, seconds: float):
+    record_tokens(tokens, seconds)
+    observe_stage("llm_invoke", seconds)
+
+
+def tokens_per_second():
+    seconds = LLM_SECONDS.value()
+    return LLM_TOKENS.value() / seconds if seconds else None
+
+
+def render(gauges=None) -> str:
+    """Every metric in Prometheus text format, plus caller-provided gauges"""
+    lines = []
+    for metric in (STAGE_SECONDS, HTTP_SECONDS, LLM_TOKENS, LLM_SECONDS):
+        lines += metric.render()
+    lines += render_gauges({
+        "llm_tokens_per_second": ("Average generation throughput since start", {(): tokens_per_second()}),
+        **(gauges or {})
+    })
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,222 @@
+import os
+import time
+import threading
+import logging
+from typing import Dict, Any
+
+from controllers.tokens import estimate_tokens
+from controllers.metrics import observe_stage, record_generation
+from controllers.promptcache import attach_prompt_cache
+from controllers.batchscheduler import make_batched
+from controllers.runtimeprofile import runtime_kwargs
+from controllers.workerpool import workers_enabled, get_worker_pool, get_pool_if_started
+
+logger = logging.getLogger(__name__)
+
+
+# Default LlamaCpp settings shared by every session
+LLM_KWARGS = {
+    "temperature": 0.75,
+    "top_p": 1,
+    "top_k": 40,
+    "f16_kv": True,
+    "verbose": False,
+    "n_ctx": 4096,
+    "max_tokens": int(os.environ.get("LLM_MAX_TOKENS", 512)),
+    # n_threads, n_batch and n_gpu_layers are fitted to the host at load time
+    # (controllers/runtimeprofile.py)
+}
+
+_models = {}  # {model_path: SharedLLM or BatchedLLM (LLM_BATCH_SEQUENCES > 1)}
+_registry_lock = threading.Lock()
+
+
+def current_rss_bytes() -> int:
+    """Resident memory of this process in bytes (0 if unknown)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        try:
+            import resource
+            # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if os.uname().sysname == "Darwin" else rss * 1024
+        except Exception:
+            return 0
+
+
+class SharedLLM:
+    """Process-wide LlamaCpp instance shared by every SimpleChain.
+
+    llama.cpp contexts are not safe for concurrent generation, so calls are
+    serialized through a lock; waiting callers simply queue on it.
+
+    Calls may pass cache_key=(document, template): saved prompt states are
+    then only matched against states of the same document and template
+    (see controllers/promptcache.py).
+    """
+    def __init__(self, model_path: str, llm, load_time: float, rss_delta: int, prompt_cache=None):
+        self.model_path = model_path
+        self.llm = llm
+        self.load_time = load_time
+        self.rss_delta = rss_delta
+        self.prompt_cache = prompt_cache
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.waiting = 0
+        self._stats_lock = threading.Lock()
+
+    def _acquired(self, waited_since: float, calls: int, cache_key=None):
+        """Bookkeeping once the model lock is held"""
+        observe_stage("llm_wait", time.perf_counter() - waited_since)
+        if self.prompt_cache is not None:
+            self.prompt_cache.namespace = cache_key
+        with self._stats_lock:
+            self.waiting -= 1
+            self.calls += calls
+
+    def invoke(self, prompt, cache_key=None, **kwargs):
+        with self._stats_lock:
+            self.waiting += 1
+        waited_since = time.perf_counter()
+        with self.lock:
+            self._acquired(waited_since, 1, cache_key)
+            start = time.perf_counter()
+            response = self.llm.invoke(prompt, **kwargs)
+            record_generation(self.count_tokens(str(response)), time.perf_counter() - start)
+            return response
+
+    def invoke_many(self, prompts, cache_key=None, **kwargs):
+        """Run several prompts back to back under a single hold of the model.
+
+        Returns [(response, seconds)] in prompt order.
+        """
+        with self._stats_lock:
+            self.waiting += 1
+        waited_since = time.perf_counter()
+        with self.lock:
+            self._acquired(waited_since, len(prompts), cache_key)
+            results = []
+            for prompt in prompts:
+                start = time.perf_counter()
+                response = self.llm.invoke(prompt, **kwargs)
+                seconds = time.perf_counter() - start
+                record_generation(self.count_tokens(str(response)), seconds)
+                results.append((response, seconds))
+            return results
+
+    def stream(self, prompt, cache_key=None, **kwargs):
+        """Yield completion tokens while holding the model.
+
+        Closing the generator (e.g. the client disconnected) stops llama.cpp
+        and releases the model for the next caller.
+        """
+        with self._stats_lock:
+            self.waiting += 1
+        waited_since = time.perf_counter()
+        with self.lock:
+            self._acquired(waited_since, 1, cache_key)
+            start = time.perf_counter()
+            n_tokens = 0
+            tokens = self.llm.stream(prompt, **kwargs)
+            try:
+                for token in tokens:
+                    n_tokens += 1
+                    yield token
+            finally:
+                tokens.close()
+                record_generation(n_tokens, time.perf_counter() - start)
+
+    def count_tokens(self, text: str) -> int:
+        """Token count with the model's own tokenizer (no lock needed)"""
+        try:
+            return len(self.llm.client.tokenize(text.encode("utf-8"), add_bos=False))
+        except Exception:
+            return estimate_tokens(text)
+
+    def idle(self) -> bool:
+        """True when nobody is generating or waiting for the model"""
+        return not self.lock.locked() and self.waiting == 0
+
+    def drop_prompt_states(self, document: str) -> int:
+        """Free the saved prompt states of a document"""
+        return self.prompt_cache.drop(document) if self.prompt_cache is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_path": self.model_path,
+            "load_time_s": round(self.load_time, 3),
+            "rss_delta_bytes": self.rss_delta,
+            "calls": self.calls,
+            "waiting": self.waiting,
+            "busy": self.lock.locked(),
+            "prompt_cache": self.prompt_cache.stats() if self.prompt_cache is not None else None,
+        }
+
+
+def _load_model(model_path: str) -> SharedLLM:
+    """Load a GGUF model once and wrap it"""
+    from langchain_community.llms import LlamaCpp
+
+    logger.info(f"🤖 Loading GGUF model from: {model_path}")
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+
+    llm = LlamaCpp(model_path=model_path, **runtime_kwargs(LLM_KWARGS, model_path))
+
+    load_time = time.perf_counter() - start
+    rss_delta = max(current_rss_bytes() - rss_before, 0)
+    logger.info(f"✅ GGUF model loaded in {load_time:.1f}s (+{rss_delta // (1024 * 1024)} MB)")
+    return SharedLLM(model_path, llm, load_time, rss_delta, prompt_cache=attach_prompt_cache(llm))
+
+
+def get_llm(model_path: str) -> SharedLLM:
+    """Return the shared model for a GGUF path, loading it on first use.
+
+    With model workers enabled (MODEL_WORKERS / MODEL_WORKER_ADDRESSES) the
+    model lives in those processes and this returns the pool in front of them.
+    """
+    if workers_enabled():
+        return get_worker_pool(os.path.abspath(model_path) if model_path else None)
+
+    model_path = os.path.abspath(model_path)
+    shared = _models.get(model_path)
+    if shared is not None:
+        return shared
+
+    with _registry_lock:
+        # Another thread may have loaded it while we waited
+        shared = _models.get(model_path)
+        if shared is None:
+            shared = make_batched(_load_model(model_path), LLM_KWARGS)
+            _models[model_path] = shared
+        return shared
+
+
+def unload_llm(model_path: str) -> bool:
+    """Drop a model from the registry (chains still holding it keep it alive)"""
+    with _registry_lock:
+        return _models.pop(os.path.abspath(model_path), None) is not None
+
+
+def drop_prompt_states(document: str) -> int:
+    """Free a document's saved prompt states in every loaded model"""
+    models = list(_models.values())
+    pool = get_pool_if_started()
+    if pool is not None:
+        models.append(pool)
+    return sum(m.drop_prompt_states(document) for m in models)
+
+
+def get_registry_stats() -> Dict[str, Any]:
+    """Load time, call counters and process memory for loaded models"""
+    models = list(_models.values())
+    pool = get_pool_if_started()
+    if pool is not None:
+        models.append(pool)
+    return {
+        "models": [m.stats() for m in models],
+        "process_rss_bytes": current_rss_bytes(),
+    }
@@ -0,0 +1,208 @@
+"""Inference worker process: owns one model and serves it over a local socket.
+
+Run by controllers/workerpool.py (MODEL_WORKERS=N), or on its own so that
+several web processes (e.g. gunicorn workers) share the same models:
+
+    MODEL_WORKER_AUTHKEY=<secret> python -m controllers.modelworker --socket /run/pdfwisdom/0.sock --cores 0-3
+    MODEL_WORKER_AUTHKEY=<secret> python -m controllers.modelworker --socket /run/pdfwisdom/0.sock --stub
+
+--stub serves a deterministic stand-in instead of the GGUF model, for tests.
+Connections carry pickled requests, so the worker refuses to start without
+MODEL_WORKER_AUTHKEY and its socket is only accessible to its own user.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import hashlib
+import threading
+import logging
+from multiprocessing.connection import Listener
+
+logger = logging.getLogger(__name__)
+
+
+def worker_authkey() -> bytes:
+    """MODEL_WORKER_AUTHKEY, shared by the worker and the web processes that connect to it"""
+    authkey = os.environ.get("MODEL_WORKER_AUTHKEY", "").encode()
+    if not authkey:
+        raise RuntimeError("MODEL_WORKER_AUTHKEY is not set; model workers need a shared secret")
+    return authkey
+
+
+def parse_cores(spec: str):
+    """'0-3,6' -> [0, 1, 2, 3, 6]"""
+    cores = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cores.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            cores.append(int(part))
+    return cores
+
+
+def format_cores(cores) -> str:
+    return ",".join(str(c) for c in cores)
+
+
+class StandInLLM:
+    """Deterministic LLM stand-in: echoes the question, or returns quiz JSON under a grammar"""
+    def __init__(self, seconds_per_token: float = 0.0):
+        self.seconds_per_token = seconds_per_token
+
+    def _completion(self, prompt: str, grammar=None) -> str:
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        if grammar is not None:
+            return json.dumps({"quiz": [{
+                "q": f"Stand-in question {digest[:6]}?",
+                "options": ["A", "B", "C", "D"],
+                "answer": int(digest[0], 16) % 4,
+                "explanation": "Stand-in answer."
+            }]})
+        question = prompt.rsplit("Question:", 1)[-1].replace("Answer:", "").strip()
+        return f"Stand-in answer ({digest[:8]}) to: {question[:200]}"
+
+    def invoke(self, prompt, **kwargs):
+        text = self._completion(prompt, kwargs.get("grammar"))
+        time.sleep(self.seconds_per_token * len(text.split()))
+        return text
+
+    def stream(self, prompt, **kwargs):
+        for word in self._completion(prompt, kwargs.get("grammar")).split(" "):
+            time.sleep(self.seconds_per_token)
+            yield word + " "
+
+
+class WorkerServer:
+    """Serves {invoke, invoke_many, stream, count_tokens, stats, drop_prompt_states} requests.
+
+    Every connection gets a thread; generation itself is still serialized
+    (or batched) by the SharedLLM/BatchedLLM this process holds.
+    """
+    def __init__(self, llm, address: str, authkey: bytes, cores=None):
+        self.llm = llm
+        self.address = address
+        self.authkey = authkey
+        self.cores = cores
+        self._grammars = {}
+        self._grammar_lock = threading.Lock()
+
+    def _grammar(self, spec):
+        """Rebuild a grammar sent as ("gbnf", text); stand-ins get the text itself"""
+        if not isinstance(spec, tuple):
+            return spec
+        text = spec[1]
+        with self._grammar_lock:
+            grammar = self._grammars.get(text)
+            if grammar is None:
+                try:
+                    from llama_cpp import LlamaGrammar
+                    grammar = LlamaGrammar.from_string(text, verbose=False)
+                except ImportError:
+                    grammar = text
+                self._grammars[text] = grammar
+            return grammar
+
+    def _kwargs(self, kwargs):
+        if kwargs.get("grammar") is not None:
+            kwargs = {**kwargs, "grammar": self._grammar(kwargs["grammar"])}
+        return kwargs
+
+    def handle(self, conn):
+        try:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    if op == "stream":
+                        tokens = self.llm.stream(payload["prompt"], **self._kwargs(payload["kwargs"]))
+                        try:
+                            for token in tokens:
+                                conn.send(("token", token))
+                        finally:
+                            tokens.close()
+                        conn.send(("ok", None))
+                    elif op == "invoke":
+                        conn.send(("ok", str(self.llm.invoke(payload["prompt"], **self._kwargs(payload["kwargs"])))))
+                    elif op == "invoke_many":
+                        results = self.llm.invoke_many(payload["prompts"], **self._kwargs(payload["kwargs"]))
+                        conn.send(("ok", [(str(r), s) for r, s in results]))
+                    elif op == "count_tokens":
+                        conn.send(("ok", [self.llm.count_tokens(t) for t in payload["texts"]]))
+                    elif op == "drop_prompt_states":
+                        conn.send(("ok", self.llm.drop_prompt_states(payload["document"])))
+                    elif op == "stats":
+                        conn.send(("ok", {**self.llm.stats(), "pid": os.getpid(), "cores": self.cores}))
+                    else:
+                        conn.send(("error", f"Unknown operation: {op}"))
+                except (BrokenPipeError, ConnectionResetError, EOFError):
+                    # Client went away mid-stream; the finally above released the model
+                    return
+                except Exception as e:
+                    logger.error(f"❌ Worker {op} failed: {e}", exc_info=True)
+                    conn.send(("error", str(e)))
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, family="AF_UNIX", authkey=self.authkey) as listener:
+            os.chmod(self.address, 0o600)
+            logger.info(f"🛠️ Model worker {os.getpid()} listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.warning(f"Rejected worker connection: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model inference worker")
+    parser.add_argument("--socket", required=True, help="Unix socket path to listen on")
+    parser.add_argument("--model", default=None, help="GGUF path (default: resolved like the app does)")
+    parser.add_argument("--cores", default=None, help="CPU cores to pin to, e.g. 0-3")
+    parser.add_argument("--stub", action="store_true", help="serve a stand-in instead of the model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        authkey = worker_authkey()
+    except RuntimeError as e:
+        logger.error(f"❌ {e}")
+        return 2
+
+    cores = parse_cores(args.cores) if args.cores else None
+    if cores:
+        try:
+            os.sched_setaffinity(0, cores)
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Could not pin worker to cores {args.cores}: {e}")
+        # Thread counts then follow the slice (see controllers/runtimeprofile.py)
+
+    # This process holds the model itself, never a pool of further workers
+    os.environ.pop("MODEL_WORKERS", None)
+    os.environ.pop("MODEL_WORKER_ADDRESSES", None)
+
+    from controllers.modelregistry import SharedLLM, get_llm
+
+    if args.stub:
+        llm = SharedLLM("stand-in", StandInLLM(float(os.environ.get("STUB_SECONDS_PER_TOKEN", 0))), 0.0, 0)
+    elif args.model:
+        llm = get_llm(args.model)
+    else:
+        from controllers.pdfloader import create_llm
+        llm = create_llm()
+
+    WorkerServer(llm, args.socket, authkey, cores).serve_forever()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
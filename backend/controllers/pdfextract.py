@@ -0,0 +1,67 @@
+import os
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pypdf
+
+logger = logging.getLogger(__name__)
+
+
+# PDFs with fewer pages than this are extracted in-process
+PARALLEL_EXTRACT_MIN_PAGES = int(os.environ.get("PARALLEL_EXTRACT_MIN_PAGES", 40))
+EXTRACT_PROCESSES = int(os.environ.get("EXTRACT_PROCESSES", min(4, os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.environ.get("EXTRACT_PAGES_PER_TASK", 16))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int):
+    """Worker: open the PDF itself and extract pages [start, end)"""
+    reader = pypdf.PdfReader(pdf_path)
+    return [(i + 1, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared process pool, created on first parallel extraction.
+
+    Workers are not forked from the web process: it runs many threads, and a
+    fork can copy a lock one of them holds. A fork server (or spawn where
+    there is none) starts them from a clean single-threaded process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            logger.info(f"🧵 Starting PDF extraction pool ({EXTRACT_PROCESSES} processes, {method})")
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_PROCESSES, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def use_parallel(n_pages: int) -> bool:
+    """Whether a document is large enough to be worth the process pool"""
+    return EXTRACT_PROCESSES > 1 and n_pages >= PARALLEL_EXTRACT_MIN_PAGES
+
+
+def iter_pages_parallel(pdf_path: str, n_pages: int):
+    """Yield (page_number, text) in page order, extracting ranges in worker processes.
+
+    Ranges are submitted up front and consumed in order, so the first pages
+    can be chunked while later ranges are still being extracted.
+    """
+    pool = _get_pool()
+    futures = [
+        pool.submit(_extract_page_range, pdf_path, start, min(start + PAGES_PER_TASK, n_pages))
+        for start in range(0, n_pages, PAGES_PER_TASK)
+    ]
+    try:
+        for future in futures:
+            for page_num, text in future.result():
+                logger.debug(f"Extracted page {page_num}")
+                yield page_num, text
+    finally:
+        # Consumer stopped early (error or close): drop ranges not started yet
+        for future in futures:
+            future.cancel()
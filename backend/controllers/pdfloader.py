@@ -1,19 +1,44 @@
 import os
-import torch
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import pypdf
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from langchain_community.llms import LlamaCpp
-import json
+from controllers.modelregistry import get_llm, LLM_KWARGS
+from controllers.workerpool import MODEL_WORKERS, MODEL_WORKER_ADDRESSES, MODEL_WORKER_STUB
+from controllers.vectorindex import NumpyVectorStore, VECTOR_BACKEND, NUMPY_INDEX_MAX_CHUNKS, is_numpy_index
+from controllers.tokens import estimate_tokens, count_tokens
+from controllers.metrics import observe_stage, stage_timer
+from controllers.pdfextract import use_parallel, iter_pages_parallel
+from controllers.summarizer import summarize_document, stream_document_summary
+from controllers.quizgen import (
+    QUIZ_PROMPT, quiz_grammar, quiz_max_tokens, read_quiz, record_quiz,
+    iter_quiz_questions
+)
+from controllers.embeddingservice import get_embeddings, EMBED_BATCH_SIZE
+import time
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Chunks are sized in tokens; all-MiniLM-L6-v2 only embeds the first 256 word pieces
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", 256))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))
+# Retrieved candidates considered when filling the context window
+CONTEXT_CANDIDATES = int(os.environ.get("CONTEXT_CANDIDATES", 24))
+
+PROMPT_TEMPLATE = """Based on the following context from the PDF, answer the question.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+_model_path = None
+_model_path_lock = threading.Lock()
 
 
 def get_model_path():
@@ -37,42 +62,123 @@ def get_model_path():
         logger.error(f"Failed to download model: {e}")
         return None
 
-MODEL_PATH = get_model_path()
 
+def resolve_model_path():
+    """Model path, resolved (and possibly downloaded) on first use only"""
+    global _model_path
+    with _model_path_lock:
+        if _model_path is None:
+            _model_path = get_model_path()
+        return _model_path
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-logger.info(f"Using device: {device}")
+
+def warmup_llm():
+    """Resolve and load the GGUF model in the background"""
+    def load():
+        try:
+            create_llm()
+        except Exception as e:
+            logger.error(f"LLM warmup failed: {e}")
+    threading.Thread(target=load, daemon=True).start()
 
 
 class SimpleChain:
-    """Simple Q&A chain for PDF"""
-    def __init__(self, llm, retriever):
+    """Simple Q&A chain for PDF.
+
+    `document` identifies the indexed PDF; it namespaces the model's saved
+    prompt states so follow-up prompts can reuse their evaluated prefix.
+    """
+    def __init__(self, llm, retriever,
+                 n_ctx: int = LLM_KWARGS["n_ctx"],
+                 answer_tokens: int = LLM_KWARGS["max_tokens"],
+                 document: str = None):
         self.llm = llm
         self.retriever = retriever
+        self.n_ctx = n_ctx
+        self.answer_tokens = answer_tokens
+        self.document = document
         self.chat_history = []
         logger.info("✅ SimpleChain initialized")
     
-    def run(self, query_dict):
+    def cache_key(self, template: str):
+        """Prompt-state namespace for this document and a prompt template"""
+        return (self.document, template) if self.document else None
+    
+    def retrieve_scored(self, question: str):
+        """Candidate chunks with relevance scores, most relevant first"""
+        store = getattr(self.retriever, "vectorstore", None)
+        with stage_timer("retrieve"):
+            if store is not None:
+                return store.similarity_search_with_relevance_scores(question, k=CONTEXT_CANDIDATES)
+            return [(doc, None) for doc in self.retriever.invoke(question)]
+    
+    def retrieve_scored_batch(self, questions: List[str]):
+        """Candidates for several questions, embedding all questions in one batch"""
+        store = getattr(self.retriever, "vectorstore", None)
+        search = getattr(store, "similarity_search_by_vector_with_relevance_scores", None)
+        if search is None:
+            return [self.retrieve_scored(q) for q in questions]
+        
+        with stage_timer("retrieve"):
+            vectors = store.embeddings.embed_documents(questions)
+            return [search(vector, k=CONTEXT_CANDIDATES) for vector in vectors]
+    
+    def build_context(self, question: str, scored=None, token_counts: Dict[str, int] = None,
+                      answer_tokens: int = None) -> str:
+        """Fill the context window with the most relevant chunks that fit.
+
+        The budget is n_ctx minus the prompt template, the question and the
+        tokens reserved for the answer; whole chunks are kept or skipped,
+        never cut in the middle. `scored` and `token_counts` let batched
+        callers reuse retrieval results and per-chunk token counts;
+        `answer_tokens` overrides the reserved answer length.
+        """
+        if scored is None:
+            scored = self.retrieve_scored(question)
+        if token_counts is None:
+            token_counts = {}
+        
+        budget = (
+            self.n_ctx
+            - (answer_tokens or self.answer_tokens)
+            - count_tokens(PROMPT_TEMPLATE.format(context="", question=question), self.llm)
+        )
+        
+        picked = []
+        used = 0
+        for doc, score in scored:
+            text = doc.page_content
+            if text not in token_counts:
+                token_counts[text] = count_tokens(text, self.llm) + 2  # + separator
+            n = token_counts[text]
+            if used + n > budget:
+                continue
+            picked.append(doc)
+            used += n
+        
+        # Document order rather than relevance order: prompts for related
+        # questions then share a longer prefix, which the model can reuse
+        picked.sort(key=lambda doc: (doc.metadata or {}).get("page", 0))
+        
+        logger.debug(f"Context: {len(picked)} chunks, {used}/{max(budget, 0)} tokens")
+        return "\n\n".join(doc.page_content for doc in picked)
+    
+    def build_prompt(self, question: str, answer_tokens: int = None) -> str:
+        """Retrieve context for a question and build the LLM prompt"""
+        context = self.build_context(question, answer_tokens=answer_tokens)
+        return PROMPT_TEMPLATE.format(context=context, question=question)
+    
+    def run(self, query_dict, **llm_kwargs):
+        """Answer one question; llm_kwargs (e.g. grammar, max_tokens) go to the model call"""
         try:
             question = query_dict.get("question", "")
             logger.info(f"Processing query: {question[:50]}...")
             
-            
-            docs = self.retriever.invoke(question)
-            context = "\n".join([doc.page_content for doc in docs])
-            
-            prompt = f"""Based on the following context from the PDF, answer the question.
-
-Context:
-{context[:2000]}
-
-Question: {question}
-
-Answer:"""
+            prompt = self.build_prompt(question, answer_tokens=llm_kwargs.get("max_tokens"))
             
             logger.info("Invoking LLM...")
             
-            response = self.llm.invoke(prompt)
+            response = self.llm.invoke(prompt, cache_key=self.cache_key("qa"), **llm_kwargs)
             logger.info(f"LLM response received: {len(str(response))} chars")
             
             self.chat_history.append({
@@ -84,75 +190,297 @@ Answer:"""
         except Exception as e:
             logger.error(f"Error in SimpleChain.run: {e}", exc_info=True)
             raise
+    
+    def run_batch(self, questions: List[str]) -> Tuple[List[Dict[str, Any]], float]:
+        """Answer several questions with one retrieval pass and one model hold.
+
+        Questions are embedded together, chunks shared between questions are
+        only token-counted once, and the generations run back to back while
+        holding the model. Returns (answers, retrieval seconds).
+        """
+        try:
+            logger.info(f"Processing batch of {len(questions)} questions...")
+            start = time.perf_counter()
+            
+            scored_batch = self.retrieve_scored_batch(questions)
+            token_counts = {}
+            prompts = [
+                PROMPT_TEMPLATE.format(
+                    context=self.build_context(q, scored=scored, token_counts=token_counts),
+                    question=q
+                )
+                for q, scored in zip(questions, scored_batch)
+            ]
+            retrieve_s = time.perf_counter() - start
+            logger.info(f"Batch retrieval done: {len(token_counts)} distinct chunks in {retrieve_s:.2f}s")
+            
+            if hasattr(self.llm, "invoke_many"):
+                generations = self.llm.invoke_many(prompts, cache_key=self.cache_key("qa"))
+            else:
+                generations = []
+                for prompt in prompts:
+                    t = time.perf_counter()
+                    generations.append((self.llm.invoke(prompt), time.perf_counter() - t))
+            
+            results = []
+            for q, (response, generate_s) in zip(questions, generations):
+                self.chat_history.append({"question": q, "answer": response})
+                results.append({
+                    "question": q,
+                    "answer": str(response),
+                    "generate_s": round(generate_s, 3)
+                })
+            return results, round(retrieve_s, 3)
+        except Exception as e:
+            logger.error(f"Error in SimpleChain.run_batch: {e}", exc_info=True)
+            raise
+    
+    def stream(self, query_dict):
+        """Like run(), but yield the answer token by token"""
+        try:
+            question = query_dict.get("question", "")
+            logger.info(f"Streaming query: {question[:50]}...")
+            
+            prompt = self.build_prompt(question)
+            
+            logger.info("Streaming from LLM...")
+            
+            parts = []
+            for token in self.llm.stream(prompt, cache_key=self.cache_key("qa")):
+                parts.append(token)
+                yield token
+            
+            response = "".join(parts)
+            logger.info(f"LLM stream finished: {len(response)} chars")
+            
+            self.chat_history.append({
+                "question": question,
+                "answer": response
+            })
+        except GeneratorExit:
+            logger.info("LLM stream cancelled by client")
+            raise
+        except Exception as e:
+            logger.error(f"Error in SimpleChain.stream: {e}", exc_info=True)
+            raise
 
 
-def load_and_chunk(pdf_path: str, chunk_size: int = 10000, chunk_overlap: int = 200):
-    """Load PDF and split into chunks using pypdf"""
-    try:
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"PDF not found: {pdf_path}")
-        
-        logger.info(f"📄 Loading PDF: {pdf_path}")
-        
-        pdf_reader = pypdf.PdfReader(pdf_path)
-        
-        if len(pdf_reader.pages) == 0:
-            raise ValueError(f"No pages found in PDF: {pdf_path}")
-        
-        logger.info(f"📖 Found {len(pdf_reader.pages)} pages")
-        
-        full_text = ""
-        for page_num, page in enumerate(pdf_reader.pages):
-            text = page.extract_text()
+def report(on_progress, stage: str, **info):
+    """Send stage progress to an optional on_progress(stage, **info) callback"""
+    if on_progress is not None:
+        try:
+            on_progress(stage, **info)
+        except Exception as e:
+            logger.warning(f"Progress callback failed: {e}")
+
+
+def iter_pages(pdf_path: str, on_progress=None):
+    """Yield (page_number, text) for each page, one page at a time.
+
+    Large PDFs are extracted in a process pool (see controllers/pdfextract.py).
+    """
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+    
+    logger.info(f"📄 Loading PDF: {pdf_path}")
+    
+    pdf_reader = pypdf.PdfReader(pdf_path)
+    
+    if len(pdf_reader.pages) == 0:
+        raise ValueError(f"No pages found in PDF: {pdf_path}")
+    
+    n_pages = len(pdf_reader.pages)
+    logger.info(f"📖 Found {n_pages} pages")
+    
+    report(on_progress, "extract", pages_done=0, pages_total=n_pages)
+    
+    if use_parallel(n_pages):
+        waited = time.perf_counter()
+        for page_num, text in iter_pages_parallel(pdf_path, n_pages):
+            # Wall time until the page arrives from the pool
+            observe_stage("extract", time.perf_counter() - waited)
+            report(on_progress, "extract", pages_done=page_num)
             if text:
-                full_text += text + "\n"
-            logger.debug(f"Extracted page {page_num + 1}")
-        
-        if not full_text.strip():
-            logger.warning("PDF text extraction returned empty content")
-            full_text = "PDF content could not be extracted"
-        
-        
-        docs = [Document(page_content=full_text, metadata={"source": pdf_path})]
-        
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap
+                yield page_num, text
+            waited = time.perf_counter()
+        return
+    
+    for page_num, page in enumerate(pdf_reader.pages):
+        with stage_timer("extract"):
+            text = page.extract_text()
+        logger.debug(f"Extracted page {page_num + 1}")
+        report(on_progress, "extract", pages_done=page_num + 1)
+        if text:
+            yield page_num + 1, text
+
+
+def iter_chunks(pdf_path: str, chunk_tokens: int = CHUNK_TOKENS,
+                chunk_overlap: int = CHUNK_OVERLAP_TOKENS, on_progress=None):
+    """Yield chunks as pages are parsed, keeping page numbers in metadata.
+
+    Chunk size and overlap are in (estimated) tokens. Only the text not yet
+    emitted (at most one chunk plus the current page) is held in memory,
+    instead of the whole document.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens,
+        chunk_overlap=chunk_overlap,
+        length_function=estimate_tokens
+    )
+    buffer = ""
+    page_starts = []  # [(offset_in_buffer, page_number)]
+    n_chunks = 0
+    
+    def split(text):
+        """Split text into [(chunk, start_offset)]"""
+        # Offsets are located here: the splitter's own start_index assumes
+        # the overlap is measured in characters
+        pieces = []
+        search_from = 0
+        with stage_timer("chunk"):
+            split_pieces = splitter.split_text(text)
+        for piece in split_pieces:
+            start = text.find(piece, search_from)
+            if start < 0:
+                start = search_from
+            pieces.append((piece, start))
+            search_from = start + 1
+        return pieces
+    
+    def make_chunk(piece, start):
+        end = start + len(piece) - 1
+        pages = [p for offset, p in page_starts if offset <= end]
+        first = [p for offset, p in page_starts if offset <= start]
+        return Document(
+            page_content=piece,
+            metadata={"source": pdf_path, "page": first[-1], "page_end": pages[-1]}
         )
-        chunks = splitter.split_documents(docs)
-        
-        logger.info(f"✂️ Created {len(chunks)} chunks")
-        
-        return chunks
+    
+    for page_num, text in iter_pages(pdf_path, on_progress=on_progress):
+        page_starts.append((len(buffer), page_num))
+        buffer += text + "\n"
+        if estimate_tokens(buffer) <= chunk_tokens:
+            continue
+        
+        pieces = split(buffer)
+        if not pieces:
+            continue
+        
+        # Emit every complete chunk; the last one may still grow with the next page
+        for piece, start in pieces[:-1]:
+            n_chunks += 1
+            report(on_progress, "chunk", chunks=n_chunks)
+            yield make_chunk(piece, start)
+        
+        carry_from = pieces[-1][1]
+        buffer = buffer[carry_from:]
+        rebased = []
+        for offset, p in page_starts:
+            if offset <= carry_from:
+                rebased = [(0, p)]
+            else:
+                rebased.append((offset - carry_from, p))
+        page_starts = rebased
+    
+    if buffer.strip():
+        for piece, start in split(buffer):
+            n_chunks += 1
+            report(on_progress, "chunk", chunks=n_chunks)
+            yield make_chunk(piece, start)
+    
+    if n_chunks == 0:
+        logger.warning("PDF text extraction returned empty content")
+        yield Document(
+            page_content="PDF content could not be extracted",
+            metadata={"source": pdf_path, "page": 1, "page_end": 1}
+        )
+        n_chunks = 1
+    
+    logger.info(f"✂️ Created {n_chunks} chunks")
+
+
+def load_and_chunk(pdf_path: str, chunk_tokens: int = CHUNK_TOKENS, chunk_overlap: int = CHUNK_OVERLAP_TOKENS):
+    """Load PDF and split into token-sized chunks using pypdf"""
+    try:
+        return list(iter_chunks(pdf_path, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap))
     except Exception as e:
         logger.error(f"Error in load_and_chunk: {e}", exc_info=True)
         raise
 
 
-def build_vectorstore(docs, persist_dir: str = None):
-    """Build Chroma vector store from documents"""
+def _open_chroma(embeddings, persist_dir: str = None):
+    from langchain_chroma import Chroma
+    
+    if persist_dir:
+        os.makedirs(persist_dir, exist_ok=True)
+        logger.info(f"Creating persistent store at: {persist_dir}")
+        return Chroma(embedding_function=embeddings, persist_directory=persist_dir)
+    logger.info("Creating in-memory vector store")
+    return Chroma(embedding_function=embeddings)
+
+
+def _move_to_chroma(index: NumpyVectorStore, embeddings, persist_dir: str = None):
+    """Chroma store holding everything added to `index` so far, without re-embedding it"""
+    vect = _open_chroma(embeddings, persist_dir)
+    vectors = index.raw_vectors().tolist()
+    for i in range(0, len(index), 1000):
+        vect._collection.add(
+            ids=index.ids[i:i + 1000],
+            embeddings=vectors[i:i + 1000],
+            documents=index.texts[i:i + 1000],
+            metadatas=index.metadatas[i:i + 1000]
+        )
+    return vect
+
+
+def build_vectorstore(docs, persist_dir: str = None, batch_size: int = EMBED_BATCH_SIZE,
+                      on_progress=None, backend: str = VECTOR_BACKEND):
+    """Build the vector store from documents.
+
+    `docs` may be any iterable (e.g. iter_chunks); chunks are embedded and
+    written batch by batch as they arrive. With backend "auto" they go into
+    a NumpyVectorStore, moved into Chroma once the document turns out to
+    have more than NUMPY_INDEX_MAX_CHUNKS chunks.
+    """
     try:
         logger.info("🔨 Building vector store...")
         
-        embeddings = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={"device": device}
-        )
-        logger.info("✅ Embeddings model loaded")
-        
-        if persist_dir:
-            os.makedirs(persist_dir, exist_ok=True)
-            logger.info(f"Creating persistent store at: {persist_dir}")
-            vect = Chroma.from_documents(
-                documents=docs,
-                embedding=embeddings,
-                persist_directory=persist_dir
-            )
-        else:
-            logger.info("Creating in-memory vector store")
-            vect = Chroma.from_documents(documents=docs, embedding=embeddings)
-        
-        logger.info("✅ Vector store built successfully")
+        embeddings = get_embeddings()
+        vect = NumpyVectorStore(embeddings) if backend in ("auto", "numpy") else _open_chroma(embeddings, persist_dir)
+        
+        def add(batch):
+            nonlocal vect
+            if backend == "auto" and isinstance(vect, NumpyVectorStore) and len(vect) + len(batch) > NUMPY_INDEX_MAX_CHUNKS:
+                logger.info(f"📦 Over {NUMPY_INDEX_MAX_CHUNKS} chunks, moving the index to Chroma")
+                vect = _move_to_chroma(vect, embeddings, persist_dir)
+            # The store embeds inside add_documents; the rest is the store write
+            embed_before = embeddings.thread_seconds()
+            start = time.perf_counter()
+            vect.add_documents(batch)
+            elapsed = time.perf_counter() - start
+            stage = "index_write" if isinstance(vect, NumpyVectorStore) else "chroma_write"
+            observe_stage(stage, max(elapsed - (embeddings.thread_seconds() - embed_before), 0.0))
+        
+        batch = []
+        total = 0
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                add(batch)
+                total += len(batch)
+                batch = []
+                logger.debug(f"Embedded {total} chunks so far")
+                report(on_progress, "embed", embedded=total)
+        if batch:
+            add(batch)
+            total += len(batch)
+            report(on_progress, "embed", embedded=total)
+        
+        if isinstance(vect, NumpyVectorStore) and persist_dir:
+            with stage_timer("index_write"):
+                vect.persist(persist_dir)
+        
+        logger.info(f"✅ Vector store built successfully ({total} chunks, {type(vect).__name__})")
         
         return vect
     except Exception as e:
@@ -160,28 +488,40 @@ def build_vectorstore(docs, persist_dir: str = None):
         raise
 
 
+def load_vectorstore(persist_dir: str):
+    """Reopen a persisted store (NumPy index or Chroma) without re-embedding"""
+    try:
+        if not os.path.isdir(persist_dir):
+            raise FileNotFoundError(f"Vector store not found: {persist_dir}")
+        
+        if is_numpy_index(persist_dir):
+            logger.info(f"📂 Opening persisted NumPy index at: {persist_dir}")
+            return NumpyVectorStore.load(persist_dir, get_embeddings())
+        
+        from langchain_chroma import Chroma
+        
+        logger.info(f"📂 Opening persisted store at: {persist_dir}")
+        return Chroma(embedding_function=get_embeddings(), persist_directory=persist_dir)
+    except Exception as e:
+        logger.error(f"Error in load_vectorstore: {e}", exc_info=True)
+        raise
+
+
 def create_llm():
-    """Initialize LLM using LlamaCpp (local GGUF)"""
+    """Get the shared LlamaCpp model (local GGUF), loaded once per process"""
     
     try:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found at: {MODEL_PATH}")
-        
-        logger.info(f"🤖 Loading GGUF model from: {MODEL_PATH}")
-        
-        llm = LlamaCpp(
-            model_path=MODEL_PATH,
-            temperature=0.75,
-            top_p=1,
-            top_k=40,
-            f16_kv=True,
-            verbose=False,
-            n_ctx=4096,
-            n_threads=8,  
-            n_gpu_layers=32  
-        )
+        if MODEL_WORKER_ADDRESSES or (MODEL_WORKERS and MODEL_WORKER_STUB):
+            # External workers load the model themselves; stand-ins need none
+            return get_llm(None)
+
+        model_path = resolve_model_path()
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found at: {model_path}")
         
-        logger.info("✅ GGUF model loaded successfully")
+        llm = get_llm(model_path)
+        
+        logger.info("✅ GGUF model ready (shared)")
         return llm
     except FileNotFoundError as e:
         logger.error(f"❌ Model file error: {e}")
@@ -191,12 +531,12 @@ def create_llm():
         raise RuntimeError(f"Failed to load GGUF model: {str(e)}")
 
 
-def create_conversational_chain(llm, vector_store):
+def create_conversational_chain(llm, vector_store, document: str = None):
     """Create Q&A chain"""
     try:
         logger.info("🔗 Creating Q&A chain...")
         
-        chain = SimpleChain(llm, vector_store.as_retriever())
+        chain = SimpleChain(llm, vector_store.as_retriever(), document=document)
         
         logger.info("✅ Chain created successfully")
         return chain
@@ -205,27 +545,46 @@ def create_conversational_chain(llm, vector_store):
         raise
 
 
+def clone_chain(chain: SimpleChain) -> SimpleChain:
+    """New chain (own chat history) sharing the model and vector store of another"""
+    return SimpleChain(chain.llm, chain.retriever, n_ctx=chain.n_ctx, answer_tokens=chain.answer_tokens,
+                       document=chain.document)
+
+
+
+
+def summary_question(short: bool = False) -> str:
+    """Summarization prompt sent through the chain"""
+    if short:
+        return "Provide a short (3-4 sentence) summary of this PDF."
+    return (
+        "Summarize the content of this PDF as if it were a fantasy story. "
+        "Include the main events, characters, or important ideas, "
+        "but present them in a magical, storytelling style."
+    )
 
 
 def get_summary(chain: SimpleChain, short: bool = False) -> str:
-    """Generate summary from document"""
+    """Generate summary from the whole document (map-reduce over all chunks)"""
     try:
-        if short:
-            question = "Provide a short (3-4 sentence) summary of this PDF."
-        else:
-            question = (
-            "Summarize the content of this PDF as if it were a fantasy story. "
-            "Include the main events, characters, or important ideas, "
-            "but present them in a magical, storytelling style."
-        )
-            
-        res = chain.run({"question": question})
+        res = summarize_document(chain, summary_question(short))
+        if res is None:
+            # Store cannot list its chunks: summarize the top-k retrieval instead
+            res = chain.run({"question": summary_question(short)})
         return str(res)
     except Exception as e:
         logger.error(f"Error in get_summary: {e}")
         return f"Error generating summary: {str(e)}"
 
 
+def stream_summary(chain: SimpleChain, short: bool = False):
+    """Yield summary tokens as they are generated (the final reduce step streams)"""
+    tokens = stream_document_summary(chain, summary_question(short))
+    if tokens is None:
+        tokens = chain.stream({"question": summary_question(short)})
+    return tokens
+
+
 def get_key_points(chain: SimpleChain, count: int = 8) -> List[str]:
     """Extract key points from document"""
     try:
@@ -242,10 +601,59 @@ def get_key_points(chain: SimpleChain, count: int = 8) -> List[str]:
         return [f"Error extracting key points: {str(e)}"]
 
 
-import re
+def generate_quiz(chain: SimpleChain, n_questions: int = 5) -> Tuple[list, bool]:
+    """Generate multiple-choice quiz from document.
 
-def generate_quiz(chain: SimpleChain, n_questions: int = 5) -> list:
-    """Generate multiple-choice quiz from document"""
+    Returns (quiz, is_fallback): when nothing valid could be generated the
+    quiz is a stand-in that callers should show but never cache. With
+    llama.cpp grammars available the completion is constrained to the quiz
+    JSON schema, so it parses on the first pass and needs no retry.
+    """
+    start = time.perf_counter()
+    grammar = quiz_grammar(n_questions)
+    if grammar is None:
+        return _generate_quiz_freeform(chain, n_questions, start)
+    
+    quiz = []
+    try:
+        logger.info(f"Generating {n_questions} quiz questions (grammar-constrained)...")
+        res = chain.run(
+            {"question": QUIZ_PROMPT.format(n=n_questions)},
+            grammar=grammar,
+            max_tokens=quiz_max_tokens(n_questions)
+        )
+        quiz = read_quiz(str(res))
+    except Exception as e:
+        logger.error(f"Quiz generation error: {e}")
+    
+    record_quiz("constrained", time.perf_counter() - start, 1, parsed=bool(quiz), fallback=not quiz)
+    if quiz:
+        logger.info(f"✅ Returning {len(quiz)} validated questions")
+        return quiz, False
+    logger.warning("Constrained quiz did not parse, using fallback quiz")
+    return fallback_quiz(), True
+
+
+def stream_quiz(chain: SimpleChain, n_questions: int = 5):
+    """Yield quiz questions one by one, each generated independently from its own passage"""
+    return iter_quiz_questions(chain, n_questions)
+
+
+def generate_quiz_parallel(chain: SimpleChain, n_questions: int = 5) -> Tuple[list, bool]:
+    """Per-question quiz generation, collected; returns (quiz, is_fallback) like generate_quiz"""
+    try:
+        quiz = list(stream_quiz(chain, n_questions))
+    except Exception as e:
+        logger.error(f"Quiz generation error: {e}")
+        quiz = []
+    if quiz:
+        return quiz, False
+    return fallback_quiz(), True
+
+
+def _generate_quiz_freeform(chain: SimpleChain, n_questions: int, start: float) -> Tuple[list, bool]:
+    """Prompt-only JSON quiz for when grammars are unavailable"""
+    llm_calls = 0
     try:
         
         prompt = f"""Based on the PDF content, create exactly {n_questions} multiple-choice questions.
@@ -290,80 +698,16 @@ Generate {n_questions} questions now in the exact JSON format shown above."""
 
         logger.info(f"Generating {n_questions} quiz questions...")
         res = chain.run({"question": prompt})
+        llm_calls += 1
         res_str = str(res).strip()
         
         logger.info(f"Raw LLM response: {res_str[:200]}...")
         
-        quiz = None
-        
-        try:
-            parsed = json.loads(res_str)
-            quiz = parsed.get("quiz", [])
-            if quiz:
-                logger.info(f"✅ Parsed {len(quiz)} questions via direct parse")
-        except json.JSONDecodeError:
-            logger.warning("Direct JSON parse failed, trying regex extraction")
-        
-        if not quiz:
-            match = re.search(r'\{[^{}]*"quiz"\s*:\s*\[.*?\]\s*\}', res_str, re.DOTALL)
-            if match:
-                try:
-                    parsed = json.loads(match.group())
-                    quiz = parsed.get("quiz", [])
-                    if quiz:
-                        logger.info(f"✅ Parsed {len(quiz)} questions via regex")
-                except json.JSONDecodeError:
-                    logger.warning("Regex extracted JSON is invalid")
-        
-        if not quiz:
-            match = re.search(r'\[(?:[^[\]]|\[[^\]]*\])*\]', res_str, re.DOTALL)
-            if match:
-                try:
-                    quiz = json.loads(match.group())
-                    if isinstance(quiz, list) and quiz:
-                        logger.info(f"✅ Parsed {len(quiz)} questions from array")
-                except json.JSONDecodeError:
-                    logger.warning("Array extraction failed")
-        
-        if quiz and isinstance(quiz, list):
-            validated_quiz = []
-            for i, item in enumerate(quiz):
-               
-                if not isinstance(item, dict):
-                    continue
-                
-                q_text = item.get("q") or item.get("question") or f"Question {i+1}"
-                options = item.get("options") or item.get("choices") or []
-                answer = item.get("answer")
-                explanation = item.get("explanation") or "Check the document for details."
-                
-                
-                if not isinstance(options, list) or len(options) < 2:
-                    continue
-                
-                while len(options) < 4:
-                    options.append(f"Additional option {len(options) + 1}")
-                options = options[:4]
-                
-                if answer is None:
-                    answer = 0
-                elif isinstance(answer, str):
-                    
-                    letter_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-                    answer = letter_map.get(answer.upper(), 0)
-                else:
-                    answer = int(answer) if 0 <= int(answer) < len(options) else 0
-                
-                validated_quiz.append({
-                    "q": str(q_text),
-                    "options": [str(opt) for opt in options],
-                    "answer": answer,
-                    "explanation": str(explanation)
-                })
-            
-            if validated_quiz:
-                logger.info(f"✅ Returning {len(validated_quiz)} validated questions")
-                return validated_quiz
+        validated_quiz = read_quiz(res_str)
+        if validated_quiz:
+            logger.info(f"✅ Returning {len(validated_quiz)} validated questions")
+            record_quiz("freeform", time.perf_counter() - start, llm_calls, parsed=True, fallback=False)
+            return validated_quiz, False
         
         logger.warning("All parsing strategies failed, using fallback quiz")
         raise ValueError("Could not parse quiz from LLM response")
@@ -375,11 +719,13 @@ Generate {n_questions} questions now in the exact JSON format shown above."""
             
             context_prompt = "What are the 4 main topics or concepts discussed in this PDF? List them briefly."
             context_res = chain.run({"question": context_prompt})
+            llm_calls += 1
             context_str = str(context_res)
             
             topics = [line.strip() for line in context_str.split('\n') if line.strip()][:4]
             
             if len(topics) >= 2:
+                record_quiz("freeform", time.perf_counter() - start, llm_calls, parsed=False, fallback=True)
                 return [
                     {
                         "q": "What is one of the main topics discussed in the document?",
@@ -387,23 +733,30 @@ Generate {n_questions} questions now in the exact JSON format shown above."""
                         "answer": 0,
                         "explanation": "This topic is covered in the document."
                     }
-                ]
+                ], True
         except:
             pass
         
-        return [
-            {
-                "q": "Based on the document, what would you say is the primary focus?",
-                "options": [
-                    "Theoretical concepts and frameworks",
-                    "Practical applications and examples", 
-                    "Historical background and context",
-                    "Future trends and predictions"
-                ],
-                "answer": 0,
-                "explanation": "Review the document to determine the primary focus."
-            }
-        ]
+        record_quiz("freeform", time.perf_counter() - start, llm_calls, parsed=False, fallback=True)
+        return fallback_quiz(), True
+
+
+def fallback_quiz() -> list:
+    """Canned single question returned when no quiz could be generated"""
+    return [
+        {
+            "q": "Based on the document, what would you say is the primary focus?",
+            "options": [
+                "Theoretical concepts and frameworks",
+                "Practical applications and examples", 
+                "Historical background and context",
+                "Future trends and predictions"
+            ],
+            "answer": 0,
+            "explanation": "Review the document to determine the primary focus."
+        }
+    ]
+
 
 def answer_question(chain: SimpleChain, question: str) -> str:
     """Answer a user question based on document"""
@@ -414,26 +767,69 @@ def answer_question(chain: SimpleChain, question: str) -> str:
         return f"Error answering question: {str(e)}"
 
 
+def answer_questions(chain: SimpleChain, questions: List[str]) -> Dict[str, Any]:
+    """Answer a batch of questions with shared retrieval and generation"""
+    start = time.perf_counter()
+    answers, retrieve_s = chain.run_batch(questions)
+    return {
+        "answers": answers,
+        "timings": {
+            "retrieve_s": retrieve_s,
+            "total_s": round(time.perf_counter() - start, 3)
+        }
+    }
+
+
+
+def stream_answer(chain: SimpleChain, question: str):
+    """Yield answer tokens as they are generated"""
+    return chain.stream({"question": question})
+
+
+def document_id(persist_dir: str = None):
+    """Documents are identified by their store directory name (the content hash)"""
+    return os.path.basename(os.path.normpath(persist_dir)) if persist_dir else None
+
 
-def prepare_pipeline(pdf_path: str, persist_dir: str = None):
-    """Build complete pipeline: load PDF, chunk, embed, create chain"""
+def prepare_pipeline(pdf_path: str, persist_dir: str = None, on_progress=None):
+    """Build complete pipeline: load PDF, chunk, embed, create chain.
+
+    on_progress(stage, **info) is called as pages are extracted ("extract"),
+    chunks created ("chunk"), chunks embedded ("embed") and the model loaded ("llm").
+    """
     try:
+        start = time.perf_counter()
         logger.info(f"🚀 Starting pipeline for: {pdf_path}")
         
-        docs = load_and_chunk(pdf_path)
-        logger.info(f"✂️ Created {len(docs)} chunks")
+        # Chunks stream straight from the PDF parser into the embedder
+        docs = iter_chunks(pdf_path, on_progress=on_progress)
         
-        vect = build_vectorstore(docs, persist_dir=persist_dir)
+        vect = build_vectorstore(docs, persist_dir=persist_dir, on_progress=on_progress)
         logger.info("✅ Vector store ready")
         
         logger.info("⚙️ Initializing LLM (this may take a moment)...")
+        report(on_progress, "llm")
         llm = create_llm()
         
         logger.info("🔗 Creating Q&A chain...")
-        chain = create_conversational_chain(llm, vect)
+        chain = create_conversational_chain(llm, vect, document=document_id(persist_dir))
         
+        observe_stage("pipeline", time.perf_counter() - start)
         logger.info("✅ Pipeline ready!")
         return chain
     except Exception as e:
         logger.error(f"❌ Pipeline error: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+
+def open_pipeline(persist_dir: str):
+    """Rebuild a chain from an already persisted vector store"""
+    try:
+        vect = load_vectorstore(persist_dir)
+        llm = create_llm()
+        chain = create_conversational_chain(llm, vect, document=document_id(persist_dir))
+        logger.info("✅ Pipeline reopened!")
+        return chain
+    except Exception as e:
+        logger.error(f"❌ Pipeline reopen error: {e}", exc_info=True)
+        raise
@@ -0,0 +1,175 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Memory for saved llama.cpp states (KV cache + logits) per model process; off
+# by default. A state of a full 4096-token context is ~450 MB, so e.g. 2048
+# holds 4-5 of them, in every model worker
+PROMPT_CACHE_MB = int(os.environ.get("PROMPT_CACHE_MB", 0))
+# Shorter shared prefixes are not worth a state restore. Above the longest
+# template preamble (~80 tokens), so only prefixes that share document
+# context (half a CHUNK_TOKENS chunk or more) are saved and restored
+PROMPT_CACHE_MIN_PREFIX = int(os.environ.get("PROMPT_CACHE_MIN_PREFIX", 128))
+# States kept per namespace (document and prompt template)
+PROMPT_CACHE_STATES_PER_KEY = int(os.environ.get("PROMPT_CACHE_STATES_PER_KEY", 2))
+
+
+def common_prefix(a: Sequence[int], b: Sequence[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+class PromptStateCache:
+    """LRU of saved llama.cpp states, looked up by longest shared token prefix.
+
+    Plugged in with Llama.set_cache(): before evaluating a prompt llama.cpp
+    asks for the state whose tokens share the longest prefix with it,
+    restores it and only evaluates the remaining tokens; after generating
+    it stores the new state. Entries are grouped by `namespace` (document
+    and prompt template, set by SharedLLM before each call) so lookups only
+    compare against states of the same kind, and a document's states can be
+    dropped when it is unloaded.
+
+    States are hundreds of MB, so one is only kept when the namespace's
+    previous prompt shared at least min_prefix tokens with it (a one-off
+    prompt is never saved), and each namespace keeps at most
+    per_key states.
+    """
+    def __init__(self, capacity_bytes: int = PROMPT_CACHE_MB * 1024 * 1024,
+                 min_prefix: int = PROMPT_CACHE_MIN_PREFIX,
+                 per_key: int = PROMPT_CACHE_STATES_PER_KEY):
+        self.capacity_bytes = capacity_bytes
+        self.min_prefix = min_prefix
+        self.per_key = max(1, per_key)
+        self.namespace: Optional[Tuple] = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {(namespace, tokens): state}
+        self._prompts = OrderedDict()  # {namespace: (previous prompt, latest prompt)}
+        self.bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.reused_tokens = 0
+        self.saves = 0
+        self.skipped_saves = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(state) -> int:
+        return int(getattr(state, "llama_state_size", 0) or 0)
+
+    def _find(self, tokens: Tuple[int, ...]):
+        best_key, best_len = None, 0
+        for key in self._entries:
+            namespace, saved = key
+            if self.namespace is not None and namespace != self.namespace:
+                continue
+            n = common_prefix(saved, tokens)
+            if n > best_len:
+                best_key, best_len = key, n
+        return best_key, best_len
+
+    def __getitem__(self, tokens: Sequence[int]):
+        tokens = tuple(tokens)
+        with self._lock:
+            self.lookups += 1
+            self._remember(tokens)
+            key, prefix = self._find(tokens)
+            if key is None or prefix < self.min_prefix:
+                raise KeyError(tokens[:8])
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.reused_tokens += prefix
+            logger.debug(f"♻️ Prompt prefix hit: {prefix}/{len(tokens)} tokens reused")
+            return self._entries[key]
+
+    def _remember(self, tokens: Tuple[int, ...]):
+        """Note a prompt about to be evaluated in the current namespace"""
+        previous, latest = self._prompts.pop(self.namespace, (None, None))
+        self._prompts[self.namespace] = (previous, latest) if tokens == latest else (latest, tokens)
+        while len(self._prompts) > 1024:
+            self._prompts.popitem(last=False)
+
+    def _evict(self, key):
+        self.bytes -= self._size(self._entries.pop(key))
+        self.evictions += 1
+
+    def __contains__(self, tokens: Sequence[int]) -> bool:
+        tokens = tuple(tokens)
+        with self._lock:
+            self._remember(tokens)
+            key, prefix = self._find(tokens)
+            return key is not None and prefix >= self.min_prefix
+
+    def __setitem__(self, tokens: Sequence[int], state):
+        tokens = tuple(tokens)
+        key = (self.namespace, tokens)
+        size = self._size(state)
+        if size > self.capacity_bytes:
+            return
+        with self._lock:
+            # The lookup before evaluation recorded this prompt; compare with the one before
+            previous, _ = self._prompts.get(self.namespace, (None, None))
+            if previous is None or common_prefix(previous, tokens) < self.min_prefix:
+                self.skipped_saves += 1
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= self._size(old)
+            same = [k for k in self._entries if k[0] == self.namespace]
+            for stale in same[:max(0, len(same) - self.per_key + 1)]:
+                self._evict(stale)
+            self._entries[key] = state
+            self.bytes += size
+            self.saves += 1
+            while self.bytes > self.capacity_bytes and self._entries:
+                self._evict(next(iter(self._entries)))
+
+    @property
+    def cache_size(self) -> int:
+        return self.bytes
+
+    def drop(self, document: str) -> int:
+        """Forget every state saved for a document; returns how many were dropped"""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] is not None and k[0][0] == document]
+            for key in keys:
+                self.bytes -= self._size(self._entries.pop(key))
+            for namespace in [n for n in self._prompts if n is not None and n[0] == document]:
+                del self._prompts[namespace]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "capacity_bytes": self.capacity_bytes,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "reused_tokens": self.reused_tokens,
+                "saves": self.saves,
+                "skipped_saves": self.skipped_saves,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else None,
+            }
+
+
+def attach_prompt_cache(llm) -> Optional[PromptStateCache]:
+    """Install a PromptStateCache on a LangChain LlamaCpp, if enabled and supported"""
+    client = getattr(llm, "client", None)
+    if PROMPT_CACHE_MB <= 0 or not hasattr(client, "set_cache"):
+        return None
+    cache = PromptStateCache()
+    client.set_cache(cache)
+    logger.info(f"🧩 Prompt prefix cache enabled ({PROMPT_CACHE_MB} MB)")
+    return cache
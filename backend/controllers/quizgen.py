@@ -0,0 +1,350 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional
+
+from controllers.summarizer import document_chunks
+from controllers.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+# Constrain quiz sampling to the quiz JSON schema when llama.cpp grammars are available
+QUIZ_GRAMMAR = os.environ.get("QUIZ_GRAMMAR", "true").lower() in ("1", "true", "yes")
+QUESTION_MAX_CHARS = 200
+OPTION_MAX_CHARS = 100
+EXPLANATION_MAX_CHARS = 240
+# Keys, quotes, brackets and the answer index of one quiz item
+QUIZ_ITEM_JSON_TOKENS = 40
+
+# Generation budget per question: the schema's longest item at ~3 chars per
+# token (840 chars -> 280 tokens) plus its JSON, 320 tokens by default
+QUIZ_TOKENS_PER_QUESTION = int(os.environ.get(
+    "QUIZ_TOKENS_PER_QUESTION",
+    math.ceil((QUESTION_MAX_CHARS + 4 * OPTION_MAX_CHARS + EXPLANATION_MAX_CHARS) / 3) + QUIZ_ITEM_JSON_TOKENS
+))
+# Questions per request; 8 x 320 tokens still leaves ~1.5k tokens of a
+# 4096-token context for the document
+QUIZ_MAX_QUESTIONS = int(os.environ.get("QUIZ_MAX_QUESTIONS", 8))
+
+# No worked example needed: the grammar enforces the shape
+QUIZ_PROMPT = (
+    "Create exactly {n} multiple-choice questions that test comprehension of this PDF. "
+    "Each question has 4 options taken from the PDF content, 'answer' is the index (0-3) "
+    "of the correct option and 'explanation' says why. Return the quiz as JSON."
+)
+
+# Per-question mode: questions generated independently, each from its own passage
+QUIZ_WORKERS = int(os.environ.get("QUIZ_WORKERS", 2))
+# Consecutive chunks shown to the model for one question
+QUIZ_PASSAGE_CHUNKS = int(os.environ.get("QUIZ_PASSAGE_CHUNKS", 2))
+# Questions whose word sets overlap at least this much count as duplicates
+QUIZ_DUPLICATE_SIMILARITY = float(os.environ.get("QUIZ_DUPLICATE_SIMILARITY", 0.8))
+
+QUESTION_PROMPT = """Based on the following passage from a PDF, create one multiple-choice question that tests comprehension of it.
+The question has 4 options taken from the passage, 'answer' is the index (0-3) of the correct option and 'explanation' says why.
+Return ONLY JSON like {{"quiz": [{{"q": "...", "options": ["...", "...", "...", "..."], "answer": 0, "explanation": "..."}}]}}
+
+Passage:
+{passage}
+
+JSON:"""
+
+_grammars = {}  # {n_questions: LlamaGrammar}
+_grammar_lock = threading.Lock()
+_grammar_unavailable = False
+
+
+def quiz_schema(n_questions: int) -> Dict[str, Any]:
+    """JSON schema of a quiz with exactly n_questions items"""
+    item = {
+        "type": "object",
+        "properties": {
+            "q": {"type": "string", "minLength": 1, "maxLength": QUESTION_MAX_CHARS},
+            "options": {
+                "type": "array",
+                "items": {"type": "string", "minLength": 1, "maxLength": OPTION_MAX_CHARS},
+                "minItems": 4,
+                "maxItems": 4
+            },
+            "answer": {"type": "integer", "enum": [0, 1, 2, 3]},
+            "explanation": {"type": "string", "maxLength": EXPLANATION_MAX_CHARS}
+        },
+        "required": ["q", "options", "answer", "explanation"]
+    }
+    return {
+        "type": "object",
+        "properties": {
+            "quiz": {"type": "array", "items": item, "minItems": n_questions, "maxItems": n_questions}
+        },
+        "required": ["quiz"]
+    }
+
+
+def quiz_grammar(n_questions: int):
+    """llama.cpp grammar for quiz_schema(n), or None when constrained sampling is unavailable"""
+    global _grammar_unavailable
+    if not QUIZ_GRAMMAR or _grammar_unavailable:
+        return None
+
+    with _grammar_lock:
+        grammar = _grammars.get(n_questions)
+        if grammar is not None:
+            return grammar
+        try:
+            from llama_cpp import LlamaGrammar
+            grammar = LlamaGrammar.from_json_schema(json.dumps(quiz_schema(n_questions)), verbose=False)
+        except Exception as e:
+            logger.warning(f"Quiz grammar unavailable, using freeform JSON: {e}")
+            _grammar_unavailable = True
+            return None
+        _grammars[n_questions] = grammar
+        return grammar
+
+
+def quiz_max_tokens(n_questions: int) -> int:
+    return QUIZ_TOKENS_PER_QUESTION * n_questions + 32
+
+
+def clamp_questions(n_questions: int) -> int:
+    """Requested question count limited to 1..QUIZ_MAX_QUESTIONS"""
+    return max(1, min(n_questions, QUIZ_MAX_QUESTIONS))
+
+
+def parse_quiz(text: str) -> Optional[list]:
+    """Quiz items from a completion, trying a direct parse then regex extraction"""
+    text = text.strip()
+    try:
+        parsed = json.loads(text)
+        quiz = parsed.get("quiz", []) if isinstance(parsed, dict) else parsed
+        if quiz:
+            logger.info(f"✅ Parsed {len(quiz)} questions via direct parse")
+            return quiz
+    except json.JSONDecodeError:
+        logger.warning("Direct JSON parse failed, trying regex extraction")
+
+    match = re.search(r'\{[^{}]*"quiz"\s*:\s*\[.*?\]\s*\}', text, re.DOTALL)
+    if match:
+        try:
+            quiz = json.loads(match.group()).get("quiz", [])
+            if quiz:
+                logger.info(f"✅ Parsed {len(quiz)} questions via regex")
+                return quiz
+        except json.JSONDecodeError:
+            logger.warning("Regex extracted JSON is invalid")
+
+    match = re.search(r'\[(?:[^[\]]|\[[^\]]*\])*\]', text, re.DOTALL)
+    if match:
+        try:
+            quiz = json.loads(match.group())
+            if isinstance(quiz, list) and quiz:
+                logger.info(f"✅ Parsed {len(quiz)} questions from array")
+                return quiz
+        except json.JSONDecodeError:
+            logger.warning("Array extraction failed")
+    return None
+
+
+def validate_quiz(quiz) -> List[Dict[str, Any]]:
+    """Normalize quiz items to {q, options[4], answer, explanation}, dropping unusable ones"""
+    if not quiz or not isinstance(quiz, list):
+        return []
+
+    validated_quiz = []
+    for i, item in enumerate(quiz):
+        if not isinstance(item, dict):
+            continue
+
+        q_text = item.get("q") or item.get("question") or f"Question {i+1}"
+        options = item.get("options") or item.get("choices") or []
+        answer = item.get("answer")
+        explanation = item.get("explanation") or "Check the document for details."
+
+        if not isinstance(options, list) or len(options) < 2:
+            continue
+
+        while len(options) < 4:
+            options.append(f"Additional option {len(options) + 1}")
+        options = options[:4]
+
+        if answer is None:
+            answer = 0
+        elif isinstance(answer, str):
+            letter_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+            answer = letter_map.get(answer.upper(), 0)
+        else:
+            answer = int(answer) if 0 <= int(answer) < len(options) else 0
+
+        validated_quiz.append({
+            "q": str(q_text),
+            "options": [str(opt) for opt in options],
+            "answer": answer,
+            "explanation": str(explanation)
+        })
+    return validated_quiz
+
+
+def read_quiz(text: str) -> List[Dict[str, Any]]:
+    """Parse and validate a completion (timed as the quiz_parse stage)"""
+    with stage_timer("quiz_parse"):
+        return validate_quiz(parse_quiz(text))
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def is_duplicate(question: Dict[str, Any], accepted: List[Dict[str, Any]]) -> bool:
+    """True if the question text (nearly) repeats an accepted question"""
+    words = _words(question["q"])
+    if not words:
+        return True
+    for other in accepted:
+        other_words = _words(other["q"])
+        overlap = len(words & other_words) / len(words | other_words)
+        if overlap >= QUIZ_DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def quiz_passages(chain, count: int) -> List[str]:
+    """Passages to write questions from, spread across the document.
+
+    The first `count` passages are evenly spaced over the document; the
+    rest follow as spares for replacing failed or duplicate questions.
+    """
+    chunks = document_chunks(chain)
+    if not chunks:
+        # Store cannot list its chunks: use the most relevant retrieved ones
+        scored = chain.retrieve_scored("What are the main concepts and facts in this document?")
+        chunks = [doc.page_content for doc, _ in scored]
+    passages = [
+        "\n\n".join(chunks[i:i + QUIZ_PASSAGE_CHUNKS])
+        for i in range(0, len(chunks), QUIZ_PASSAGE_CHUNKS)
+    ]
+    if len(passages) <= count:
+        return passages
+    step = len(passages) / count
+    first = sorted({int(i * step) for i in range(count)})
+    return [passages[i] for i in first] + [p for i, p in enumerate(passages) if i not in first]
+
+
+def generate_question(llm, passage: str, cache_key=None) -> Optional[Dict[str, Any]]:
+    """One validated question about a passage, or None if the completion is unusable"""
+    grammar = quiz_grammar(1)
+    kwargs = {"max_tokens": quiz_max_tokens(1), "cache_key": cache_key}
+    if grammar is not None:
+        kwargs["grammar"] = grammar
+    res = llm.invoke(QUESTION_PROMPT.format(passage=passage), **kwargs)
+    questions = read_quiz(str(res))
+    return questions[0] if questions else None
+
+
+_executor = ThreadPoolExecutor(max_workers=QUIZ_WORKERS, thread_name_prefix="quiz")
+
+
+def iter_quiz_questions(chain, n_questions: int):
+    """Yield up to n_questions distinct questions as each one is generated.
+
+    At most QUIZ_WORKERS questions are in flight; a failed or duplicate
+    question is replaced with one from the next spare passage, up to
+    2 * n_questions attempts in total. Closing
+    the generator cancels questions that have not started.
+    """
+    start = time.perf_counter()
+    passages = iter(quiz_passages(chain, n_questions))
+    in_flight = set()
+    accepted = []
+    attempts = 0
+    duplicates = 0
+
+    def fill():
+        nonlocal attempts
+        while len(in_flight) < QUIZ_WORKERS and len(accepted) + len(in_flight) < n_questions:
+            passage = next(passages, None) if attempts < 2 * n_questions else None
+            if passage is None:
+                return
+            attempts += 1
+            in_flight.add(_executor.submit(
+                generate_question, chain.llm, passage, chain.cache_key("quiz_question")
+            ))
+
+    try:
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                try:
+                    question = future.result()
+                except Exception as e:
+                    logger.warning(f"Quiz question failed: {e}")
+                    continue
+                if question is None:
+                    continue
+                if is_duplicate(question, accepted) or len(accepted) >= n_questions:
+                    duplicates += 1
+                    continue
+                accepted.append(question)
+                logger.info(f"✅ Quiz question {len(accepted)}/{n_questions} ready")
+                yield question
+            fill()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        record_quiz("parallel", time.perf_counter() - start, attempts,
+                    parsed=bool(accepted), fallback=False, duplicates=duplicates)
+
+
+class QuizStats:
+    """Latency, LLM calls and parse failures of quiz generation, per mode"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes = {}
+
+    def record(self, mode: str, seconds: float, llm_calls: int, parsed: bool, fallback: bool,
+               duplicates: int = 0):
+        with self._lock:
+            m = self._modes.setdefault(mode, {
+                "calls": 0, "llm_calls": 0, "parse_failures": 0, "fallbacks": 0,
+                "duplicates_dropped": 0, "total_s": 0.0
+            })
+            m["duplicates_dropped"] += duplicates
+            m["calls"] += 1
+            m["llm_calls"] += llm_calls
+            m["parse_failures"] += 0 if parsed else 1
+            m["fallbacks"] += 1 if fallback else 0
+            m["total_s"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for mode, m in self._modes.items():
+                out[mode] = {
+                    **{k: v for k, v in m.items() if k != "total_s"},
+                    "avg_s": round(m["total_s"] / m["calls"], 3),
+                    "parse_failure_rate": round(m["parse_failures"] / m["calls"], 3),
+                    "llm_calls_per_quiz": round(m["llm_calls"] / m["calls"], 2),
+                }
+            return out
+
+
+_stats = QuizStats()
+
+
+def record_quiz(mode: str, seconds: float, llm_calls: int, parsed: bool, fallback: bool,
+                duplicates: int = 0):
+    _stats.record(mode, seconds, llm_calls, parsed, fallback, duplicates)
+
+
+def get_quiz_stats() -> Dict[str, Any]:
+    """Quiz generation counters, keyed by "constrained" / "freeform" / "parallel" """
+    return {
+        "grammar_enabled": QUIZ_GRAMMAR and not _grammar_unavailable,
+        **_stats.stats()
+    }
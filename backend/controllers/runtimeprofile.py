@@ -0,0 +1,417 @@
+"""llama.cpp runtime settings fitted to the host.
+
+Threads, batch size and GPU offload come, in increasing priority, from host
+defaults (physical cores in this process's affinity), a calibrated profile
+(RUNTIME_PROFILE_PATH, written by the micro-benchmark below) and overrides
+(LLM_THREADS, LLM_RUNTIME='{"n_threads": 6, "n_batch": 256}').
+
+The profile file holds one profile per host signature (CPU model and
+physical cores), so model workers pinned to different core slices keep
+their own calibration side by side.
+
+Calibrate (from backend/):
+    python -m controllers.runtimeprofile [--model path.gguf] [--prompt-tokens 512] [--gen-tokens 32]
+or set LLM_AUTOTUNE=true to calibrate before the first model load when no
+profile matches this host. The model is loaded once and calibration stops
+after CALIBRATE_MAX_SECONDS with the best settings measured so far.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import threading
+from contextlib import contextmanager
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+RUNTIME_PROFILE_PATH = os.environ.get("RUNTIME_PROFILE_PATH", "./llm_runtime.json")
+# Calibrate on first model load if no profile matches this host
+LLM_AUTOTUNE = os.environ.get("LLM_AUTOTUNE", "false").lower() == "true"
+# Request shape the settings are scored on: a retrieval prompt and an answer
+TUNE_PROMPT_TOKENS = int(os.environ.get("TUNE_PROMPT_TOKENS", 1500))
+TUNE_ANSWER_TOKENS = int(os.environ.get("TUNE_ANSWER_TOKENS", 200))
+BATCH_CANDIDATES = (64, 128, 256, 512)
+# Benchmark prompt: just long enough to try every batch candidate
+CALIBRATE_PROMPT_TOKENS = int(os.environ.get("CALIBRATE_PROMPT_TOKENS", max(BATCH_CANDIDATES)))
+# Stop calibrating after this long (0 = measure every candidate)
+CALIBRATE_MAX_SECONDS = float(os.environ.get("CALIBRATE_MAX_SECONDS", 120))
+
+# Keys this module decides; everything else in LLM_KWARGS is left alone
+RUNTIME_KEYS = ("n_threads", "n_threads_batch", "n_batch", "n_gpu_layers")
+
+_applied = None  # {"settings": ..., "sources": ...} of the last model load
+_applied_lock = threading.Lock()
+
+
+def affinity_cpus() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def physical_cores(cpus: Optional[List[int]] = None) -> int:
+    """Distinct physical cores among the given logical CPUs (SMT siblings counted once)"""
+    cpus = cpus if cpus is not None else affinity_cpus()
+    cores = set()
+    for cpu in cpus:
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology/"
+        try:
+            with open(topology + "physical_package_id") as f:
+                package = f.read().strip()
+            with open(topology + "core_id") as f:
+                cores.add((package, f.read().strip()))
+        except OSError:
+            return len(cpus)
+    return len(cores) or len(cpus)
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def gpu_offload_supported() -> bool:
+    try:
+        import llama_cpp
+        return bool(llama_cpp.llama_supports_gpu_offload())
+    except Exception:
+        return False
+
+
+def host_info() -> Dict[str, Any]:
+    cpus = affinity_cpus()
+    return {
+        "cpu_model": cpu_model(),
+        "logical_cpus": len(cpus),
+        "physical_cores": physical_cores(cpus),
+        "gpu_offload": gpu_offload_supported(),
+    }
+
+
+def host_defaults(host: Dict[str, Any]) -> Dict[str, Any]:
+    """Uncalibrated settings: one thread per physical core, offload only with a GPU build"""
+    return {
+        "n_threads": host["physical_cores"],
+        "n_threads_batch": host["physical_cores"],
+        "n_batch": 512,
+        "n_gpu_layers": 32 if host["gpu_offload"] else 0,
+    }
+
+
+def host_signature(host: Dict[str, Any]) -> str:
+    """Key of a host's profile in the profile file"""
+    return f"{host['cpu_model']}|{host['physical_cores']} cores"
+
+
+def _read_profiles(path: str) -> Dict[str, Dict[str, Any]]:
+    """{host signature: profile}; a file holding a single profile is read as one entry"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable runtime profile {path}: {e}")
+        return {}
+    if "profiles" in data:
+        return data["profiles"]
+    return {host_signature(data["host"]): data} if "host" in data else {}
+
+
+def load_profile(path: str = RUNTIME_PROFILE_PATH, host: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """The profile calibrated for this host, if any"""
+    host = host or host_info()
+    return _read_profiles(path).get(host_signature(host))
+
+
+def profile_matches(profile: Optional[Dict[str, Any]], host: Dict[str, Any]) -> bool:
+    """A profile only applies to the CPU and core count it was measured on"""
+    if not profile:
+        return False
+    measured = profile.get("host", {})
+    return (measured.get("cpu_model") == host["cpu_model"]
+            and measured.get("physical_cores") == host["physical_cores"])
+
+
+def env_overrides() -> Dict[str, Any]:
+    overrides = {}
+    raw = os.environ.get("LLM_RUNTIME")
+    if raw:
+        try:
+            overrides.update({k: v for k, v in json.loads(raw).items() if k in RUNTIME_KEYS})
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Ignoring invalid LLM_RUNTIME: {e}")
+    if os.environ.get("LLM_THREADS"):
+        overrides.setdefault("n_threads", int(os.environ["LLM_THREADS"]))
+        overrides.setdefault("n_threads_batch", int(os.environ["LLM_THREADS"]))
+    return overrides
+
+
+def resolve_settings(host: Optional[Dict[str, Any]] = None, profile: Optional[Dict[str, Any]] = None):
+    """(settings, sources): each runtime key and where its value came from"""
+    host = host or host_info()
+    settings = host_defaults(host)
+    sources = {key: "host" for key in settings}
+    if profile_matches(profile, host):
+        for key, value in profile.get("settings", {}).items():
+            if key in RUNTIME_KEYS:
+                settings[key] = value
+                sources[key] = "profile"
+    for key, value in env_overrides().items():
+        settings[key] = value
+        sources[key] = "env"
+    return settings, sources
+
+
+def runtime_kwargs(base: Dict[str, Any], model_path: Optional[str] = None) -> Dict[str, Any]:
+    """LlamaCpp kwargs with the runtime settings applied (calibrating first if LLM_AUTOTUNE)"""
+    global _applied
+    host = host_info()
+    profile = load_profile(host=host)
+    if LLM_AUTOTUNE and model_path and not profile_matches(profile, host):
+        try:
+            profile = calibrate(model_path, host=host)
+            save_profile(profile)
+        except Exception as e:
+            logger.error(f"❌ Runtime calibration failed, using host defaults: {e}")
+    settings, sources = resolve_settings(host, profile)
+    with _applied_lock:
+        _applied = {"settings": settings, "sources": sources}
+    logger.info(f"⚙️ llama.cpp runtime: {settings} ({sources})")
+
+    kwargs = {**base, **{k: v for k, v in settings.items() if k != "n_threads_batch"}}
+    # LlamaCpp has no field for it; passed straight through to llama_cpp.Llama
+    kwargs["model_kwargs"] = {**base.get("model_kwargs", {}), "n_threads_batch": settings["n_threads_batch"]}
+    return kwargs
+
+
+def candidate_threads(host: Dict[str, Any]) -> List[int]:
+    physical, logical = host["physical_cores"], host["logical_cpus"]
+    candidates = {physical, max(1, physical // 2), max(1, physical - 1), max(1, physical * 3 // 4), logical}
+    return sorted(candidates)
+
+
+class LlamaBenchmark:
+    """Timing function for calibrate(): prompt eval then single-token decode steps.
+
+    The model is loaded once; thread counts are changed on the live context
+    (reloading only when llama_set_n_threads is missing) and batch sizes per
+    eval, since Llama.eval splits the prompt into n_batch-token pieces.
+    """
+    def __init__(self, model_path: str, prompt_tokens: int, gen_tokens: int, n_gpu_layers: int = 0,
+                 max_batch: int = max(BATCH_CANDIDATES)):
+        self.model_path = model_path
+        self.prompt_tokens = prompt_tokens
+        self.gen_tokens = gen_tokens
+        self.n_gpu_layers = n_gpu_layers
+        self.max_batch = max_batch
+        self.llm = None
+        self.n_threads = None
+        self.tokens = None
+
+    def _model(self, n_threads: int):
+        import llama_cpp
+
+        if self.llm is not None and self.n_threads != n_threads:
+            set_threads = getattr(llama_cpp, "llama_set_n_threads", None)
+            if set_threads is not None:
+                set_threads(self.llm._ctx.ctx, n_threads, n_threads)
+                self.n_threads = n_threads
+            else:
+                self.close()
+        if self.llm is None:
+            self.llm = llama_cpp.Llama(model_path=self.model_path, n_threads=n_threads, n_threads_batch=n_threads,
+                                       n_batch=self.max_batch, n_ctx=self.prompt_tokens + self.gen_tokens + 16,
+                                       n_gpu_layers=self.n_gpu_layers, verbose=False)
+            self.n_threads = n_threads
+            text = "The quick brown fox jumps over the lazy dog near the river bank. "
+            self.tokens = self.llm.tokenize((text * (self.prompt_tokens // 8 + 1)).encode())[:self.prompt_tokens]
+        return self.llm
+
+    def __call__(self, n_threads: int, n_batch: int) -> Dict[str, float]:
+        llm = self._model(n_threads)
+        llm.n_batch = min(n_batch, self.max_batch)
+        llm.reset()
+        start = time.perf_counter()
+        llm.eval(self.tokens)
+        prompt_s = time.perf_counter() - start
+        # Decode speed does not depend on which token is fed back
+        start = time.perf_counter()
+        for token in self.tokens[:self.gen_tokens]:
+            llm.eval([token])
+        decode_s = time.perf_counter() - start
+        return {"prompt_tps": len(self.tokens) / prompt_s, "decode_tps": self.gen_tokens / decode_s}
+
+    def close(self):
+        if self.llm is not None:
+            close = getattr(self.llm, "close", None)
+            if close is not None:
+                close()
+            self.llm = None
+
+
+def llama_measure(model_path: str, prompt_tokens: int, gen_tokens: int, n_gpu_layers: int = 0) -> Callable:
+    return LlamaBenchmark(model_path, prompt_tokens, gen_tokens, n_gpu_layers)
+
+
+def pick_settings(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Decode is memory-bound and prompt eval compute-bound, so pick each side's best separately"""
+    decode = max(results, key=lambda r: r["decode_tps"])
+    prompt = max(results, key=lambda r: r["prompt_tps"])
+    return {
+        "n_threads": decode["n_threads"],
+        "n_threads_batch": prompt["n_threads"],
+        "n_batch": prompt["n_batch"],
+        "request_seconds": round(TUNE_PROMPT_TOKENS / prompt["prompt_tps"]
+                                 + TUNE_ANSWER_TOKENS / decode["decode_tps"], 3),
+    }
+
+
+def calibrate(model_path: str, host: Optional[Dict[str, Any]] = None, measure: Optional[Callable] = None,
+              prompt_tokens: int = CALIBRATE_PROMPT_TOKENS, gen_tokens: int = 32,
+              threads: Optional[List[int]] = None, batches=BATCH_CANDIDATES,
+              max_seconds: float = CALIBRATE_MAX_SECONDS) -> Dict[str, Any]:
+    """Time (threads, batch) candidates and return the profile to persist.
+
+    Rather than the full grid: every thread count at the largest batch
+    (physical cores first), then the smaller batches at the thread count
+    with the fastest prompt eval. Batches larger than the prompt are not
+    measured, and nothing new starts after max_seconds.
+    """
+    host = host or host_info()
+    n_gpu_layers = host_defaults(host)["n_gpu_layers"]
+    measure = measure or llama_measure(model_path, prompt_tokens, gen_tokens, n_gpu_layers)
+    threads = sorted(threads or candidate_threads(host), key=lambda t: (t != host["physical_cores"], -t))
+    batches = sorted(b for b in batches if b <= prompt_tokens) or [prompt_tokens]
+
+    logger.info(f"⏱️ Calibrating llama.cpp runtime: threads {threads}, batch {batches}")
+    start = time.perf_counter()
+    results = []
+
+    def run(n_threads: int, n_batch: int):
+        timing = measure(n_threads, n_batch)
+        results.append({"n_threads": n_threads, "n_batch": n_batch,
+                        "prompt_tps": round(timing["prompt_tps"], 2),
+                        "decode_tps": round(timing["decode_tps"], 2)})
+        logger.info(f"   threads={n_threads} batch={n_batch}: "
+                    f"{timing['prompt_tps']:.1f} prompt tok/s, {timing['decode_tps']:.1f} decode tok/s")
+
+    def out_of_time() -> bool:
+        if max_seconds and time.perf_counter() - start > max_seconds:
+            logger.warning(f"Calibration stopped after {max_seconds:.0f}s, using the best of {len(results)} runs")
+            return True
+        return False
+
+    try:
+        for n_threads in threads:
+            if results and out_of_time():
+                break
+            run(n_threads, batches[-1])
+        best_threads = max(results, key=lambda r: r["prompt_tps"])["n_threads"]
+        for n_batch in batches[:-1]:
+            if out_of_time():
+                break
+            run(best_threads, n_batch)
+    finally:
+        close = getattr(measure, "close", None)
+        if close is not None:
+            close()
+
+    best = pick_settings(results)
+    request_seconds = best.pop("request_seconds")
+    settings = {**best, "n_gpu_layers": n_gpu_layers}
+    logger.info(f"✅ Calibrated in {time.perf_counter() - start:.1f}s: {settings}")
+    return {
+        "created_at": datetime.now().isoformat(),
+        "model_path": os.path.abspath(model_path),
+        "host": host,
+        "settings": settings,
+        "expected_request_seconds": request_seconds,
+        "benchmark": {"prompt_tokens": prompt_tokens, "gen_tokens": gen_tokens},
+        "results": results,
+    }
+
+
+@contextmanager
+def _locked(path: str):
+    """Exclusive lock next to the profile file (workers may calibrate at the same time)"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def save_profile(profile: Dict[str, Any], path: str = RUNTIME_PROFILE_PATH):
+    """Store the profile under its host signature, keeping other hosts' profiles"""
+    with _locked(path):
+        profiles = _read_profiles(path)
+        profiles[host_signature(profile["host"])] = profile
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"profiles": profiles}, f, indent=2)
+        os.replace(tmp, path)
+    logger.info(f"💾 Runtime profile for {host_signature(profile['host'])} saved to {path}")
+
+
+def get_runtime_report() -> Dict[str, Any]:
+    """Host, persisted profile and the settings in effect (or that the next load would use)"""
+    host = host_info()
+    profile = load_profile(host=host)
+    with _applied_lock:
+        applied = _applied
+    if applied is None:
+        settings, sources = resolve_settings(host, profile)
+        applied = {"settings": settings, "sources": sources, "pending": True}
+    return {
+        "host": host,
+        "profile_path": os.path.abspath(RUNTIME_PROFILE_PATH),
+        "profile_key": host_signature(host),
+        "profile": profile,
+        "profile_matches_host": profile_matches(profile, host),
+        "autotune": LLM_AUTOTUNE,
+        "applied": applied,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate llama.cpp threads and batch size for this host")
+    parser.add_argument("--model", default=None, help="GGUF path (default: resolved like the app does)")
+    parser.add_argument("--prompt-tokens", type=int, default=CALIBRATE_PROMPT_TOKENS)
+    parser.add_argument("--gen-tokens", type=int, default=32)
+    parser.add_argument("--threads", default=None, help="comma-separated thread counts to try")
+    parser.add_argument("--out", default=RUNTIME_PROFILE_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    model_path = args.model
+    if model_path is None:
+        from controllers.pdfloader import resolve_model_path
+        model_path = resolve_model_path()
+    threads = [int(t) for t in args.threads.split(",")] if args.threads else None
+    profile = calibrate(model_path, prompt_tokens=args.prompt_tokens, gen_tokens=args.gen_tokens, threads=threads)
+    save_profile(profile, args.out)
+    print(json.dumps(profile["settings"], indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "./sessions.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    pdf_path TEXT NOT NULL,
+    db_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_at REAL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    filename TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_document ON sessions (content_hash);
+"""
+
+
+class SessionStore:
+    """Durable index of documents and the sessions attached to them.
+
+    Only metadata and paths are stored here; vector data stays in the
+    per-document vector store directory and is reopened on demand.
+
+    Several server processes can share one store. A document being
+    ingested is claimed by the process doing it (`claimed_by`), which
+    renews the claim while the job is queued or running; an interrupted
+    ingestion is only picked up again once its claim has lapsed.
+    """
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # Stores created before ingestion claims existed
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            for column, kind in (("claimed_by", "TEXT"), ("claimed_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {column} {kind}")
+        logger.info(f"🗂️ Session store at: {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql: str, args=()) -> int:
+        with self._lock, self._connect() as conn:
+            return conn.execute(sql, args).rowcount
+
+    def _query(self, sql: str, args=()) -> List[Dict[str, Any]]:
+        with self._lock, self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, args).fetchall()]
+
+    def add_document(self, content_hash: str, pdf_path: str, db_path: str, owner: Optional[str] = None):
+        """Register a document as processing (replacing a failed attempt), claimed by `owner`"""
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO documents (content_hash, pdf_path, db_path, status, error, created_at,"
+            " claimed_by, claimed_at) VALUES (?, ?, ?, 'processing', NULL, ?, ?, ?)",
+            (content_hash, pdf_path, db_path, now, owner, now if owner else None)
+        )
+
+    def claim_document(self, content_hash: str, owner: str, lease: float) -> bool:
+        """Claim a processing document nobody holds, or whose claim is older than `lease` seconds"""
+        now = time.time()
+        return self._execute(
+            "UPDATE documents SET claimed_by = ?, claimed_at = ? WHERE content_hash = ?"
+            " AND status = 'processing' AND (claimed_by IS NULL OR claimed_at < ?)",
+            (owner, now, content_hash, now - lease)
+        ) == 1
+
+    def renew_claims(self, owner: str):
+        """Keep the claims of an owner that is still alive"""
+        self._execute(
+            "UPDATE documents SET claimed_at = ? WHERE claimed_by = ? AND status = 'processing'",
+            (time.time(), owner)
+        )
+
+    def set_document_status(self, content_hash: str, status: str, error: Optional[str] = None):
+        self._execute(
+            "UPDATE documents SET status = ?, error = ? WHERE content_hash = ?",
+            (status, error, content_hash)
+        )
+
+    def delete_document(self, content_hash: str):
+        self._execute("DELETE FROM documents WHERE content_hash = ?", (content_hash,))
+
+    def add_session(self, session_id: str, content_hash: str, filename: str = None):
+        self._execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+            (session_id, content_hash, filename, time.time())
+        )
+
+    def delete_session(self, session_id: str):
+        self._execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def document(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM documents WHERE content_hash = ?", (content_hash,))
+        return rows[0] if rows else None
+
+    def session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
+        return rows[0] if rows else None
+
+    def documents(self) -> List[Dict[str, Any]]:
+        return self._query("SELECT * FROM documents")
+
+    def sessions(self, content_hash: Optional[str] = None) -> List[Dict[str, Any]]:
+        if content_hash is not None:
+            return self._query("SELECT * FROM sessions WHERE content_hash = ?", (content_hash,))
+        return self._query("SELECT * FROM sessions")
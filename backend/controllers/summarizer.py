@@ -0,0 +1,184 @@
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from controllers.responsecache import ResponseCache, RESPONSE_CACHE_DIR
+from controllers.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+# Average number of consecutive chunks summarized together in one map call
+# (~8 x 256 tokens); groups end where a chunk's hash says so, see _content_groups
+MAP_GROUP_CHUNKS = int(os.environ.get("SUMMARY_MAP_GROUP_CHUNKS", 8))
+# Average number of partial summaries combined per reduce call
+REDUCE_FANOUT = int(os.environ.get("SUMMARY_REDUCE_FANOUT", 4))
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", 2))
+
+MAP_PROMPT = """Summarize the following part of a PDF in a few sentences. Keep names, numbers and key ideas.
+
+Text:
+{text}
+
+Summary:"""
+
+REDUCE_PROMPT = """Combine these partial summaries of consecutive parts of a PDF into one concise summary.
+
+Partial summaries:
+{text}
+
+Summary:"""
+
+FINAL_PROMPT = """These are summaries of consecutive parts of a PDF.
+
+{text}
+
+{instruction}
+
+Answer:"""
+
+# Partial summaries keyed by a hash of their inputs, so an edited document
+# only recomputes the leaves and tree nodes whose inputs changed
+_partials = ResponseCache(
+    max_entries=int(os.environ.get("SUMMARY_CACHE_MAX_ENTRIES", 4096)),
+    disk_dir=os.path.join(RESPONSE_CACHE_DIR, "summaries") if RESPONSE_CACHE_DIR else None
+)
+_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary")
+
+
+def get_summary_cache_stats():
+    return _partials.stats()
+
+
+def _node_key(kind: str, parts: List[str]) -> str:
+    digest = hashlib.sha256()
+    digest.update(kind.encode())
+    for part in parts:
+        digest.update(b"\x00")
+        digest.update(part.encode())
+    return digest.hexdigest()
+
+
+def document_chunks(chain) -> Optional[List[str]]:
+    """Every chunk of the chain's document in page order, or None if unavailable"""
+    store = getattr(chain.retriever, "vectorstore", None)
+    if store is None or not hasattr(store, "get"):
+        return None
+    data = store.get(include=["documents", "metadatas"])
+    docs = data.get("documents") or []
+    metas = data.get("metadatas") or [{}] * len(docs)
+    order = sorted(range(len(docs)), key=lambda i: ((metas[i] or {}).get("page", 0), i))
+    return [docs[i] for i in order]
+
+
+def _content_groups(items: List[str], size: int, min_size: int = 1,
+                    budget: Optional[int] = None, cost: Optional[Callable[[str], int]] = None) -> List[List[str]]:
+    """Split items into runs that end after an item whose hash is 0 mod size.
+
+    Boundaries depend only on each item's own text, so inserting or removing
+    a chunk changes the group it lands in and leaves every other group (and
+    its cached summary) as it was. Runs are capped at 4 x size, and never
+    shorter than min_size except for the last one.
+
+    With a token `budget`, a run also ends before the item that would take
+    its `cost` over the budget: the hash cut points only apply within it.
+    """
+    groups, current, used = [], [], 0
+    for item in items:
+        n = cost(item) if budget is not None else 0
+        if current and budget is not None and used + n > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += n
+        cut = int(hashlib.sha256(item.encode()).hexdigest()[:8], 16) % size == 0
+        if len(current) >= min_size and (cut or len(current) >= 4 * size):
+            groups.append(current)
+            current, used = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _group_budget(chain, prompt: str) -> int:
+    """Tokens left for the parts of one map/reduce prompt, like SimpleChain.build_context"""
+    return chain.n_ctx - chain.answer_tokens - count_tokens(prompt.format(text=""), chain.llm)
+
+
+def _token_cost(chain) -> Callable[[str], int]:
+    counts = {}
+
+    def cost(text: str) -> int:
+        if text not in counts:
+            counts[text] = count_tokens(text, chain.llm) + 2  # + separator
+        return counts[text]
+
+    return cost
+
+
+def _summarize(chain, kind: str, prompt: str, parts: List[str]) -> str:
+    """One cached map/reduce step"""
+    key = _node_key(kind, parts)
+    cached = _partials.get(key)
+    if cached is not None:
+        return cached
+    text = prompt.format(text="\n\n".join(parts))
+    summary = str(chain.llm.invoke(text, cache_key=chain.cache_key(kind.split(":")[0]))).strip()
+    _partials.set(key, summary)
+    return summary
+
+
+def _reduce_levels(chain, chunks: List[str]) -> List[str]:
+    """Map chunk groups, then reduce level by level until REDUCE_FANOUT summaries remain"""
+    cost = _token_cost(chain)
+    groups = _content_groups(chunks, MAP_GROUP_CHUNKS, budget=_group_budget(chain, MAP_PROMPT), cost=cost)
+    logger.info(f"🗺️ Map step: {len(chunks)} chunks in {len(groups)} groups")
+    level = list(_executor.map(lambda g: _summarize(chain, "map", MAP_PROMPT, g), groups))
+
+    depth = 0
+    while len(level) > REDUCE_FANOUT:
+        depth += 1
+        # At least two summaries per group, so every level shrinks (unless the
+        # token budget cannot fit two, then the level is used as it is)
+        groups = _content_groups(level, REDUCE_FANOUT, min_size=2,
+                                 budget=_group_budget(chain, REDUCE_PROMPT), cost=cost)
+        if len(groups) == len(level):
+            logger.warning(f"Partial summaries too long to combine further ({len(level)} left)")
+            break
+        logger.info(f"🔻 Reduce level {depth}: {len(level)} -> {len(groups)} summaries")
+        level = list(_executor.map(lambda g: _summarize(chain, "reduce", REDUCE_PROMPT, g), groups))
+    return level
+
+
+def summarize_document(chain, instruction: str) -> Optional[str]:
+    """Map-reduce summary of the whole document, or None if chunks are not accessible"""
+    chunks = document_chunks(chain)
+    if not chunks:
+        return None
+    level = _reduce_levels(chain, chunks)
+    return _summarize(chain, "final:" + instruction, FINAL_PROMPT.replace("{instruction}", instruction), level)
+
+
+def stream_document_summary(chain, instruction: str):
+    """Like summarize_document, streaming the final step; None if chunks are not accessible"""
+    chunks = document_chunks(chain)
+    if not chunks:
+        return None
+
+    def generate():
+        level = _reduce_levels(chain, chunks)
+        key = _node_key("final:" + instruction, level)
+        cached = _partials.get(key)
+        if cached is not None:
+            yield cached
+            return
+        prompt = FINAL_PROMPT.replace("{instruction}", instruction).format(text="\n\n".join(level))
+        parts = []
+        for token in chain.llm.stream(prompt, cache_key=chain.cache_key("final")):
+            parts.append(token)
+            yield token
+        _partials.set(key, "".join(parts).strip())
+
+    return generate()
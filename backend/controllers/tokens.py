@@ -0,0 +1,17 @@
+import os
+
+# Rough characters per token for English text with the Mistral tokenizer
+CHARS_PER_TOKEN = float(os.environ.get("CHARS_PER_TOKEN", 4.0))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, deterministic token estimate (no tokenizer needed)"""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def count_tokens(text: str, llm=None) -> int:
+    """Exact count with the model's tokenizer when available, else an estimate"""
+    counter = getattr(llm, "count_tokens", None)
+    if counter is not None:
+        return counter(text)
+    return estimate_tokens(text)
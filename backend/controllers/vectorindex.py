@@ -0,0 +1,189 @@
+import os
+import json
+import uuid
+import threading
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+# Vector backend per document: "auto" (NumPy up to NUMPY_INDEX_MAX_CHUNKS chunks,
+# Chroma beyond), "numpy" or "chroma"
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "auto").lower()
+NUMPY_INDEX_MAX_CHUNKS = int(os.environ.get("NUMPY_INDEX_MAX_CHUNKS", 5000))
+
+# Files of a persisted NumPy index (load_vectorstore checks for INDEX_FILE)
+INDEX_FILE = "numpy_index.json"
+VECTORS_FILE = "vectors.npy"
+NORMS_FILE = "norms.npy"
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact cosine search over a contiguous float32 matrix of normalized vectors.
+
+    A PDF yields a few dozen to a few thousand chunks: one matrix-vector
+    product ranks them all in well under a millisecond, without Chroma's
+    SQLite and HNSW files. Persisted as .npy files that are memory-mapped
+    on load, plus a JSON file with the chunk texts and metadata.
+
+    Relevance scores are (1 + cosine) / 2, in [0, 1] like LangChain expects.
+    """
+    def __init__(self, embedding_function: Embeddings, dim: Optional[int] = None):
+        self.embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, dim or 0), dtype=np.float32)  # capacity grows by doubling
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._count = 0
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """(n, dim) normalized rows"""
+        return self._vectors[:self._count]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _append(self, vectors: np.ndarray):
+        n = len(vectors)
+        if self._vectors.shape[1] != vectors.shape[1]:
+            if self._count:
+                raise ValueError(f"Embedding size {vectors.shape[1]} != index size {self._vectors.shape[1]}")
+            self._vectors = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        if self._count + n > len(self._vectors) or not self._vectors.flags.writeable:
+            capacity = max(self._count + n, 2 * len(self._vectors), 64)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            grown[:self._count] = self._vectors[:self._count]
+            norms = np.empty(capacity, dtype=np.float32)
+            norms[:self._count] = self._norms[:self._count]
+            self._vectors, self._norms = grown, norms
+
+        norms = np.linalg.norm(vectors, axis=1)
+        self._norms[self._count:self._count + n] = norms
+        self._vectors[self._count:self._count + n] = vectors / np.maximum(norms, 1e-12)[:, None]
+        self._count += n
+
+    def add_embedded(self, texts: List[str], vectors, metadatas: Optional[List[dict]] = None,
+                     ids: Optional[List[str]] = None) -> List[str]:
+        """Add chunks whose embeddings are already computed"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        with self._lock:
+            self._append(vectors)
+            self.ids.extend(ids)
+            self.texts.extend(texts)
+            self.metadatas.extend(metadatas or [{} for _ in texts])
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embedded(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def _document(self, i: int) -> Document:
+        return Document(page_content=self.texts[i], metadata=dict(self.metadatas[i] or {}), id=self.ids[i])
+
+    def _top_k(self, vector, k: int) -> List[Tuple[int, float]]:
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            matrix, n = self.vectors, self._count
+        if not n:
+            return []
+        sims = matrix @ query
+        k = min(k, n)
+        top = np.argpartition(-sims, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(int(i), float(sims[i])) for i in top]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k: int = 4, **kwargs):
+        return [(self._document(i), (1.0 + sim) / 2.0) for i, sim in self._top_k(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs) -> List[Document]:
+        return [self._document(i) for i, _ in self._top_k(embedding, k)]
+
+    def _similarity_search_with_relevance_scores(self, query: str, k: int = 4, **kwargs):
+        return self.similarity_search_by_vector_with_relevance_scores(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
+
+    def get(self, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Same shape as Chroma's get()"""
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            data = {"ids": list(self.ids)}
+            if "documents" in include:
+                data["documents"] = list(self.texts)
+            if "metadatas" in include:
+                data["metadatas"] = [dict(m or {}) for m in self.metadatas]
+            if "embeddings" in include:
+                data["embeddings"] = self.vectors * self._norms[:self._count, None]
+        return data
+
+    def raw_vectors(self) -> np.ndarray:
+        """Vectors as the embedder returned them (e.g. to move them into Chroma)"""
+        with self._lock:
+            return self.vectors * self._norms[:self._count, None]
+
+    def nbytes(self) -> int:
+        """Memory held by vectors and chunk texts"""
+        return int(self._vectors.nbytes + self._norms.nbytes + sum(len(t) for t in self.texts))
+
+    def persist(self, persist_dir: str):
+        """Write the index; the JSON file goes last so a half-written index is never opened"""
+        os.makedirs(persist_dir, exist_ok=True)
+        with self._lock:
+            vectors = np.ascontiguousarray(self.vectors)
+            norms = self._norms[:self._count]
+            meta = {
+                "format": 1,
+                "count": self._count,
+                "dim": int(vectors.shape[1]),
+                "ids": self.ids,
+                "texts": self.texts,
+                "metadatas": self.metadatas,
+            }
+        np.save(os.path.join(persist_dir, VECTORS_FILE), vectors)
+        np.save(os.path.join(persist_dir, NORMS_FILE), norms)
+        tmp = os.path.join(persist_dir, INDEX_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(persist_dir, INDEX_FILE))
+
+    @classmethod
+    def load(cls, persist_dir: str, embedding_function: Embeddings) -> "NumpyVectorStore":
+        """Open a persisted index; vectors stay memory-mapped until something is added"""
+        with open(os.path.join(persist_dir, INDEX_FILE)) as f:
+            meta = json.load(f)
+        store = cls(embedding_function, meta["dim"])
+        store._vectors = np.load(os.path.join(persist_dir, VECTORS_FILE), mmap_mode="r")
+        store._norms = np.load(os.path.join(persist_dir, NORMS_FILE), mmap_mode="r")
+        store._count = meta["count"]
+        store.ids, store.texts, store.metadatas = meta["ids"], meta["texts"], meta["metadatas"]
+        return store
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   *, ids: Optional[List[str]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+def is_numpy_index(persist_dir: str) -> bool:
+    return os.path.exists(os.path.join(persist_dir, INDEX_FILE))
@@ -0,0 +1,371 @@
+import os
+import sys
+import time
+import zlib
+import atexit
+import shutil
+import secrets
+import tempfile
+import threading
+import subprocess
+import logging
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from typing import Any, Dict, List, Optional
+
+from controllers.tokens import estimate_tokens
+from controllers.modelworker import format_cores, worker_authkey
+
+logger = logging.getLogger(__name__)
+
+
+# Spawn this many model worker processes from the web process (0 = model in-process)
+MODEL_WORKERS = int(os.environ.get("MODEL_WORKERS", 0))
+# Or connect to workers started separately (comma-separated socket paths), e.g.
+# shared by several gunicorn web workers
+MODEL_WORKER_ADDRESSES = [a for a in os.environ.get("MODEL_WORKER_ADDRESSES", "").split(",") if a]
+# Spawned workers serve the deterministic stand-in instead of the GGUF model
+MODEL_WORKER_STUB = os.environ.get("MODEL_WORKER_STUB", "false").lower() == "true"
+# Open connections kept per worker (also the cap on concurrent calls to it)
+MODEL_WORKER_CONNECTIONS = int(os.environ.get("MODEL_WORKER_CONNECTIONS", 8))
+# How long to wait for a worker to load its model and start listening
+MODEL_WORKER_START_TIMEOUT = float(os.environ.get("MODEL_WORKER_START_TIMEOUT", 600))
+# Keep a document on "its" worker (warm prompt states) unless that worker has
+# this many more calls in flight than the least busy one
+MODEL_WORKER_STICKY_SLACK = int(os.environ.get("MODEL_WORKER_STICKY_SLACK", 2))
+# Spawned workers' sockets go in a private (0700) directory created under this one
+MODEL_WORKER_SOCKET_DIR = os.environ.get("MODEL_WORKER_SOCKET_DIR", tempfile.gettempdir())
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_pool = None
+_socket_dir = None
+_pool_lock = threading.Lock()
+
+
+def workers_enabled() -> bool:
+    return MODEL_WORKERS > 0 or bool(MODEL_WORKER_ADDRESSES)
+
+
+def core_slices(n: int, cores: Optional[List[int]] = None) -> List[List[int]]:
+    """Split the cores this process may use into n contiguous slices"""
+    if cores is None:
+        try:
+            cores = sorted(os.sched_getaffinity(0))
+        except AttributeError:
+            cores = list(range(os.cpu_count() or 1))
+    if n >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(n)]
+    size, extra = divmod(len(cores), n)
+    slices, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(cores[start:end])
+        start = end
+    return slices
+
+
+class WorkerError(RuntimeError):
+    """A model worker reported an error"""
+
+
+class WorkerUnavailable(WorkerError):
+    """A model worker could not be reached or died mid-call"""
+
+
+class WorkerHandle:
+    """One model worker process and a pool of open connections to it"""
+    def __init__(self, address: str, authkey: bytes, command: Optional[List[str]] = None,
+                 cores: Optional[List[int]] = None, env: Optional[Dict[str, str]] = None):
+        self.address = address
+        self.authkey = authkey
+        self.command = command  # None: started by someone else, we only connect
+        self.cores = cores
+        self.env = env
+        self.process = None
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.restarts = 0
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(MODEL_WORKER_CONNECTIONS)
+        self._lock = threading.Lock()
+
+    def spawn(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self.process = subprocess.Popen(self.command, cwd=BACKEND_DIR, env=self.env)
+        logger.info(f"🛠️ Started model worker {self.process.pid} on cores {format_cores(self.cores or [])}")
+
+    def alive(self) -> bool:
+        return self.process is None or self.process.poll() is None
+
+    def _connect(self):
+        deadline = time.monotonic() + MODEL_WORKER_START_TIMEOUT
+        while True:
+            with self._lock:
+                if self.command is not None and not self.alive():
+                    logger.warning(f"⚠️ Model worker {self.process.pid} exited ({self.process.returncode}), restarting")
+                    self.restarts += 1
+                    self.spawn()
+            try:
+                return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except AuthenticationError as e:
+                raise WorkerUnavailable(f"Model worker at {self.address} rejected our MODEL_WORKER_AUTHKEY") from e
+            except (OSError, EOFError):
+                # Still loading the model (or just died and is being restarted)
+                if time.monotonic() > deadline:
+                    raise WorkerUnavailable(f"Model worker at {self.address} did not start in time")
+                time.sleep(0.2)
+
+    def checkout(self):
+        self._slots.acquire()
+        with self._lock:
+            self.outstanding += 1
+            self.requests += 1
+            if not self.alive():
+                # Connections to a dead worker are useless; _connect restarts it
+                stale, self._idle = self._idle, []
+                for conn in stale:
+                    conn.close()
+            conn = self._idle.pop() if self._idle else None
+        try:
+            return conn or self._connect()
+        except Exception:
+            self.errors += 1
+            self.checkin(None, False)
+            raise
+
+    def checkin(self, conn, reusable: bool):
+        """Return a connection; one left mid-conversation is closed instead"""
+        with self._lock:
+            self.outstanding -= 1
+            if conn is not None and reusable:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        self._slots.release()
+
+    def call(self, op: str, payload: Dict[str, Any]):
+        conn = self.checkout()
+        reusable = False
+        try:
+            conn.send((op, payload))
+            status, value = conn.recv()
+            reusable = True
+        except (OSError, EOFError) as e:
+            self.errors += 1
+            raise WorkerUnavailable(f"Model worker at {self.address} failed: {e}") from e
+        finally:
+            self.checkin(conn, reusable)
+        if status == "error":
+            raise WorkerError(value)
+        return value
+
+    def stream(self, payload: Dict[str, Any]):
+        conn = self.checkout()
+        reusable = False
+        try:
+            conn.send(("stream", payload))
+            while True:
+                kind, value = conn.recv()
+                if kind == "token":
+                    yield value
+                    continue
+                reusable = True
+                if kind == "error":
+                    raise WorkerError(value)
+                return
+        except (OSError, EOFError) as e:
+            self.errors += 1
+            raise WorkerUnavailable(f"Model worker at {self.address} failed: {e}") from e
+        finally:
+            # Closed early (client went away): dropping the connection stops the worker
+            self.checkin(conn, reusable)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "pid": self.process.pid if self.process is not None else None,
+            "alive": self.alive(),
+            "cores": self.cores,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "idle_connections": len(self._idle),
+        }
+
+
+class WorkerPool:
+    """SharedLLM-compatible front for model workers running in other processes.
+
+    Calls go to the worker with the fewest calls in flight, except that a
+    document's calls stick to one worker (so its saved prompt states are
+    reused there) while that worker is not much busier than the rest.
+    """
+    def __init__(self, workers: List[WorkerHandle], model_path: str):
+        self.workers = workers
+        self.model_path = model_path
+        self.calls = 0
+        self._token_counts = {}
+        self._lock = threading.Lock()
+
+    def _pick(self, cache_key=None) -> WorkerHandle:
+        with self._lock:
+            self.calls += 1
+            least = min(self.workers, key=lambda w: w.outstanding)
+            if cache_key:
+                home = self.workers[zlib.crc32(str(cache_key[0]).encode()) % len(self.workers)]
+                if home.outstanding <= least.outstanding + MODEL_WORKER_STICKY_SLACK:
+                    return home
+            return least
+
+    @staticmethod
+    def _wire_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Send llama.cpp grammars as their GBNF text; the worker rebuilds them"""
+        grammar = kwargs.get("grammar")
+        if grammar is not None and not isinstance(grammar, str):
+            kwargs = {**kwargs, "grammar": ("gbnf", getattr(grammar, "_grammar", str(grammar)))}
+        return kwargs
+
+    def _call(self, op: str, payload: Dict[str, Any], cache_key=None):
+        worker = self._pick(cache_key)
+        try:
+            return worker.call(op, payload)
+        except WorkerUnavailable:
+            if worker.command is None and len(self.workers) == 1:
+                raise
+            # Worker died mid-call: try once more (restarted, or another worker)
+            logger.warning(f"⚠️ Retrying {op} after model worker failure")
+            return self._pick(cache_key).call(op, payload)
+
+    def invoke(self, prompt, cache_key=None, **kwargs):
+        return self._call("invoke", {
+            "prompt": prompt, "kwargs": {**self._wire_kwargs(kwargs), "cache_key": cache_key}
+        }, cache_key)
+
+    def invoke_many(self, prompts, cache_key=None, **kwargs):
+        return self._call("invoke_many", {
+            "prompts": list(prompts), "kwargs": {**self._wire_kwargs(kwargs), "cache_key": cache_key}
+        }, cache_key)
+
+    def stream(self, prompt, cache_key=None, **kwargs):
+        return self._pick(cache_key).stream({
+            "prompt": prompt, "kwargs": {**self._wire_kwargs(kwargs), "cache_key": cache_key}
+        })
+
+    def count_tokens(self, text: str) -> int:
+        """Counted by a worker's tokenizer; chunks are counted over and over, so remember them"""
+        count = self._token_counts.get(text)
+        if count is None:
+            try:
+                count = self._call("count_tokens", {"texts": [text]})[0]
+            except WorkerError:
+                return estimate_tokens(text)
+            if len(self._token_counts) > 20000:
+                self._token_counts.clear()
+            self._token_counts[text] = count
+        return count
+
+    def idle(self) -> bool:
+        return all(w.outstanding == 0 for w in self.workers)
+
+    def drop_prompt_states(self, document: str) -> int:
+        dropped = 0
+        for worker in self.workers:
+            try:
+                dropped += worker.call("drop_prompt_states", {"document": document})
+            except WorkerError as e:
+                logger.warning(f"Could not drop prompt states on {worker.address}: {e}")
+        return dropped
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+    def stats(self) -> Dict[str, Any]:
+        workers = []
+        for worker in self.workers:
+            stats = worker.stats()
+            # Only over an already open connection: never wait for a worker still loading
+            if stats["alive"] and stats["idle_connections"]:
+                try:
+                    stats["remote"] = worker.call("stats", {})
+                except WorkerError as e:
+                    stats["remote"] = {"error": str(e)}
+            workers.append(stats)
+        return {
+            "model_path": self.model_path,
+            "calls": self.calls,
+            "waiting": sum(w.outstanding for w in self.workers),
+            "busy": not self.idle(),
+            "prompt_cache": None,
+            "workers": workers,
+        }
+
+
+def _spawned_workers(model_path: Optional[str], n: int, socket_dir: str) -> List[WorkerHandle]:
+    authkey = secrets.token_hex(16)
+    env = {**os.environ, "MODEL_WORKER_AUTHKEY": authkey}
+    env.pop("MODEL_WORKERS", None)
+    env.pop("MODEL_WORKER_ADDRESSES", None)
+    workers = []
+    for i, cores in enumerate(core_slices(n)):
+        address = os.path.join(socket_dir, f"worker-{i}.sock")
+        command = [sys.executable, "-m", "controllers.modelworker", "--socket", address,
+                   "--cores", format_cores(cores)]
+        if MODEL_WORKER_STUB:
+            command.append("--stub")
+        elif model_path:
+            command += ["--model", model_path]
+        worker = WorkerHandle(address, authkey.encode(), command, cores, env)
+        worker.spawn()
+        workers.append(worker)
+    return workers
+
+
+def get_worker_pool(model_path: Optional[str] = None) -> WorkerPool:
+    """The process-wide pool: spawned on first use, or connected to MODEL_WORKER_ADDRESSES"""
+    global _pool, _socket_dir
+    with _pool_lock:
+        if _pool is None:
+            if MODEL_WORKER_ADDRESSES:
+                authkey = worker_authkey()
+                workers = [WorkerHandle(address, authkey) for address in MODEL_WORKER_ADDRESSES]
+                logger.info(f"🔌 Using {len(workers)} external model worker(s)")
+            else:
+                _socket_dir = tempfile.mkdtemp(prefix="pdfwisdom-", dir=MODEL_WORKER_SOCKET_DIR)
+                workers = _spawned_workers(model_path, MODEL_WORKERS, _socket_dir)
+                atexit.register(shutdown_workers)
+            _pool = WorkerPool(workers, model_path or "model-workers")
+        return _pool
+
+
+def get_pool_if_started() -> Optional[WorkerPool]:
+    return _pool
+
+
+def shutdown_workers():
+    """Stop spawned workers (registered with atexit by the first get_worker_pool)"""
+    global _pool, _socket_dir
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _socket_dir is not None:
+            shutil.rmtree(_socket_dir, ignore_errors=True)
+            _socket_dir = None
@@ -41,7 +41,7 @@ def quiz():
     if _chain is None:
         return jsonify({"error": "pipeline not ready"}), 503
     n = int(request.args.get("n", 5))
-    quiz = generate_quiz(_chain, n_questions=n)
+    quiz, _ = generate_quiz(_chain, n_questions=n)
     return jsonify({"quiz": quiz})
 
 @app.post("/qa")
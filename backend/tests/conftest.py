@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+# Importing app must not load models or touch the real session database
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="pdfwisdom-tests-"), "sessions.sqlite3"))
+os.environ.setdefault("WARMUP_EMBEDDINGS", "false")
+os.environ.setdefault("WARMUP_LLM", "false")
+os.environ.pop("RESPONSE_CACHE_DIR", None)
+
+
+@pytest.fixture
+def hash_embeddings():
+    """Route the shared embedding service to offline hash embeddings"""
+    from controllers import embeddingservice
+    from synthetic import HashEmbeddings
+
+    previous = embeddingservice._model
+    embeddingservice._model = HashEmbeddings(64)
+    yield embeddingservice.get_embeddings()
+    embeddingservice._model = previous
+
+
+@pytest.fixture
+def make_chain(hash_embeddings):
+    """SimpleChain over a NumPy index of the given texts, answering with `llm`"""
+    from langchain_core.documents import Document
+    from controllers.pdfloader import SimpleChain
+    from controllers.vectorindex import NumpyVectorStore
+
+    def make(texts, llm, document="doc"):
+        store = NumpyVectorStore(hash_embeddings)
+        store.add_documents([Document(page_content=t, metadata={"page": i + 1}) for i, t in enumerate(texts)])
+        return SimpleChain(llm, store.as_retriever(), document=document)
+
+    return make
+
+
+WORKDIR = tempfile.mkdtemp(prefix="pdfwisdom-app-")
+
+
+@pytest.fixture
+def app_module(monkeypatch, hash_embeddings):
+    """The Flask app module, run from a scratch directory with a stub LLM"""
+    monkeypatch.chdir(WORKDIR)
+    import app
+    from synthetic import use_stub_llm
+    from controllers import pdfloader
+
+    # Registers the real create_llm so it comes back after use_stub_llm replaces it
+    monkeypatch.setattr(pdfloader, "create_llm", pdfloader.create_llm)
+    use_stub_llm(prompt_tps=0, gen_tps=100000, answer_tokens=8)
+    os.makedirs(app.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(app.CHROMA_DB_FOLDER, exist_ok=True)
+    return app
+
+
+@pytest.fixture
+def pdf_bytes(tmp_path):
+    """Bytes of a small synthetic PDF; a different seed gives a different document"""
+    from synthetic import make_pdf
+
+    def make(seed=0, pages=2):
+        path = make_pdf(str(tmp_path / f"doc-{seed}.pdf"), pages, seed=seed)
+        with open(path, "rb") as f:
+            return f.read()
+
+    return make
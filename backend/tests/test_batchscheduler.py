@@ -0,0 +1,57 @@
+from synthetic import StubBatchBackend
+from controllers.batchscheduler import make_batched, BatchedLLM
+from controllers.modelregistry import SharedLLM
+from controllers.promptcache import PromptStateCache
+
+DEFAULTS = {"max_tokens": 8, "temperature": 0.0, "top_k": 40, "top_p": 1.0, "n_ctx": 4096}
+
+
+class Context:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Client:
+    """The parts of llama_cpp.Llama make_batched touches"""
+    def __init__(self):
+        self._ctx = Context()
+        self.cache = "installed"
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+
+class Model:
+    def __init__(self):
+        self.client = Client()
+
+
+def batched():
+    shared = SharedLLM("model.gguf", Model(), 0.0, 0, prompt_cache=PromptStateCache())
+    backend = StubBatchBackend(n_seq=2, prompt_tps=0, gen_tps=1e6)
+    return shared, make_batched(shared, DEFAULTS, n_seq=2, backend=backend)
+
+
+def test_batching_frees_the_serial_context():
+    shared, llm = batched()
+    assert isinstance(llm, BatchedLLM)
+    assert shared.llm.client._ctx.closed
+    assert shared.llm.client.cache is None
+    assert llm.stats()["prompt_cache"] is None
+
+
+def test_cache_key_is_accepted_but_unused():
+    _, llm = batched()
+    text = llm.invoke("Question: anything?", cache_key=("doc", "qa"), max_tokens=4)
+    assert len(text.split()) == 4
+    results = llm.invoke_many(["a", "b", "c"], cache_key=("doc", "qa"), max_tokens=3)
+    assert [len(r.split()) for r, _ in results] == [3, 3, 3]
+    assert llm.drop_prompt_states("doc") == 0
+
+
+def test_single_sequence_keeps_the_serial_model():
+    shared = SharedLLM("model.gguf", Model(), 0.0, 0)
+    assert make_batched(shared, DEFAULTS, n_seq=1) is shared
+    assert not shared.llm.client._ctx.closed
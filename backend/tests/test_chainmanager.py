@@ -0,0 +1,44 @@
+from controllers.chainmanager import ChainManager
+
+MB = 1024 * 1024
+
+
+def make_manager(sizes, **kwargs):
+    evicted = []
+    manager = ChainManager(on_evict=evicted.append, idle_ttl=0, footprint=lambda key: sizes[key], **kwargs)
+    return manager, evicted
+
+
+def test_entry_budget_evicts_least_recently_used():
+    manager, evicted = make_manager({}, max_entries=2, memory_budget_mb=0)
+    for key in ("a", "b", "a", "c"):
+        manager.touch(key)
+    assert evicted == ["b"]
+    assert manager.stats()["loaded"] == 2
+
+
+def test_memory_budget_counts_document_footprints():
+    sizes = {"a": 3 * MB, "b": 3 * MB, "c": 3 * MB}
+    manager, evicted = make_manager(sizes, memory_budget_mb=7)
+    manager.touch("a")
+    manager.touch("b")
+    assert evicted == []
+    manager.touch("a")
+    manager.touch("c")
+    assert evicted == ["b"]
+    assert manager.memory_bytes() == 6 * MB
+
+
+def test_document_larger_than_the_budget_stays_loaded():
+    manager, evicted = make_manager({"big": 10 * MB, "small": MB}, memory_budget_mb=4)
+    manager.touch("small")
+    manager.touch("big")
+    assert evicted == ["small"]
+    assert manager.stats()["loaded"] == 1
+
+
+def test_discarded_documents_release_their_footprint():
+    manager, _ = make_manager({"a": MB}, memory_budget_mb=4)
+    manager.touch("a")
+    manager.discard("a")
+    assert manager.memory_bytes() == 0
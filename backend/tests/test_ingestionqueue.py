@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from controllers.ingestionqueue import IngestionQueue, QueueFullError
+
+
+def wait_idle(q):
+    q._queue.join()
+
+
+def wait_running(q):
+    deadline = time.monotonic() + 5
+    while q.stats()["running"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_same_key_can_be_queued_while_running():
+    q = IngestionQueue(workers=1, max_queue=10, name="test")
+    release = threading.Event()
+    done = []
+    first = q.submit("doc", lambda: (release.wait(5), done.append("first")))
+    wait_running(q)
+    second = q.submit("doc", done.append, "second")
+    assert first != second
+    assert q.position("doc") == 1  # the latest job, still waiting
+    release.set()
+    wait_idle(q)
+    assert done == ["first", "second"]
+    assert q.position("doc") is None
+
+    # The single worker survived both jobs
+    q.submit("other", done.append, "third")
+    wait_idle(q)
+    assert done[-1] == "third"
+    assert q.stats()["running"] == 0
+
+
+def test_cancelled_jobs_never_run():
+    q = IngestionQueue(workers=1, max_queue=10, name="test")
+    release = threading.Event()
+    ran = []
+    q.submit("busy", release.wait, 5)
+    q.submit("doc", ran.append, "doc")
+    assert q.cancel("doc")
+    assert not q.cancel("doc")
+    release.set()
+    wait_idle(q)
+    assert ran == []
+    assert q.stats()["queued"] == 0
+
+
+def test_failing_job_does_not_kill_the_worker():
+    q = IngestionQueue(workers=1, max_queue=10, name="test")
+    ran = []
+    q.submit("bad", lambda: 1 / 0)
+    q.submit("good", ran.append, "good")
+    wait_idle(q)
+    assert ran == ["good"]
+
+
+def test_full_queue_sheds_less_urgent_jobs():
+    q = IngestionQueue(workers=1, max_queue=2, name="test")
+    release = threading.Event()
+    ran = []
+    q.submit("busy", release.wait, 5)
+    wait_running(q)
+    q.submit("background", ran.append, "background", priority=10)
+    q.submit("upload-1", ran.append, "upload-1")
+    q.submit("upload-2", ran.append, "upload-2")
+    assert q.position("background") is None
+    with pytest.raises(QueueFullError):
+        q.submit("upload-3", ran.append, "upload-3")
+    release.set()
+    wait_idle(q)
+    assert ran == ["upload-1", "upload-2"]
+    assert (q.stats()["shed"], q.stats()["rejected"]) == (1, 1)
@@ -0,0 +1,14 @@
+import pypdf
+
+from controllers import pdfextract
+
+
+def test_parallel_extraction_matches_in_process(tmp_path, monkeypatch):
+    from synthetic import make_pdf
+
+    path = make_pdf(str(tmp_path / "doc.pdf"), 5)
+    monkeypatch.setattr(pdfextract, "PAGES_PER_TASK", 2)
+    reader = pypdf.PdfReader(path)
+    expected = [(i + 1, page.extract_text() or "") for i, page in enumerate(reader.pages)]
+    assert list(pdfextract.iter_pages_parallel(path, len(reader.pages))) == expected
+    assert pdfextract._get_pool()._mp_context.get_start_method() in ("forkserver", "spawn")
@@ -0,0 +1,72 @@
+import pypdf
+from langchain_core.documents import Document
+
+from controllers.pdfloader import PROMPT_TEMPLATE, SimpleChain, iter_chunks, iter_pages
+
+
+class WordCountLLM:
+    """Counts one token per word, so budgets are easy to reason about"""
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+def passage(page, words):
+    return Document(page_content=" ".join([f"p{page}"] * words), metadata={"page": page})
+
+
+def test_context_fits_the_budget_in_page_order():
+    llm = WordCountLLM()
+    chain = SimpleChain(llm, retriever=None, n_ctx=200, answer_tokens=50)
+    question = "What happens on page three?"
+    # Most relevant first; the 90-word passage does not fit once the first two are in
+    scored = [(passage(7, 40), 0.9), (passage(3, 40), 0.8), (passage(1, 90), 0.7), (passage(5, 20), 0.6)]
+
+    context = chain.build_context(question, scored=scored)
+
+    budget = 200 - 50 - llm.count_tokens(PROMPT_TEMPLATE.format(context="", question=question))
+    picked = context.split("\n\n")
+    assert sum(llm.count_tokens(text) + 2 for text in picked) <= budget
+    assert [text.split()[0] for text in picked] == ["p3", "p5", "p7"]
+
+
+def test_context_is_empty_when_nothing_fits():
+    chain = SimpleChain(WordCountLLM(), retriever=None, n_ctx=100, answer_tokens=90)
+    assert chain.build_context("Why?", scored=[(passage(1, 30), 0.9)]) == ""
+
+
+def chunk_pages(tmp_path, n_pages, words_per_page, chunk_tokens):
+    """Chunks of a synthetic PDF, checked against the text of the pages they claim to span"""
+    from synthetic import make_pdf
+
+    path = make_pdf(str(tmp_path / "doc.pdf"), n_pages, words_per_page=words_per_page)
+    reader = pypdf.PdfReader(path)
+    pages = dict(iter_pages(path))
+    assert list(pages) == list(range(1, n_pages + 1))
+    assert list(pages.values()) == [page.extract_text() for page in reader.pages]
+
+    def text(first, last):
+        return "".join(pages[p] + "\n" for p in range(first, last + 1))
+
+    chunks = list(iter_chunks(path, chunk_tokens=chunk_tokens, chunk_overlap=20))
+    for chunk in chunks:
+        first, last = chunk.metadata["page"], chunk.metadata["page_end"]
+        assert chunk.metadata["source"] == path
+        assert 1 <= first <= last <= n_pages
+        assert chunk.page_content in text(first, last)
+        # Tight: it starts on `page` and ends on `page_end`
+        assert chunk.page_content not in text(first + 1, last)
+        assert chunk.page_content not in text(first, last - 1)
+    assert chunks[0].metadata["page"] == 1 and chunks[-1].metadata["page_end"] == n_pages
+    return [(chunk.metadata["page"], chunk.metadata["page_end"]) for chunk in chunks]
+
+
+def test_chunks_of_long_pages_carry_their_page(tmp_path):
+    spans = chunk_pages(tmp_path, 4, words_per_page=450, chunk_tokens=120)
+    assert len(spans) > 8
+    assert spans == sorted(spans)
+
+
+def test_chunks_across_short_pages_carry_the_pages_they_span(tmp_path):
+    spans = chunk_pages(tmp_path, 6, words_per_page=15, chunk_tokens=120)
+    assert any(first < last for first, last in spans)
+    assert spans == sorted(spans)
@@ -0,0 +1,84 @@
+from controllers.promptcache import PromptStateCache, attach_prompt_cache
+
+MB = 1024 * 1024
+
+
+class State:
+    def __init__(self, size=MB):
+        self.llama_state_size = size
+
+
+def evaluate(cache, namespace, tokens, size=MB):
+    """What llama.cpp does around one completion: look up, then save"""
+    cache.namespace = namespace
+    try:
+        restored = cache[tokens]
+    except KeyError:
+        restored = None
+    cache[tokens] = State(size)
+    return restored
+
+
+PREFIX = list(range(100))
+
+
+def test_one_off_prompts_are_not_saved():
+    cache = PromptStateCache(capacity_bytes=100 * MB, min_prefix=16)
+    evaluate(cache, ("doc", "qa"), PREFIX + [1000])
+    evaluate(cache, ("doc", "map"), [5] * 50)
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["skipped_saves"] == 2
+
+
+def test_shared_prefix_is_saved_and_reused():
+    cache = PromptStateCache(capacity_bytes=100 * MB, min_prefix=16)
+    evaluate(cache, ("doc", "qa"), PREFIX + [1000])
+    evaluate(cache, ("doc", "qa"), PREFIX + [2000])
+    assert cache.stats()["saves"] == 1
+    assert evaluate(cache, ("doc", "qa"), PREFIX + [3000]) is not None
+    assert cache.stats()["reused_tokens"] == len(PREFIX)
+    # Other namespaces never see it
+    assert evaluate(cache, ("other", "qa"), PREFIX + [4000]) is None
+
+
+def test_states_per_namespace_and_capacity_are_bounded():
+    cache = PromptStateCache(capacity_bytes=5 * MB, min_prefix=16, per_key=2)
+    for i in range(6):
+        evaluate(cache, ("a", "qa"), PREFIX + [i])
+    assert cache.stats()["entries"] == 2
+    for i in range(6):
+        evaluate(cache, ("b", "qa"), PREFIX + [i], size=2 * MB)
+    assert cache.bytes <= 5 * MB
+
+
+def test_drop_forgets_a_document():
+    cache = PromptStateCache(capacity_bytes=100 * MB, min_prefix=16)
+    for namespace in (("a", "qa"), ("b", "qa")):
+        for i in range(3):
+            evaluate(cache, namespace, PREFIX + [i])
+    assert cache.drop("a") == 2
+    assert [key[0] for key in cache._entries] == [("b", "qa"), ("b", "qa")]
+    # Its prompt history goes too: the next prompt is a one-off again
+    evaluate(cache, ("a", "qa"), PREFIX + [9])
+    assert cache.stats()["entries"] == 2
+
+
+def test_off_by_default():
+    class Client:
+        def set_cache(self, cache):
+            raise AssertionError("cache installed")
+
+    class Model:
+        client = Client()
+
+    assert attach_prompt_cache(Model()) is None
+
+
+def test_template_preamble_alone_is_not_saved():
+    cache = PromptStateCache(capacity_bytes=100 * MB)
+    preamble = list(range(80))
+    evaluate(cache, ("doc", "qa"), preamble + [1000] * 300)
+    evaluate(cache, ("doc", "qa"), preamble + [2000] * 300)
+    assert cache.stats()["entries"] == 0
+    evaluate(cache, ("doc", "qa"), preamble + [2000] * 200 + [3000] * 100)
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from controllers import pdfloader, quizgen
+from controllers.modelregistry import SharedLLM
+
+
+class FixedLLM:
+    """Returns the same completion for every prompt"""
+    def __init__(self, text):
+        self.text = text
+
+    def invoke(self, prompt, **kwargs):
+        return self.text
+
+    def stream(self, prompt, **kwargs):
+        yield self.text
+
+
+QUESTION = {"q": "Which gas do plants absorb?", "options": ["Oxygen", "Carbon dioxide", "Helium", "Neon"],
+            "answer": 1, "explanation": "Photosynthesis uses carbon dioxide."}
+TEXTS = [f"Page {i} explains photosynthesis and carbon dioxide in plants." for i in range(6)]
+
+
+@pytest.fixture(autouse=True)
+def no_grammar(monkeypatch):
+    # Take the prompt-only path so no llama.cpp is needed
+    monkeypatch.setattr(pdfloader, "quiz_grammar", lambda n: None)
+
+
+def test_generate_quiz_returns_parsed_quiz(make_chain):
+    chain = make_chain(TEXTS, SharedLLM("fixed", FixedLLM(json.dumps({"quiz": [QUESTION]})), 0.0, 0))
+    quiz, fallback = pdfloader.generate_quiz(chain, n_questions=1)
+    assert not fallback
+    assert quiz[0]["q"] == QUESTION["q"]
+
+
+def test_generate_quiz_flags_fallback(make_chain):
+    chain = make_chain(TEXTS, SharedLLM("fixed", FixedLLM("not json at all"), 0.0, 0))
+    quiz, fallback = pdfloader.generate_quiz(chain, n_questions=3)
+    assert fallback
+    assert quiz  # still something to show
+
+
+def test_generate_quiz_parallel_flags_fallback(make_chain, monkeypatch):
+    monkeypatch.setattr(pdfloader, "stream_quiz", lambda chain, n: iter([]))
+    chain = make_chain(TEXTS, SharedLLM("fixed", FixedLLM("{}"), 0.0, 0))
+    quiz, fallback = pdfloader.generate_quiz_parallel(chain, n_questions=2)
+    assert fallback and quiz == pdfloader.fallback_quiz()
+
+
+def test_fallback_quiz_is_never_cached(app_module):
+    app = app_module
+    assert app.quiz_ok(([QUESTION], False))
+    assert not app.quiz_ok((pdfloader.fallback_quiz(), True))
+    assert not app.quiz_ok(([], False))
+    _, _, _, cacheable = app.ARTIFACTS["quiz"]
+    assert not cacheable((pdfloader.fallback_quiz(), True))
+
+
+def test_quiz_budget_covers_the_longest_item():
+    longest = quizgen.QUESTION_MAX_CHARS + 4 * quizgen.OPTION_MAX_CHARS + quizgen.EXPLANATION_MAX_CHARS
+    # Even at 3 characters per token
+    assert quizgen.QUIZ_TOKENS_PER_QUESTION >= longest / 3
+    # The largest quiz still leaves 1k tokens of the default context for the document
+    assert quizgen.quiz_max_tokens(quizgen.QUIZ_MAX_QUESTIONS) <= 4096 - 1024
+
+
+def test_question_count_is_clamped():
+    assert quizgen.clamp_questions(0) == 1
+    assert quizgen.clamp_questions(-3) == 1
+    assert quizgen.clamp_questions(5) == 5
+    assert quizgen.clamp_questions(10_000) == quizgen.QUIZ_MAX_QUESTIONS
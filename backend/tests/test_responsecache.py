@@ -0,0 +1,36 @@
+from controllers import responsecache
+from controllers.responsecache import ResponseCache, make_key
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttl=60, disk_dir=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(responsecache.time, "time", lambda: now[0])
+    cache = ResponseCache(max_entries=8, ttl=10, disk_dir=None)
+    cache.set("a", "summary")
+    now[0] += 5
+    assert cache.contains("a") and cache.get("a") == "summary"
+    now[0] += 10
+    assert not cache.contains("a")
+    assert cache.get("a") is None
+
+
+def test_disk_entries_survive_a_new_cache(tmp_path):
+    ResponseCache(max_entries=8, ttl=60, disk_dir=str(tmp_path)).set("k", {"quiz": [1, 2]})
+    fresh = ResponseCache(max_entries=8, ttl=60, disk_dir=str(tmp_path))
+    assert fresh.get("k") == {"quiz": [1, 2]}
+
+
+def test_keys_ignore_parameter_order():
+    assert make_key("hash", "quiz", n=5, mode="parallel") == make_key("hash", "quiz", mode="parallel", n=5)
+    assert make_key("hash", "quiz", n=5) != make_key("hash", "quiz", n=6)
@@ -0,0 +1,92 @@
+import json
+
+from controllers import runtimeprofile
+
+HOST = {"cpu_model": "Test CPU", "logical_cpus": 8, "physical_cores": 4, "gpu_offload": False}
+SLICE = {**HOST, "logical_cpus": 4, "physical_cores": 2}
+
+
+def fake_measure(n_threads, n_batch):
+    # Prompt eval keeps improving with bigger batches, decode peaks at 3 threads
+    return {"prompt_tps": 100.0 * n_threads + n_batch, "decode_tps": 10.0 - abs(n_threads - 3)}
+
+
+def test_calibration_measures_batches_up_to_the_real_prompt():
+    profile = runtimeprofile.calibrate("model.gguf", host=HOST, measure=fake_measure, threads=[2, 3, 4])
+    assert {r["n_batch"] for r in profile["results"]} == set(runtimeprofile.BATCH_CANDIDATES)
+    assert profile["settings"]["n_batch"] == 512
+    assert profile["settings"]["n_threads"] == 3
+    assert profile["settings"]["n_threads_batch"] == 4
+
+
+def test_calibration_prunes_the_grid_and_closes_the_model():
+    calls = []
+
+    class Measure:
+        closed = False
+
+        def __call__(self, n_threads, n_batch):
+            calls.append((n_threads, n_batch))
+            return fake_measure(n_threads, n_batch)
+
+        def close(self):
+            self.closed = True
+
+    measure = Measure()
+    runtimeprofile.calibrate("model.gguf", host=HOST, measure=measure, threads=[1, 2, 3, 4])
+    # Every thread count at the largest batch (physical cores first), then the other batches
+    assert calls == [(4, 512), (3, 512), (2, 512), (1, 512), (4, 64), (4, 128), (4, 256)]
+    assert measure.closed
+
+
+def test_calibration_stops_at_the_time_cap(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(runtimeprofile.time, "perf_counter", lambda: clock[0])
+
+    def slow_measure(n_threads, n_batch):
+        clock[0] += 50
+        return fake_measure(n_threads, n_batch)
+
+    profile = runtimeprofile.calibrate("model.gguf", host=HOST, measure=slow_measure,
+                                       threads=[1, 2, 3, 4], max_seconds=120)
+    assert len(profile["results"]) == 3
+    assert profile["settings"]["n_batch"] == 512
+
+
+def test_profiles_are_kept_per_host(tmp_path):
+    path = str(tmp_path / "llm_runtime.json")
+    for host in (HOST, SLICE):
+        runtimeprofile.save_profile(
+            runtimeprofile.calibrate("model.gguf", host=host, measure=fake_measure, threads=[1, 2]), path)
+    assert runtimeprofile.load_profile(path, HOST)["host"] == HOST
+    assert runtimeprofile.load_profile(path, SLICE)["host"] == SLICE
+    assert runtimeprofile.load_profile(path, {**HOST, "cpu_model": "Other"}) is None
+
+
+def test_single_profile_files_still_load(tmp_path):
+    path = tmp_path / "llm_runtime.json"
+    path.write_text(json.dumps({"host": HOST, "settings": {"n_batch": 128}}))
+    assert runtimeprofile.load_profile(str(path), HOST)["settings"] == {"n_batch": 128}
+
+
+def test_settings_precedence(monkeypatch):
+    monkeypatch.delenv("LLM_RUNTIME", raising=False)
+    monkeypatch.delenv("LLM_THREADS", raising=False)
+    profile = {"host": HOST, "settings": {"n_threads": 3, "n_batch": 256}}
+
+    settings, sources = runtimeprofile.resolve_settings(HOST, None)
+    assert settings["n_threads"] == 4 and sources["n_threads"] == "host"
+
+    settings, sources = runtimeprofile.resolve_settings(HOST, profile)
+    assert settings["n_batch"] == 256 and sources["n_batch"] == "profile"
+
+    # A profile measured on other cores does not apply
+    settings, sources = runtimeprofile.resolve_settings(SLICE, profile)
+    assert sources["n_batch"] == "host"
+
+    monkeypatch.setenv("LLM_THREADS", "6")
+    monkeypatch.setenv("LLM_RUNTIME", '{"n_batch": 64, "bogus": 1}')
+    settings, sources = runtimeprofile.resolve_settings(HOST, profile)
+    assert (settings["n_threads"], settings["n_batch"]) == (6, 64)
+    assert sources["n_threads"] == sources["n_batch"] == "env"
+    assert "bogus" not in settings
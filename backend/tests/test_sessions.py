@@ -0,0 +1,179 @@
+import hashlib
+import io
+import os
+
+
+def upload(client, data, name="notes.pdf"):
+    res = client.post("/upload", data={"file": (io.BytesIO(data), name)})
+    assert res.status_code == 202, res.get_json()
+    return res.get_json()
+
+
+def wait_ready(client, session_id):
+    for _ in range(60):
+        status = client.get(f"/status/{session_id}/wait?timeout=1").get_json()
+        if status["ready"] or status["error"]:
+            return status
+    raise AssertionError("ingestion did not finish")
+
+
+def test_same_name_uploads_get_distinct_sessions(app_module, pdf_bytes):
+    client = app_module.app.test_client()
+    first = upload(client, pdf_bytes(seed=1))
+    second = upload(client, pdf_bytes(seed=2))
+    assert first["session_id"] != second["session_id"]
+    assert wait_ready(client, first["session_id"])["ready"]
+    assert wait_ready(client, second["session_id"])["ready"]
+
+    client.delete(f"/session/{first['session_id']}")
+    assert client.get(f"/status/{second['session_id']}").get_json()["ready"]
+    client.delete(f"/session/{second['session_id']}")
+
+
+def test_duplicate_content_is_refcounted(app_module, pdf_bytes):
+    client = app_module.app.test_client()
+    data = pdf_bytes(seed=3)
+    first = upload(client, data)
+    second = upload(client, data)
+    assert second["deduplicated"]
+    wait_ready(client, first["session_id"])
+
+    content_hash = app_module._session_docs[first["session_id"]]
+    doc = app_module._documents[content_hash]
+    assert doc["sessions"] == {first["session_id"], second["session_id"]}
+
+    client.delete(f"/session/{first['session_id']}")
+    assert os.path.exists(doc["pdf_path"]) and os.path.exists(doc["db_path"])
+    client.delete(f"/session/{second['session_id']}")
+    assert content_hash not in app_module._documents
+    assert not os.path.exists(doc["pdf_path"]) and not os.path.exists(doc["db_path"])
+
+
+def test_retry_of_failed_document_keeps_earlier_sessions(app_module, pdf_bytes):
+    client = app_module.app.test_client()
+    data = pdf_bytes(seed=4)
+    old = upload(client, data)
+    wait_ready(client, old["session_id"])
+    content_hash = app_module._session_docs[old["session_id"]]
+    app_module.fail_document(content_hash, "boom")
+    assert client.get(f"/status/{old['session_id']}").get_json()["error"] == "boom"
+
+    retry = upload(client, data)
+    assert not retry["deduplicated"]
+    assert wait_ready(client, retry["session_id"])["ready"]
+    doc = app_module._documents[content_hash]
+    assert old["session_id"] in doc["sessions"]
+    assert client.get(f"/status/{old['session_id']}").get_json()["error"] is None
+
+    # The earlier session still holds the files after the retry session is gone
+    client.delete(f"/session/{retry['session_id']}")
+    assert os.path.exists(doc["pdf_path"]) and os.path.exists(doc["db_path"])
+    assert client.get(f"/status/{old['session_id']}").get_json()["ready"]
+    client.delete(f"/session/{old['session_id']}")
+
+
+def test_stale_ingestion_leaves_the_current_document_alone(app_module, pdf_bytes):
+    client = app_module.app.test_client()
+    data = pdf_bytes(seed=5)
+    first = upload(client, data)
+    content_hash = app_module._session_docs[first["session_id"]]
+    stale = app_module._documents[content_hash]
+    client.delete(f"/session/{first['session_id']}")
+
+    second = upload(client, data)
+    assert wait_ready(client, second["session_id"])["ready"]
+    current = app_module._documents[content_hash]
+    assert current is not stale
+
+    # The first upload's job, should it still run now, changes nothing
+    app_module.init_chain_for_file(content_hash, stale)
+    assert app_module._documents[content_hash] is current
+    assert stale["status"] == "processing"
+    assert os.path.exists(current["db_path"])
+    assert client.get(f"/status/{second['session_id']}").get_json()["ready"]
+    client.delete(f"/session/{second['session_id']}")
+
+
+def test_interrupted_ingestion_is_resumed_by_one_process(app_module, pdf_bytes, monkeypatch):
+    client = app_module.app.test_client()
+    store = app_module._store
+    data = pdf_bytes(seed=6)
+    content_hash = hashlib.sha256(data).hexdigest()
+    pdf_path = os.path.join(app_module.UPLOAD_FOLDER, f"{content_hash}.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(data)
+    db_path = os.path.join(app_module.CHROMA_DB_FOLDER, content_hash)
+
+    # Another live process is ingesting it: only one of two claims wins
+    store.add_document(content_hash, pdf_path, db_path, owner="other")
+    store.add_session("resumed-session", content_hash)
+    assert not store.claim_document(content_hash, "third", lease=30)
+    app_module.resume_ingestion()
+    assert app_module._ingestion.position(content_hash) is None
+    assert store.document(content_hash)["claimed_by"] == "other"
+
+    # Its claim lapses (the process died): this process takes the document over
+    monkeypatch.setattr(app_module, "INGEST_LEASE_SECONDS", -1)
+    app_module.resume_ingestion()
+    assert store.document(content_hash)["claimed_by"] == app_module._owner
+    assert wait_ready(client, "resumed-session")["ready"]
+    client.delete("/session/resumed-session")
+    assert store.document(content_hash) is None
+
+
+def test_sessions_of_other_processes_are_read_from_the_store(app_module, pdf_bytes):
+    client = app_module.app.test_client()
+    store = app_module._store
+    local = upload(client, pdf_bytes(seed=7))
+    wait_ready(client, local["session_id"])
+    content_hash = app_module._session_docs[local["session_id"]]
+
+    # Attached to the same document by another process
+    store.add_session("remote-session", content_hash)
+    assert client.get("/status/remote-session").get_json()["ready"]
+    assert client.post("/qa/remote-session", json={"question": "What is it about?"}).status_code == 200
+
+    # A document another process is still ingesting, which then fails
+    pending_hash = "f" * 64
+    store.add_document(pending_hash, "missing.pdf", "missing-db", owner="other")
+    store.add_session("remote-pending", pending_hash)
+    status = client.get("/status/remote-pending").get_json()
+    assert status["processing"] and not status["ready"]
+    assert client.post("/qa/remote-pending", json={"question": "?"}).status_code == 503
+    store.set_document_status(pending_hash, "error", "boom")
+    assert client.get("/status/remote-pending").get_json()["error"] == "boom"
+
+    for session_id in ("remote-pending", "remote-session", local["session_id"]):
+        client.delete(f"/session/{session_id}")
+    assert store.document(content_hash) is None and store.document(pending_hash) is None
+
+
+def test_streamed_summary_is_cached_like_summary(app_module, pdf_bytes, monkeypatch):
+    client = app_module.app.test_client()
+    session_id = upload(client, pdf_bytes(seed=8))["session_id"]
+    wait_ready(client, session_id)
+
+    streamed = {True: ["  ", "\n"], False: ["A short", " summary. \n"]}
+    monkeypatch.setattr(app_module, "stream_summary", lambda chain, short: iter(streamed[short]))
+    for short in (True, False):
+        res = client.get(f"/summary/{session_id}/stream?short={str(short).lower()}")
+        assert "event: done" in res.get_data(as_text=True)
+
+    # Blank output is not stored; the rest is stored stripped
+    assert app_module._responses.get(app_module.response_key(session_id, "summary", short=True)) is None
+    assert app_module._responses.get(app_module.response_key(session_id, "summary", short=False)) == "A short summary."
+    client.delete(f"/session/{session_id}")
+
+
+def test_artifacts_are_precomputed_on_the_ingestion_queue(app_module, pdf_bytes, monkeypatch):
+    client = app_module.app.test_client()
+    monkeypatch.setattr(app_module, "PRECOMPUTE_ARTIFACTS", True)
+    session_id = upload(client, pdf_bytes(seed=9))["session_id"]
+    wait_ready(client, session_id)
+    content_hash = app_module._session_docs[session_id]
+
+    app_module._ingestion._queue.join()
+    artifacts = client.get(f"/status/{session_id}").get_json()["artifacts"]
+    assert artifacts["summary_short"] and artifacts["summary"] and artifacts["keypoints"]
+    assert app_module._ingestion.position(f"precompute:{content_hash}") is None
+    client.delete(f"/session/{session_id}")
@@ -0,0 +1,78 @@
+from synthetic import synthetic_text
+from controllers import summarizer
+
+
+class CountingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+
+class FakeChain:
+    n_ctx = 4096
+    answer_tokens = 512
+
+    def __init__(self):
+        self.llm = CountingLLM()
+
+    def cache_key(self, kind):
+        return None
+
+    def map_calls(self):
+        return sum(p.startswith("Summarize the following") for p in self.llm.prompts)
+
+
+def chunks(seed, n):
+    return [synthetic_text(i, seed=seed, words=40) for i in range(n)]
+
+
+def test_groups_keep_order_and_respect_sizes():
+    items = chunks(11, 200)
+    groups = summarizer._content_groups(items, 8, budget=1000, cost=len)
+    assert [c for g in groups for c in g] == items
+    assert all(sum(len(c) for c in g) <= 1000 for g in groups)
+
+    reduced = summarizer._content_groups(items[:9], 4, min_size=2)
+    assert all(len(g) >= 2 for g in reduced[:-1])
+    assert len(reduced) < 9
+
+
+def test_groups_fit_the_context_window():
+    # ~256-token chunks, like CHUNK_TOKENS, counted by a fake tokenizer
+    items = [synthetic_text(i, seed=13, words=200) for i in range(200)]
+    chain = FakeChain()
+    chain.llm.count_tokens = lambda text: len(text) // 4
+    budget = summarizer._group_budget(chain, summarizer.MAP_PROMPT)
+    cost = summarizer._token_cost(chain)
+    groups = summarizer._content_groups(items, 8, budget=budget, cost=cost)
+    assert [c for g in groups for c in g] == items
+    assert all(sum(cost(c) for c in g) <= budget for g in groups)
+
+    summarizer._reduce_levels(chain, items)
+    limit = chain.n_ctx - chain.answer_tokens
+    assert all(chain.llm.count_tokens(p) <= limit for p in chain.llm.prompts)
+
+
+def test_inserted_chunk_only_recomputes_its_group():
+    original = chunks(12, 120)
+    summarizer._reduce_levels(FakeChain(), original)
+
+    edited = original[:3] + ["A new paragraph about something else entirely."] + original[3:]
+    chain = FakeChain()
+    summarizer._reduce_levels(chain, edited)
+    # The group the new chunk joins, or the two it splits into
+    assert chain.map_calls() <= 2
+
+    chain = FakeChain()
+    summarizer._reduce_levels(chain, original[:50] + original[51:])
+    # Its group, plus the next one when that group was cut at the length cap
+    assert chain.map_calls() <= 2
+
+
+def test_partial_summaries_are_keyed_by_content():
+    assert summarizer._node_key("map", ["a", "b"]) == summarizer._node_key("map", ["a", "b"])
+    assert summarizer._node_key("map", ["a", "b"]) != summarizer._node_key("map", ["ab"])
+    assert summarizer._node_key("map", ["a"]) != summarizer._node_key("reduce", ["a"])
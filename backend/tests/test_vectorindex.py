@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from synthetic import HashEmbeddings, synthetic_text
+from controllers.vectorindex import NumpyVectorStore, is_numpy_index
+
+
+@pytest.fixture
+def store():
+    texts = [synthetic_text(i, seed=7, words=60) for i in range(300)]
+    store = NumpyVectorStore(HashEmbeddings(64))
+    store.add_texts(texts, [{"page": i // 3 + 1} for i in range(len(texts))])
+    return store
+
+
+def brute_force(store, query, k):
+    vectors = np.asarray(store.embeddings.embed_documents(store.texts), dtype=np.float32)
+    q = np.asarray(store.embeddings.embed_query(query), dtype=np.float32)
+    sims = vectors @ q / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(q))
+    return list(np.argsort(-sims, kind="stable")[:k])
+
+
+def test_top_k_matches_brute_force(store):
+    query = store.texts[42][:80]
+    results = store.similarity_search_with_relevance_scores(query, k=10)
+    assert [store.texts.index(doc.page_content) for doc, _ in results] == brute_force(store, query, 10)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0.0 <= s <= 1.0 for s in scores)
+    assert results[0][0].metadata == {"page": 15}
+
+
+def test_k_larger_than_the_index(store):
+    small = NumpyVectorStore(HashEmbeddings(64))
+    assert small.similarity_search("anything", k=4) == []
+    small.add_texts(["one", "two"])
+    assert len(small.similarity_search("one", k=10)) == 2
+
+
+def test_persist_and_load_round_trip(store, tmp_path):
+    path = str(tmp_path / "index")
+    assert not is_numpy_index(path)
+    store.persist(path)
+    assert is_numpy_index(path)
+
+    reopened = NumpyVectorStore.load(path, store.embeddings)
+    assert len(reopened) == len(store)
+    assert reopened.get()["ids"] == store.get()["ids"]
+    np.testing.assert_allclose(reopened.raw_vectors(), store.raw_vectors(), rtol=1e-6)
+    query = store.texts[3][:60]
+    assert ([d.id for d in reopened.similarity_search(query, k=5)]
+            == [d.id for d in store.similarity_search(query, k=5)])
+
+    # Memory-mapped on load, copied on the first write
+    reopened.add_documents([Document(page_content="a late addition")])
+    assert len(reopened) == len(store) + 1
+    assert reopened.similarity_search("a late addition", k=1)[0].page_content == "a late addition"
+
+
+def test_dimension_mismatch_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.add_embedded(["wrong size"], [[1.0, 2.0, 3.0]])
@@ -0,0 +1,92 @@
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from controllers import workerpool
+from controllers.workerpool import WorkerHandle, WorkerPool, WorkerUnavailable
+
+
+def stub_command(address):
+    return [sys.executable, "-m", "controllers.modelworker", "--socket", address, "--stub"]
+
+
+@pytest.fixture
+def socket_dir():
+    # pytest's tmp_path can exceed the ~100-byte limit on socket paths
+    path = tempfile.mkdtemp(prefix="pdfwisdom-test-")
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture
+def stub_worker(socket_dir, monkeypatch):
+    monkeypatch.setattr(workerpool, "MODEL_WORKER_START_TIMEOUT", 30)
+    address = os.path.join(socket_dir, "worker.sock")
+    env = {**os.environ, "MODEL_WORKER_AUTHKEY": "test-secret"}
+    worker = WorkerHandle(address, b"test-secret", stub_command(address), env=env)
+    worker.spawn()
+    yield worker
+    worker.close()
+
+
+def test_stand_in_round_trip(stub_worker):
+    pool = WorkerPool([stub_worker], "stand-in")
+    answer = pool.invoke("Context\n\nQuestion: what is this?\nAnswer:")
+    assert answer.startswith("Stand-in answer") and "what is this?" in answer
+    streamed = "".join(pool.stream("Question: again?")).strip()
+    assert streamed == pool.invoke("Question: again?")
+    assert pool.count_tokens("a few words here") > 0
+    assert pool.stats()["workers"][0]["requests"] >= 3
+
+
+def test_socket_is_private(stub_worker):
+    pool = WorkerPool([stub_worker], "stand-in")
+    pool.invoke("Question: ready?")
+    assert stat.S_IMODE(os.stat(stub_worker.address).st_mode) == 0o600
+
+
+def test_wrong_authkey_is_rejected(stub_worker, monkeypatch):
+    WorkerPool([stub_worker], "stand-in").invoke("Question: ready?")
+    intruder = WorkerHandle(stub_worker.address, b"guess")
+    with pytest.raises(WorkerUnavailable, match="rejected"):
+        intruder.call("stats", {})
+
+
+def test_worker_refuses_to_start_without_authkey(socket_dir):
+    address = os.path.join(socket_dir, "worker.sock")
+    env = {k: v for k, v in os.environ.items() if k != "MODEL_WORKER_AUTHKEY"}
+    result = subprocess.run(stub_command(address), cwd=workerpool.BACKEND_DIR, env=env,
+                            capture_output=True, timeout=60)
+    assert result.returncode != 0
+    assert not os.path.exists(address)
+
+
+def test_external_workers_require_authkey(monkeypatch):
+    monkeypatch.setattr(workerpool, "MODEL_WORKER_ADDRESSES", ["/nonexistent/worker.sock"])
+    monkeypatch.setattr(workerpool, "_pool", None)
+    monkeypatch.delenv("MODEL_WORKER_AUTHKEY", raising=False)
+    with pytest.raises(RuntimeError, match="MODEL_WORKER_AUTHKEY"):
+        workerpool.get_worker_pool()
+
+
+def test_spawned_workers_use_a_private_socket_dir(monkeypatch, socket_dir):
+    monkeypatch.setattr(workerpool, "MODEL_WORKERS", 1)
+    monkeypatch.setattr(workerpool, "MODEL_WORKER_STUB", True)
+    monkeypatch.setattr(workerpool, "MODEL_WORKER_ADDRESSES", [])
+    monkeypatch.setattr(workerpool, "MODEL_WORKER_SOCKET_DIR", socket_dir)
+    monkeypatch.setattr(workerpool, "MODEL_WORKER_START_TIMEOUT", 30)
+    monkeypatch.setattr(workerpool, "_pool", None)
+    pool = workerpool.get_worker_pool()
+    try:
+        assert pool.invoke("Question: hello?").startswith("Stand-in answer")
+        private_dir = os.path.dirname(pool.workers[0].address)
+        assert os.path.dirname(private_dir) == socket_dir
+        assert stat.S_IMODE(os.stat(private_dir).st_mode) == 0o700
+    finally:
+        workerpool.shutdown_workers()
+    assert not os.path.exists(private_dir)
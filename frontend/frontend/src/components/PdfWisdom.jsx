@@ -57,14 +57,13 @@ export default function PdfWisdom({ onClose }) {
     let ready = false;
     while (!ready) {
       try {
-        const res = await fetch(`${API_BASE}/status/${session_id}`);
+        // Long-poll: the server answers as soon as ingestion state changes
+        const res = await fetch(`${API_BASE}/status/${session_id}/wait?timeout=25`);
         const data = await res.json();
         if (data.ready) {
           ready = true;
         } else if (data.error) {
           throw new Error(data.error);
-        } else {
-          await new Promise(r => setTimeout(r, 1000));
         }
       } catch (err) {
         console.error("Status check failed:", err);